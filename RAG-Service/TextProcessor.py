@@ -1,17 +1,71 @@
+import io
 import os
 import re
 import json
-import fitz
-import requests
-from docx import Document
-from bs4 import BeautifulSoup
-from uploadValidification import detect_input_type  
+from uploadValidification import HEAD_BYTES, detect_bytes_type, detect_input_type
+from metrics import stage
+from chunker import sections_from_text
+
+# The converter libraries (PyMuPDF, python-docx, BeautifulSoup, requests) are imported
+# inside the methods that need them, so importing this module stays cheap at cold start.
+
+def preload_converters():
+    """Imports every converter library up front (called from the /warmup hook)."""
+    import fitz
+    import requests
+    import docx
+    import bs4
 
 class FileConverter:
-    def __init__(self, input_data):
+    """
+    Converts a file path, URL, raw bytes or binary file object (e.g. an upload stream
+    kept in memory or spooled to a temp file) to text. `filename` tells JSON from plain
+    text for in-memory bodies; `input_type` skips detection when it is already known.
+    """
+    def __init__(self, input_data, filename=None, input_type=None):
         if isinstance(input_data, str):
             input_data = input_data.strip().strip('"')
         self.input_data = input_data
+        self.filename = filename
+        self.input_type = input_type
+
+    def _is_buffer(self):
+        return not isinstance(self.input_data, str)
+
+    def _detect(self):
+        # Detect type from the magic bytes of files and buffers, or the shape of a string
+        if self.input_type is not None:
+            return self.input_type
+        with stage("convert.detect"):
+            if self._is_buffer():
+                self.input_type = detect_bytes_type(self._head(), self.filename)
+            else:
+                self.input_type = detect_input_type(self.input_data)
+        return self.input_type
+
+    def _head(self):
+        if hasattr(self.input_data, "read"):
+            self.input_data.seek(0)
+            head = self.input_data.read(HEAD_BYTES)
+            self.input_data.seek(0)
+            return head
+        return bytes(self.input_data[:HEAD_BYTES])
+
+    def _read_bytes(self):
+        """Returns the whole body of a buffer input."""
+        if hasattr(self.input_data, "read"):
+            self.input_data.seek(0)
+            return self.input_data.read()
+        return self.input_data
+
+    def _binary_source(self):
+        """A path or seekable binary file object for libraries that accept either."""
+        if not self._is_buffer():
+            return self.input_data
+        if hasattr(self.input_data, "read"):
+            self.input_data.seek(0)
+            return self.input_data
+        return io.BytesIO(self.input_data)
 
     def convert(self):
         converters = {
@@ -21,35 +75,85 @@ class FileConverter:
             'plain_text': self._convert_plain_text,
             'json': self.convert_json_to_text
         }
-        
-        # Detect type based on the input data (file path or URL)
-        self.input_type = detect_input_type(self.input_data)
 
-        if self.input_type not in converters:
+        if self._detect() not in converters:
             return f"Unsupported input type: {self.input_type}"
 
-        return converters[self.input_type]()
+        with stage(f"convert.{self.input_type}"):
+            return converters[self.input_type]()
+
+    def convert_sections(self):
+        """
+        Converts the input into (text, metadata) sections that follow its structure:
+        one per PDF page, DOCX paragraph or top-level JSON key, and paragraphs for
+        plain text and web pages. Raises ValueError on the errors convert() reports.
+        """
+        section_converters = {
+            'pdf': (self._pdf_sections, "Error reading PDF"),
+            'docx': (self._docx_sections, "Error reading DOCX"),
+            'json': (self._json_sections, "Error reading JSON"),
+        }
+
+        if self._detect() not in section_converters:
+            text = self.convert()
+            if text.startswith("Error") or text.startswith("Unsupported"):
+                raise ValueError(text)
+            return sections_from_text(text, {"source_type": self.input_type})
+
+        section_converter, error_prefix = section_converters[self.input_type]
+        with stage(f"convert.{self.input_type}"):
+            try:
+                sections = section_converter()
+            except Exception as e:
+                raise ValueError(f"{error_prefix}: {e}")
+        return [(text, dict(metadata, source_type=self.input_type)) for text, metadata in sections]
+
+    def _pdf_pages(self):
+        import fitz
+        if self._is_buffer():
+            document = fitz.open(stream=self._read_bytes(), filetype="pdf")
+        else:
+            document = fitz.open(self.input_data)
+        with document as doc:
+            return [page.get_text() for page in doc]
+
+    def _pdf_sections(self):
+        return [(text.strip(), {"page": number}) for number, text in enumerate(self._pdf_pages(), start=1) if text.strip()]
 
     def _convert_pdf(self):
         try:
-            doc = fitz.open(self.input_data)
-            full_text = ""
-            for page in doc:
-                full_text += page.get_text()
-            return full_text.strip()
+            return "".join(self._pdf_pages()).strip()
         except Exception as e:
             return f"Error reading PDF: {e}"
 
+    def _docx_paragraphs(self):
+        from docx import Document
+        doc = Document(self._binary_source())
+        return [para for para in doc.paragraphs if para.text.strip()]
+
+    def _docx_sections(self):
+        sections = []
+        heading = None
+        for index, para in enumerate(self._docx_paragraphs()):
+            metadata = {"paragraph": index}
+            if para.style is not None and para.style.name.startswith("Heading"):
+                heading = para.text.strip()
+            if heading:
+                metadata["heading"] = heading
+            sections.append((para.text.strip(), metadata))
+        return sections
+
     def _convert_docx(self):
         try:
-            doc = Document(self.input_data)
-            text = "\n".join([para.text for para in doc.paragraphs if para.text.strip()])
+            text = "\n".join([para.text for para in self._docx_paragraphs()])
             return text.strip()
         except Exception as e:
             return f"Error reading DOCX: {e}"
 
     def _convert_url(self):
         try:
+            import requests
+            from bs4 import BeautifulSoup
             response = requests.get(self.input_data, timeout=10)
             response.raise_for_status()
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -59,16 +163,31 @@ class FileConverter:
         except Exception as e:
             return f"Error fetching URL: {e}"
 
+    def _load_json(self):
+        if self._is_buffer():
+            return json.loads(self._read_bytes())
+        with open(self.input_data, 'r') as file:
+            return json.load(file)
+
+    def _json_sections(self):
+        data = self._load_json()
+        if isinstance(data, dict):
+            return [(json.dumps({key: value}, indent=4), {"json_key": str(key)}) for key, value in data.items()]
+        if isinstance(data, list):
+            return [(json.dumps(item, indent=4), {"json_index": index}) for index, item in enumerate(data)]
+        return [(json.dumps(data, indent=4), {})]
+
     def convert_json_to_text(self):
         try:
-            with open(self.input_data, 'r') as file:
-                data = json.load(file)
+            data = self._load_json()
             return json.dumps(data, indent=4)
         except Exception as e:
             return f"Error reading JSON: {e}"
 
     def _convert_plain_text(self):
         try:
+            if self._is_buffer():
+                return bytes(self._read_bytes()).decode('utf-8').strip()
             if os.path.exists(self.input_data):
                 with open(self.input_data, 'r', encoding='utf-8') as f:
                     return f.read().strip()
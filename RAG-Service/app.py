@@ -1,21 +1,35 @@
 import os
+import json
+import time
 import uuid
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, g, Response, stream_with_context
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 import config
+import sharding
+import metrics
+import rag
+import conversation_store
 from TextProcessor import FileConverter
+from uploadValidification import HEAD_BYTES, detect_bytes_type
 from rag import RAGManager
 
 # Load environment variables from .env file for local development
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+# Oversized bodies are rejected from their Content-Length before they are read
+app.config['MAX_CONTENT_LENGTH'] = config.MAX_UPLOAD_BYTES
+CORS(app, expose_headers=["Server-Timing", "X-Session-Affinity", "X-Served-By"])
 
 ALLOWED_EXTENSIONS = {'pdf', 'docx', 'json', 'txt', 'md'}
+# Input types (detected from magic bytes) that uploads may contain
+ALLOWED_UPLOAD_TYPES = {'pdf', 'docx', 'json', 'plain_text'}
+# File extension for each detected upload type, used when an upload's name doesn't survive secure_filename()
+UPLOAD_TYPE_EXTENSIONS = {'pdf': '.pdf', 'docx': '.docx', 'json': '.json', 'plain_text': '.txt'}
 
 def allowed_file(filename):
     return '.' in filename and \
@@ -30,8 +44,47 @@ def get_session_id():
     session_id = request.headers.get('X-Session-Id')
     if not session_id:
         return None, (jsonify({"error": "X-Session-Id header is required"}), 400)
+    if not sharding.is_valid_session_id(session_id):
+        return None, (jsonify({"error": "X-Session-Id may only contain letters, digits, '-', '_' and '.'"}), 400)
     return session_id, None
 
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    return jsonify({"error": f"Upload exceeds the limit of {config.MAX_UPLOAD_BYTES} bytes"}), 413
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    metrics.start_trace()
+
+@app.after_request
+def record_request_timing(response):
+    """Records request latency and optionally returns the per-stage breakdown as Server-Timing."""
+    trace = metrics.end_trace()
+    start = g.get('request_start')
+    if start is not None:
+        elapsed = time.perf_counter() - start
+        metrics.REQUEST_SECONDS.observe(elapsed, endpoint=request.endpoint or 'unknown', status=response.status_code)
+        if config.TIMING_HEADER or request.headers.get('X-Debug-Timing') == '1':
+            trace.append(('total', elapsed))
+            response.headers['Server-Timing'] = metrics.server_timing_header(trace)
+    return response
+
+@app.after_request
+def add_affinity_headers(response):
+    """
+    Adds session-affinity routing hints. X-Session-Affinity names the instance that
+    owns the session on the consistent-hash ring, so a load balancer or the frontend
+    can pin the session there and keep its indexes hot on one node.
+    """
+    session_id = request.headers.get('X-Session-Id')
+    if session_id and sharding.is_valid_session_id(session_id):
+        owner = sharding.affinity_for(session_id)
+        if owner:
+            response.headers['X-Session-Affinity'] = owner
+    response.headers['X-Served-By'] = config.INSTANCE_ID
+    return response
+
 @app.route('/ingest', methods=["POST"])
 def ingest_data():
     """
@@ -49,27 +102,45 @@ def ingest_data():
             return jsonify({"error": "Invalid or unsupported file"}), 400
         
         filename = secure_filename(file.filename)
-        user_upload_dir = os.path.join(config.USER_UPLOADS_PATH, session_id)
-        os.makedirs(user_upload_dir, exist_ok=True)
-        filepath = os.path.join(user_upload_dir, filename)
-        file.save(filepath)
-        input_data = filepath
+        # The upload stays in memory (or Werkzeug's spooled temp file) and is converted from
+        # there. Its type comes from its magic bytes, checked before any conversion work.
+        with metrics.stage("convert.detect"):
+            head = file.stream.read(HEAD_BYTES)
+            file.stream.seek(0)
+            input_type = detect_bytes_type(head, filename)
+        if input_type not in ALLOWED_UPLOAD_TYPES:
+            return jsonify({"error": "File content does not match a supported type (PDF, DOCX, JSON, TXT, MD)"}), 415
+        if '.' not in filename:
+            # Names made only of characters secure_filename() strips (e.g. "日本.md" -> "md",
+            # or nothing at all) would be saved without an extension, or as the directory itself
+            filename = f"{uuid.uuid4().hex}{UPLOAD_TYPE_EXTENSIONS[input_type]}"
+        converter = FileConverter(file.stream, filename=filename, input_type=input_type)
+        source = filename
     elif request.is_json and 'url' in request.get_json():
-        input_data = request.get_json()['url']
+        source = request.get_json()['url']
+        converter = FileConverter(source)
     else:
         return jsonify({"error": "No file or URL provided"}), 400
 
     try:
-        print(f"Processing input for session {session_id}: {input_data}")
-        converter = FileConverter(input_data)
-        text_content = converter.convert()
-
-        if text_content.startswith("Error"):
-            return jsonify({"error": text_content}), 500
-
-        # Add the extracted text to the user's vector store
+        print(f"Processing input for session {session_id}: {source}")
+        try:
+            sections = converter.convert_sections()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 500
+        if not any(text.strip() for text, _ in sections):
+            # Nothing to index (an empty or whitespace-only file, a PDF without a text layer)
+            return jsonify({"error": "No text could be extracted from the input"}), 422
+
+        # Add the extracted sections (pages, paragraphs, JSON keys) to the user's vector store
         rag_manager = RAGManager(session_id)
-        rag_manager.add_text_to_user_store(text_content)
+        rag_manager.add_sections_to_user_store(sections, source_type=converter.input_type)
+
+        if config.KEEP_UPLOADS and 'file' in request.files:
+            user_upload_dir = sharding.shard_path(config.USER_UPLOADS_PATH, session_id)
+            os.makedirs(user_upload_dir, exist_ok=True)
+            file.stream.seek(0)
+            file.save(os.path.join(user_upload_dir, source))
 
         return jsonify({"message": "Content ingested successfully!"}), 200
     except Exception as e:
@@ -81,7 +152,9 @@ def ingest_data():
 @app.route('/rag', methods=['POST'])
 def ask_question():
     """
-    Handles a user's question, incorporating session_id and chat history.
+    Handles a user's question, incorporating session_id and chat history. Clients that
+    send a "history" list get a stateless answer from it; without one, the conversation
+    kept server-side for the session is used and extended (see conversation_store.py).
     """
     session_id, error_response = get_session_id()
     if error_response:
@@ -92,18 +165,88 @@ def ask_question():
         return jsonify({"error": "Missing 'query' in request body"}), 400
 
     user_question = data['query']
-    # The frontend should send the chat history. Default to an empty list if not provided.
-    chat_history = data.get('history', [])
 
     try:
         # Each session gets its own RAGManager instance
         rag_manager = RAGManager(session_id)
-        answer = rag_manager.answer_question(user_question, chat_history)
+        if 'history' not in data and config.CONVERSATION_MEMORY:
+            answer = rag_manager.answer_with_memory(user_question)
+        else:
+            answer = rag_manager.answer_question(user_question, data.get('history') or [])
         return jsonify({"answer": answer})
     except Exception as e:
         print(f"Error during RAG query for session {session_id}: {e}")
         return jsonify({"error": f"An error occurred while processing the query: {str(e)}"}), 500
 
+@app.route('/rag/history', methods=['GET', 'DELETE'])
+def conversation_history():
+    """Returns (GET) or forgets (DELETE) the conversation kept server-side for the session."""
+    session_id, error_response = get_session_id()
+    if error_response:
+        return error_response
+
+    memory = conversation_store.get_store()
+    if request.method == 'DELETE':
+        memory.clear(session_id)
+        return jsonify({"message": "Conversation cleared."})
+    return jsonify({"history": memory.history(session_id)})
+
+@app.route('/rag/batch', methods=['POST'])
+def ask_questions():
+    """
+    Answers many questions for one session and streams the results back as NDJSON,
+    one line per question as soon as its answer is ready, then a summary line. All
+    questions are embedded and searched in batches; generation runs with bounded
+    concurrency. Intended for evaluation runs and other offline workloads.
+    """
+    session_id, error_response = get_session_id()
+    if error_response:
+        return error_response
+
+    data = request.get_json(silent=True) or {}
+    questions = data.get('questions')
+    if not isinstance(questions, list) or not questions:
+        return jsonify({"error": "Missing 'questions' list in request body"}), 400
+    if len(questions) > config.BATCH_MAX_QUESTIONS:
+        return jsonify({"error": f"At most {config.BATCH_MAX_QUESTIONS} questions per batch"}), 400
+
+    # Questions may be plain strings or {"id", "query", "history"} objects
+    items = [{"query": q} if isinstance(q, str) else (q if isinstance(q, dict) else {}) for q in questions]
+    try:
+        concurrency = min(int(data.get('concurrency', config.BATCH_CONCURRENCY)), config.BATCH_CONCURRENCY)
+    except (TypeError, ValueError):
+        return jsonify({"error": "'concurrency' must be an integer"}), 400
+
+    rag_manager = RAGManager(session_id)
+
+    def stream():
+        try:
+            for result in rag_manager.answer_questions(items, concurrency=concurrency):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        except Exception as e:
+            print(f"Error during batch RAG query for session {session_id}: {e}")
+            yield json.dumps({"error": f"An error occurred while processing the batch: {str(e)}"}) + "\n"
+
+    return Response(stream_with_context(stream()), mimetype='application/x-ndjson')
+
+@app.route('/warmup', methods=['GET', 'POST'])
+def warmup():
+    """
+    Starts preloading the model clients, chains, base index and converter libraries in
+    the background (no-op if already running or done) and reports progress. Point the
+    Cloud Run startup probe or a post-deploy hook at this route.
+    """
+    status = rag.start_background_warmup()
+    return jsonify(status), (200 if status["state"] == "done" else 202)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Exposes stage and request latency histograms in Prometheus text format."""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+if config.WARMUP_ON_START:
+    rag.start_background_warmup()
+
 # ------------------------ Run App ------------------------
 # This block is for local development. Gunicorn will run the app in production.
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+import os
+import inspect
+import threading
+
+import config
+
+# Model clients are created once per process and shared by every RAGManager.
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _get_or_create(name, factory):
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = factory()
+        return _clients[name]
+
+
+def _google_api_key():
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    if not google_api_key:
+        raise ValueError("GOOGLE_API_KEY environment variable not set.")
+    return google_api_key
+
+
+def _create_embeddings():
+    if config.MODEL_BACKEND == "fake":
+        from fake_backends import FakeEmbeddings
+        return FakeEmbeddings()
+
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(
+        model=config.EMBEDDING_MODEL,
+        google_api_key=_google_api_key()
+    )
+
+
+def _create_chat_model():
+    if config.MODEL_BACKEND == "fake":
+        from fake_backends import FakeChatModel
+        return FakeChatModel()
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model=config.CHAT_MODEL,
+        google_api_key=_google_api_key(),
+        temperature=0.3,
+        convert_system_message_to_human=True # Important for some models
+    )
+
+
+def get_embeddings():
+    """Returns the shared embeddings client for the configured backend."""
+    return _get_or_create("embeddings", _create_embeddings)
+
+
+def get_chat_model():
+    """Returns the shared chat model client for the configured backend."""
+    return _get_or_create("chat_model", _create_chat_model)
+
+
+def reset_clients():
+    """Drops the shared clients so the next call recreates them (used by benchmarks)."""
+    with _clients_lock:
+        _clients.clear()
+
+
+def embed_queries(texts, embeddings=None):
+    """
+    Embeds many search queries in batched calls with `embeddings` (default: the shared
+    client), using the query task type like embed_query where the client supports it.
+    """
+    embeddings = embeddings or get_embeddings()
+    if "task_type" not in inspect.signature(embeddings.embed_documents).parameters:
+        return embeddings.embed_documents(texts)  # e.g. the fake backend
+    return embeddings.embed_documents(texts, task_type="RETRIEVAL_QUERY")
@@ -0,0 +1,69 @@
+"""
+Answers a file of questions through the batch RAG path and writes NDJSON results.
+
+Input is JSONL ({"id", "query", "history"} per line), a JSON array of such objects or
+strings, or plain text with one question per line ("-" reads stdin). Results stream
+out as NDJSON in completion order with per-item timing, followed by a summary line.
+
+Usage:
+    python batch_rag.py questions.jsonl --session eval --concurrency 8 --out answers.ndjson
+"""
+import sys
+import json
+import argparse
+import contextlib
+
+from dotenv import load_dotenv
+
+
+def read_questions(path):
+    """Reads questions as {"query", ...} dicts from JSONL, a JSON array or plain text lines."""
+    with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as f:
+        content = f.read()
+    stripped = content.lstrip()
+    if stripped.startswith("["):
+        questions = json.loads(content)
+    else:
+        questions = []
+        for line in content.splitlines():
+            line = line.strip()
+            if line:
+                questions.append(json.loads(line) if line.startswith("{") else line)
+    return [{"query": q} if isinstance(q, str) else q for q in questions]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a batch of questions and write NDJSON results")
+    parser.add_argument("questions", help="JSONL, JSON array or text file of questions ('-' for stdin)")
+    parser.add_argument("--session", default="batch-cli", help="Session whose user store is searched with the base store")
+    parser.add_argument("--concurrency", type=int, default=None, help="Concurrent model calls (default: BATCH_CONCURRENCY)")
+    parser.add_argument("--out", help="Output NDJSON file (default: stdout)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    import sharding
+    from rag import RAGManager
+
+    if not sharding.is_valid_session_id(args.session):
+        print(f"Invalid session ID: {args.session}", file=sys.stderr)
+        sys.exit(1)
+
+    items = read_questions(args.questions)
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        # Keep the service's progress prints out of the NDJSON stream
+        with contextlib.redirect_stdout(sys.stderr):
+            results = RAGManager(args.session).answer_questions(items, concurrency=args.concurrency)
+            for result in results:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                if "summary" in result:
+                    summary = result["summary"]
+                    print(f"Answered {summary['items']} questions in {summary.get('seconds')}s ({summary['errors']} errors)")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
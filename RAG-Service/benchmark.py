@@ -0,0 +1,844 @@
+"""
+End-to-end performance benchmarks for the RAG service.
+
+Runs entirely offline against the deterministic backends in fake_backends.py and a
+throwaway MOUNT_PATH, so numbers are comparable between runs and machines. Results
+are written as JSON (one file per run) so regressions can be tracked over time.
+
+Usage:
+    python benchmark.py e2e --docs 200 --sessions 10 --queries 100
+    python benchmark.py importtime
+    python benchmark.py chunking --chunk-tokens 128 256 --overlaps 0 24
+    python benchmark.py quantization --docs 500
+    python benchmark.py tenant --sessions 500
+    python benchmark.py rerank --fetch-k 20 --top-n 3
+    python benchmark.py search --docs 500
+    python benchmark.py batch --queries 200 --llm-latency-ms 300 --embed-latency-ms 80
+    python benchmark.py memory --turns 100
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+RESULTS_DIR = "benchmark_results"
+
+_WORDS = None
+
+
+def _vocabulary(size=5000, seed=7):
+    """Builds a fixed pseudo-word vocabulary so corpora are reproducible."""
+    global _WORDS
+    if _WORDS is None:
+        rng = random.Random(seed)
+        letters = "abcdefghijklmnopqrstuvwxyz"
+        words = set()
+        while len(words) < size:
+            words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+        _WORDS = sorted(words)
+    return _WORDS
+
+
+def make_corpus(doc_count, words_per_doc, seed=42):
+    """Returns a list of synthetic documents as {"doc_id", "text", "sentences"} dicts."""
+    rng = random.Random(seed)
+    words = _vocabulary()
+    corpus = []
+    for doc_index in range(doc_count):
+        sentences = []
+        remaining = words_per_doc
+        while remaining > 0:
+            length = min(remaining, rng.randint(8, 24))
+            sentence = " ".join(rng.choice(words) for _ in range(length))
+            sentences.append(sentence.capitalize() + ".")
+            remaining -= length
+        # Group sentences into paragraphs so splitters have some structure to work with
+        paragraphs = [" ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)]
+        corpus.append({
+            "doc_id": f"doc-{doc_index}",
+            "text": "\n\n".join(paragraphs),
+            "sentences": sentences,
+        })
+    return corpus
+
+
+def make_queries(corpus, count, seed=1234):
+    """Samples questions from corpus sentences; returns (question, doc_id) pairs with known answers."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        doc = rng.choice(corpus)
+        sentence = rng.choice(doc["sentences"]).rstrip(".").split()
+        start = rng.randint(0, max(0, len(sentence) - 6))
+        queries.append(("What about " + " ".join(sentence[start:start + 6]) + "?", doc["doc_id"]))
+    return queries
+
+
+def percentiles(samples):
+    """Returns count, mean and nearest-rank p50/p95/p99 (milliseconds) for latency samples in seconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def rank(p):
+        index = max(0, min(len(ordered) - 1, int(round(p / 100.0 * len(ordered) + 0.5)) - 1))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": rank(50),
+        "p95_ms": rank(95),
+        "p99_ms": rank(99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def vector_bytes(store):
+    """Bytes of a loaded store's vector index (FAISS keeps it in C++ memory, outside tracemalloc)."""
+    if hasattr(store, "nbytes_in_memory"):  # QuantizedVectorStore
+        return store.nbytes_in_memory
+    return store.index.ntotal * store.index.d * 4
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def use_isolated_mount():
+    """
+    Points the service at a throwaway MOUNT_PATH with the fake backends.
+    Must run before config/rag are imported, since config reads the environment at import time.
+    """
+    mount = tempfile.mkdtemp(prefix="rag-bench-")
+    os.environ["MOUNT_PATH"] = mount
+    os.environ["MODEL_BACKEND"] = "fake"
+    return mount
+
+
+def configure_fake_backends(args):
+    import backends
+    embeddings = backends.get_embeddings()
+    embeddings.latency = args.embed_latency_ms / 1000.0
+    llm = backends.get_chat_model()
+    llm.latency = args.llm_latency_ms / 1000.0
+    return embeddings, llm
+
+
+def run_e2e(args):
+    """Ingest throughput, base index build time, cold/warm query latency and memory per session."""
+    mount = use_isolated_mount()
+    try:
+        import config
+        import rag
+        from bulk_ingest import ingest_directory
+
+        embeddings, llm = configure_fake_backends(args)
+        results = {}
+
+        # --- Base index build ---
+        base_corpus = make_corpus(args.base_docs, args.doc_words, seed=args.seed)
+        for doc in base_corpus:
+            with open(os.path.join(config.BASE_DATA_PATH, f"{doc['doc_id']}.txt"), "w", encoding="utf-8") as f:
+                f.write(doc["text"])
+        start = time.perf_counter()
+        # The same bulk ingestion create_base_db.py runs in production
+        base_chunks = ingest_directory(config.BASE_DATA_PATH, config.BASE_VECTOR_STORE_PATH, resume=False)["chunks"]
+        build_seconds = time.perf_counter() - start
+        results["base_index_build"] = {
+            "documents": len(base_corpus),
+            "chunks": base_chunks,
+            "seconds": round(build_seconds, 4),
+            "chunks_per_sec": round(base_chunks / build_seconds, 2) if build_seconds else None,
+            "bytes_on_disk": directory_size(config.BASE_VECTOR_STORE_PATH),
+        }
+
+        # --- Ingest throughput (per-session stores through the real ingest path) ---
+        session_ids = [f"bench-session-{i}" for i in range(args.sessions)]
+        corpus = make_corpus(args.docs, args.doc_words, seed=args.seed + 1)
+        doc_sessions = {}
+        total_bytes = 0
+        embed_calls_before = embeddings.texts_embedded
+        start = time.perf_counter()
+        for index, doc in enumerate(corpus):
+            session_id = session_ids[index % len(session_ids)]
+            doc_sessions[doc["doc_id"]] = session_id
+            rag.RAGManager(session_id).add_text_to_user_store(doc["text"])
+            total_bytes += len(doc["text"].encode("utf-8"))
+        ingest_seconds = time.perf_counter() - start
+        chunks_embedded = embeddings.texts_embedded - embed_calls_before
+        results["ingest"] = {
+            "documents": len(corpus),
+            "sessions": len(session_ids),
+            "chunks": chunks_embedded,
+            "seconds": round(ingest_seconds, 4),
+            "docs_per_sec": round(len(corpus) / ingest_seconds, 2),
+            "chunks_per_sec": round(chunks_embedded / ingest_seconds, 2),
+            "mb_per_sec": round(total_bytes / ingest_seconds / 1e6, 4),
+        }
+
+        # --- Query latency: cold (caches dropped before every query) vs warm ---
+        queries = make_queries(corpus, args.queries, seed=args.seed + 2)
+        history = [
+            {"role": "user", "content": "Tell me about the uploaded document."},
+            {"role": "assistant", "content": "It is a synthetic benchmark document."},
+        ]
+
+        def ask(question, doc_id, with_history):
+            manager = rag.RAGManager(doc_sessions[doc_id])
+            start = time.perf_counter()
+            manager.answer_question(question, history if with_history else [])
+            return time.perf_counter() - start
+
+        cold = []
+        for i, (question, doc_id) in enumerate(queries):
+            rag.clear_caches()
+            cold.append(ask(question, doc_id, i % 2 == 1))
+
+        warm = []
+        for question, doc_id in queries:  # populate caches
+            ask(question, doc_id, False)
+        for i, (question, doc_id) in enumerate(queries):
+            warm.append(ask(question, doc_id, i % 2 == 1))
+
+        results["query_latency"] = {
+            "cold": percentiles(cold),
+            "warm": percentiles(warm),
+        }
+
+        # --- Memory per session: Python heap (docstore, texts, NumPy arrays) retained by the
+        #     loaded stores, traced by tracemalloc, plus the vector index of each store. RSS
+        #     barely moves here, as the allocator reuses pools freed earlier in the run.
+        rag.clear_caches()
+        import gc
+        import tracemalloc
+        gc.collect()
+        sessions = max(1, len(session_ids))
+        tracemalloc.start()
+        heap_before = tracemalloc.get_traced_memory()[0]
+        stores = [rag.load_cached_store(rag.RAGManager(session_id).user_vector_store_path, embeddings)
+                  for session_id in session_ids]
+        heap_after, heap_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        heap_bytes = heap_after - heap_before
+        index_bytes = sum(vector_bytes(store) for store in stores if store is not None)
+        disk_total = directory_size(config.USER_VECTOR_STORES_PATH)
+        results["memory"] = {
+            "sessions_loaded": len(session_ids),
+            "python_heap_bytes": heap_bytes,
+            "python_heap_peak_bytes": heap_peak - heap_before,
+            "vector_index_bytes": index_bytes,
+            "per_session_bytes": (heap_bytes + index_bytes) // sessions,
+            "disk_per_session_bytes": disk_total // sessions,
+        }
+
+        return results
+    finally:
+        shutil.rmtree(mount, ignore_errors=True)
+
+
+def evaluate_retrieval(vector_store, embeddings, queries, k):
+    """Hit rate@k and MRR of the known source document for (question, doc_id) queries."""
+    hits, reciprocal_ranks = 0, 0.0
+    for question, doc_id in queries:
+        results = vector_store.similarity_search_by_vector(embeddings.embed_query(question), k=k)
+        for rank, doc in enumerate(results, start=1):
+            if doc.metadata.get("doc_id") == doc_id:
+                hits += 1
+                reciprocal_ranks += 1.0 / rank
+                break
+    return {
+        f"hit_rate_at_{k}": round(hits / len(queries), 4),
+        "mrr": round(reciprocal_ranks / len(queries), 4),
+    }
+
+
+def run_chunking(args):
+    """Compares the legacy 1000/200 character splitter with structure-aware token chunking."""
+    mount = use_isolated_mount()
+    try:
+        import chunker
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        from langchain_community.vectorstores import FAISS
+
+        embeddings, _ = configure_fake_backends(args)
+        corpus = make_corpus(args.docs, args.doc_words, seed=args.seed)
+        queries = make_queries(corpus, args.queries, seed=args.seed + 2)
+        source_tokens = sum(chunker.count_tokens(doc["text"]) for doc in corpus)
+
+        def legacy(doc):
+            splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+            return [(chunk, {"doc_id": doc["doc_id"]}) for chunk in splitter.split_text(doc["text"])]
+
+        def structure_aware(tokens, overlap):
+            def split(doc):
+                return chunker.StructureAwareChunker(tokens, overlap).split_text(doc["text"], {"doc_id": doc["doc_id"]})
+            return split
+
+        strategies = {"recursive_chars_1000_overlap_200": legacy}
+        for tokens in args.chunk_tokens:
+            for overlap in args.overlaps:
+                strategies[f"structure_tokens_{tokens}_overlap_{overlap}"] = structure_aware(tokens, overlap)
+
+        results = {"source_tokens": source_tokens, "strategies": {}}
+        for name, split in strategies.items():
+            start = time.perf_counter()
+            chunks = [chunk for doc in corpus for chunk in split(doc)]
+            split_seconds = time.perf_counter() - start
+
+            texts = [text for text, _ in chunks]
+            embedded_tokens = sum(chunker.count_tokens(text) for text in texts)
+            start = time.perf_counter()
+            vector_store = FAISS.from_texts(texts, embeddings, metadatas=[metadata for _, metadata in chunks])
+            build_seconds = time.perf_counter() - start
+            store_path = os.path.join(mount, name)
+            vector_store.save_local(store_path)
+
+            results["strategies"][name] = {
+                "chunks": len(chunks),
+                "embedded_tokens": embedded_tokens,
+                "embedding_overhead": round(embedded_tokens / source_tokens - 1, 4),
+                "split_seconds": round(split_seconds, 4),
+                "index_build_seconds": round(build_seconds, 4),
+                "index_bytes": directory_size(store_path),
+                **evaluate_retrieval(vector_store, embeddings, queries, args.k),
+            }
+        return results
+    finally:
+        shutil.rmtree(mount, ignore_errors=True)
+
+
+def run_quantization(args):
+    """Recall, footprint and search latency of quantized stores against the float32 FAISS store."""
+    mount = use_isolated_mount()
+    try:
+        import numpy as np
+        import chunker
+        from langchain_community.vectorstores import FAISS
+        from quantized_store import QuantizedVectorStore
+
+        embeddings, _ = configure_fake_backends(args)
+        corpus = make_corpus(args.docs, args.doc_words, seed=args.seed)
+        chunks = [chunk for doc in corpus
+                  for chunk in chunker.StructureAwareChunker().split_text(doc["text"], {"doc_id": doc["doc_id"]})]
+        texts = [text for text, _ in chunks]
+        metadatas = [metadata for _, metadata in chunks]
+        vectors = embeddings.embed_documents(texts)
+        text_embeddings = list(zip(texts, vectors))
+        query_vectors = [embeddings.embed_query(q) for q, _ in make_queries(corpus, args.queries, seed=args.seed + 2)]
+
+        baseline = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas)
+        baseline_path = os.path.join(mount, "float32")
+        baseline.save_local(baseline_path)
+
+        def search_all(store):
+            latencies, ids = [], []
+            for vector in query_vectors:
+                start = time.perf_counter()
+                docs = store.similarity_search_by_vector(vector, k=args.k)
+                latencies.append(time.perf_counter() - start)
+                ids.append([doc.page_content for doc in docs])
+            return latencies, ids
+
+        baseline_latency, truth = search_all(baseline)
+        results = {
+            "vectors": len(texts),
+            "dimensions": len(vectors[0]),
+            "stores": {
+                "float32_faiss": {
+                    "disk_bytes": directory_size(baseline_path),
+                    "memory_bytes": baseline.index.ntotal * baseline.index.d * 4,
+                    f"recall_at_{args.k}": 1.0,
+                    "search_latency": percentiles(baseline_latency),
+                }
+            },
+        }
+
+        variants = {"fp16": ("fp16", False), "sq8_rescore": ("sq8", True), "sq8": ("sq8", False)}
+        for name, (mode, rescore) in variants.items():
+            store = QuantizedVectorStore.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, mode=mode, rescore=rescore)
+            store_path = os.path.join(mount, name)
+            store.save_local(store_path)
+            store = QuantizedVectorStore.load_local(store_path, embeddings)
+            latency, found = search_all(store)
+            recall = np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth) if t])
+            results["stores"][name] = {
+                "disk_bytes": directory_size(store_path),
+                "memory_bytes": store.nbytes_in_memory,
+                f"recall_at_{args.k}": round(float(recall), 4),
+                "search_latency": percentiles(latency),
+            }
+        return results
+    finally:
+        shutil.rmtree(mount, ignore_errors=True)
+
+
+def run_tenant(args):
+    """Per-session FAISS directories vs the shared multi-tenant segment for many small sessions."""
+    mount = use_isolated_mount()
+    try:
+        import config
+        import rag
+        import tenant_store
+
+        embeddings, _ = configure_fake_backends(args)
+        corpus = make_corpus(args.sessions, args.doc_words, seed=args.seed)
+        queries = make_queries(corpus, args.queries, seed=args.seed + 2)
+
+        def count_files(path):
+            return sum(len(files) for _, _, files in os.walk(path))
+
+        def search_latencies(session_of):
+            # Sessions are visited in random order, as on a busy instance
+            latencies = []
+            for question, doc_id in queries:
+                query_vector = embeddings.embed_query(question)
+                start = time.perf_counter()
+                stores = rag.RAGManager(session_of[doc_id]).get_vector_stores()
+                for store in stores:
+                    store.similarity_search_by_vector(query_vector, k=args.k)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        results = {"sessions": len(corpus), "user_store_cache_size": config.USER_STORE_CACHE_SIZE}
+        for backend, root in (("faiss", config.USER_VECTOR_STORES_PATH), ("tenant", config.TENANT_STORE_PATH)):
+            config.USER_STORE_BACKEND = backend
+            rag.clear_caches()
+            # Separate session IDs per backend, so the tenant run doesn't import the FAISS stores
+            session_of = {doc["doc_id"]: f"bench-{backend}-{i}" for i, doc in enumerate(corpus)}
+            ingest = []
+            for doc in corpus:
+                start = time.perf_counter()
+                rag.RAGManager(session_of[doc["doc_id"]]).add_text_to_user_store(doc["text"])
+                ingest.append(time.perf_counter() - start)
+            entry = {
+                "ingest_latency": percentiles(ingest),
+                "files_on_disk": count_files(root),
+                "bytes_on_disk": directory_size(root),
+                "query_latency": percentiles(search_latencies(session_of)),
+            }
+            if backend == "tenant":
+                # A new instance replays the shared segments once at startup
+                tenant_store.reset_index()
+                start = time.perf_counter()
+                index = tenant_store.get_index()
+                entry["replay_seconds"] = round(time.perf_counter() - start, 4)
+                entry["memory_bytes"] = index.nbytes_in_memory
+            results[backend] = entry
+        rag.clear_caches()
+        return results
+    finally:
+        shutil.rmtree(mount, ignore_errors=True)
+
+
+def run_rerank(args):
+    """Context size, hit rate and latency of plain top-k retrieval vs over-fetch + local rerank."""
+    mount = use_isolated_mount()
+    try:
+        import chunker
+        import rerank
+        import vector_search
+        from langchain_community.vectorstores import FAISS
+
+        embeddings, _ = configure_fake_backends(args)
+        corpus = make_corpus(args.docs, args.doc_words, seed=args.seed)
+        chunks = [chunk for doc in corpus
+                  for chunk in chunker.StructureAwareChunker().split_text(doc["text"], {"doc_id": doc["doc_id"]})]
+        store = FAISS.from_texts([t for t, _ in chunks], embeddings, metadatas=[m for _, m in chunks])
+        queries = [(q, doc_id, embeddings.embed_query(q)) for q, doc_id in make_queries(corpus, args.queries, seed=args.seed + 2)]
+
+        def evaluate(retrieve):
+            latencies, tokens, hits, distinct = [], [], 0, []
+            for question, doc_id, vector in queries:
+                start = time.perf_counter()
+                docs = retrieve(question, vector)
+                latencies.append(time.perf_counter() - start)
+                tokens.append(sum(chunker.count_tokens(doc.page_content) for doc in docs))
+                hits += any(doc.metadata.get("doc_id") == doc_id for doc in docs)
+                distinct.append(len({doc.metadata.get("doc_id") for doc in docs}))
+            return {
+                "hit_rate": round(hits / len(queries), 4),
+                "mean_context_tokens": round(sum(tokens) / len(tokens), 1),
+                "mean_distinct_documents": round(sum(distinct) / len(distinct), 2),
+                "latency": percentiles(latencies),
+            }
+
+        baseline = evaluate(lambda q, v: store.similarity_search_by_vector(v, k=args.baseline_k))
+        reranked = evaluate(lambda q, v: rerank.rerank(q, v, vector_search.search_with_vectors(store, [v], args.fetch_k), top_n=args.top_n))
+        return {
+            "chunks": len(chunks),
+            f"top_{args.baseline_k}": baseline,
+            f"fetch_{args.fetch_k}_rerank_top_{args.top_n}": reranked,
+            "context_token_savings": round(1 - reranked["mean_context_tokens"] / baseline["mean_context_tokens"], 4),
+            "added_latency_p50_ms": round(reranked["latency"]["p50_ms"] - baseline["latency"]["p50_ms"], 3),
+        }
+    finally:
+        shutil.rmtree(mount, ignore_errors=True)
+
+
+def run_search(args):
+    """NumPy-vectorized search and MMR (vector_search.py) vs LangChain's FAISS wrapper."""
+    mount = use_isolated_mount()
+    try:
+        import numpy as np
+        import chunker
+        import vector_search
+        from langchain_community.vectorstores import FAISS
+
+        embeddings, _ = configure_fake_backends(args)
+        corpus = make_corpus(args.docs, args.doc_words, seed=args.seed)
+        chunks = [chunk for doc in corpus
+                  for chunk in chunker.StructureAwareChunker().split_text(doc["text"], {"doc_id": doc["doc_id"]})]
+        store = FAISS.from_texts([t for t, _ in chunks], embeddings, metadatas=[m for _, m in chunks])
+        # Pairs of (question, variant) stand in for a follow-up and its reformulation
+        pairs = [(q, "Please explain: " + q) for q, _ in make_queries(corpus, args.queries, seed=args.seed + 2)]
+        vectors = {q: embeddings.embed_query(q) for pair in pairs for q in pair}
+        mmr_kwargs = {"k": args.k, "fetch_k": args.fetch_k, "lambda_mult": args.lambda_mult}
+
+        def timed_runs(fn):
+            latencies, outputs = [], []
+            for pair in pairs:
+                start = time.perf_counter()
+                outputs.append(fn(pair))
+                latencies.append(time.perf_counter() - start)
+            return percentiles(latencies), outputs
+
+        start = time.perf_counter()
+        vector_search.store_matrix(store)
+        first_call_seconds = time.perf_counter() - start
+
+        retriever = store.as_retriever(search_type="mmr", search_kwargs=mmr_kwargs)
+        retriever_latency, _ = timed_runs(lambda pair: retriever.invoke(pair[0]))
+        langchain_latency, langchain_mmr = timed_runs(
+            lambda pair: store.max_marginal_relevance_search_by_vector(vectors[pair[0]], **mmr_kwargs))
+        numpy_latency, numpy_mmr = timed_runs(
+            lambda pair: vector_search.max_marginal_relevance_search(store, vectors[pair[0]], **mmr_kwargs))
+        agreement = np.mean([
+            len({d.page_content for d in a} & {d.page_content for d in b}) / max(1, len(a))
+            for a, b in zip(langchain_mmr, numpy_mmr)
+        ])
+
+        sequential_latency, _ = timed_runs(
+            lambda pair: [store.similarity_search_by_vector(vectors[q], k=args.fetch_k) for q in pair])
+        batched_latency, _ = timed_runs(
+            lambda pair: vector_search.search(store, [vectors[q] for q in pair], args.fetch_k))
+        # The pure NumPy path, as used for tenant stores
+        matrix, norms, _ = vector_search.store_matrix(store)
+        matmul_latency, _ = timed_runs(
+            lambda pair: vector_search._top_k(vector_search.batch_distances(matrix, norms, [vectors[q] for q in pair]), args.fetch_k))
+
+        return {
+            "chunks": len(chunks),
+            "norms_cache_build_seconds": round(first_call_seconds, 4),
+            "mmr": {
+                "as_retriever_mmr": retriever_latency,
+                "langchain_mmr_by_vector": langchain_latency,
+                "numpy_mmr": numpy_latency,
+                "selection_agreement": round(float(agreement), 4),
+            },
+            "two_query_search": {
+                "langchain_sequential": sequential_latency,
+                "vector_search_batched": batched_latency,
+                "numpy_matmul_topk": matmul_latency,
+            },
+        }
+    finally:
+        shutil.rmtree(mount, ignore_errors=True)
+
+
+def run_batch(args):
+    """Sequential answer_question calls vs one answer_questions batch over the same questions."""
+    mount = use_isolated_mount()
+    try:
+        import rag
+
+        embeddings, llm = configure_fake_backends(args)
+        corpus = make_corpus(args.docs, args.doc_words, seed=args.seed)
+        manager = rag.RAGManager("bench-batch")
+        for doc in corpus:
+            manager.add_text_to_user_store(doc["text"])
+        # Distinct questions, so single-flight coalescing doesn't blur the comparison
+        questions = list(dict.fromkeys(q for q, _ in make_queries(corpus, args.queries, seed=args.seed + 2)))
+
+        results = {"questions": len(questions), "concurrency": args.concurrency}
+        for name in ("sequential", "batch"):
+            rag.clear_caches()
+            embed_calls, llm_calls = embeddings.calls, llm.calls
+            start = time.perf_counter()
+            if name == "sequential":
+                for question in questions:
+                    manager.answer_question(question, [])
+            else:
+                summary = list(manager.answer_questions([{"query": q} for q in questions], concurrency=args.concurrency))[-1]["summary"]
+            seconds = time.perf_counter() - start
+            results[name] = {
+                "seconds": round(seconds, 3),
+                "questions_per_sec": round(len(questions) / seconds, 2),
+                "embedding_calls": embeddings.calls - embed_calls,
+                "chat_model_calls": llm.calls - llm_calls,
+            }
+        results["batch"].update(embed_ms=summary["embed_ms"], search_ms=summary["search_ms"])
+        results["speedup"] = round(results["sequential"]["seconds"] / results["batch"]["seconds"], 2)
+        return results
+    finally:
+        shutil.rmtree(mount, ignore_errors=True)
+
+
+def run_memory(args):
+    """A long conversation with client-sent history vs server-side memory with compaction."""
+    mount = use_isolated_mount()
+    try:
+        import config
+        import chunker
+        import rag
+        import conversation_store
+
+        configure_fake_backends(args)
+        corpus = make_corpus(args.docs, args.doc_words, seed=args.seed)
+        questions = [q for q, _ in make_queries(corpus, args.turns, seed=args.seed + 3)]
+        memory = conversation_store.get_store()
+
+        def converse(name, manager):
+            history, payloads, history_tokens, latencies = [], [], [], []
+            for question in questions:
+                if name == "client_history":
+                    payloads.append(len(json.dumps({"query": question, "history": history})))
+                    history_tokens.append(sum(chunker.count_tokens(m["content"]) for m in history))
+                    start = time.perf_counter()
+                    answer = manager.answer_question(question, history)
+                    latencies.append(time.perf_counter() - start)
+                    history += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+                else:
+                    payloads.append(len(json.dumps({"query": question})))
+                    history_tokens.append(sum(chunker.count_tokens(m["content"]) for m in memory.history(manager.session_id)))
+                    start = time.perf_counter()
+                    manager.answer_with_memory(question)
+                    latencies.append(time.perf_counter() - start)
+                    # Let this turn's background compaction finish, as it would between user messages
+                    memory.compact(manager.session_id, manager.llm)
+            return {
+                "last_request_bytes": payloads[-1],
+                "total_request_bytes": sum(payloads),
+                "last_history_tokens": history_tokens[-1],
+                "max_history_tokens": max(history_tokens),
+                "latency": percentiles(latencies),
+            }
+
+        results = {"turns": len(questions)}
+        for name in ("client_history", "server_memory"):
+            manager = rag.RAGManager(f"bench-memory-{name.replace('_', '-')}")
+            for doc in corpus:
+                manager.add_text_to_user_store(doc["text"])
+            results[name] = converse(name, manager)
+        db_files = [config.CONVERSATION_DB_PATH + suffix for suffix in ("", "-wal")]
+        results["server_memory"]["db_bytes"] = sum(os.path.getsize(path) for path in db_files if os.path.exists(path))
+        return results
+    finally:
+        shutil.rmtree(mount, ignore_errors=True)
+
+
+def _parse_importtime(stderr):
+    """Parses `python -X importtime` output into (module, self_us, cumulative_us, depth) rows."""
+    prefix = "import time:"
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith(prefix):
+            continue
+        parts = line[len(prefix):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # the header row
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), self_us, cumulative_us, depth))
+    return rows
+
+
+def profile_import(module, env, top):
+    """Imports `module` in a fresh interpreter with -X importtime and summarises where the time goes."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    wall_seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed"}
+
+    rows = _parse_importtime(proc.stderr)
+    # Attribute every module's self time to its top-level package
+    packages = {}
+    for name, self_us, _, _ in rows:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    module_total = next((cumulative_us for name, _, cumulative_us, depth in rows if name == module and depth == 0), None)
+    return {
+        "wall_seconds": round(wall_seconds, 4),
+        "module_import_ms": round(module_total / 1000, 2) if module_total is not None else None,
+        "modules_imported": len(rows),
+        "top_packages_ms": [
+            {"package": package, "self_ms": round(us / 1000, 2)}
+            for package, us in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        ],
+        "top_self_ms": [
+            {"module": name, "self_ms": round(self_us / 1000, 2)}
+            for name, self_us, _, _ in sorted(rows, key=lambda row: -row[1])[:top]
+        ],
+    }
+
+
+def run_importtime(args):
+    """Import-time profile of the service entry points plus the time warmup() takes."""
+    mount = use_isolated_mount()
+    try:
+        env = dict(os.environ, WARMUP_ON_START="0")
+        results = {module: profile_import(module, env, args.top) for module in args.modules}
+
+        # Time the background warmup path in a fresh interpreter, as a cold instance would run it
+        code = "import time, rag; s = time.perf_counter(); rag.warmup(); print(time.perf_counter() - s)"
+        proc = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+        if proc.returncode == 0:
+            results["warmup_seconds"] = round(float(proc.stdout.strip().splitlines()[-1]), 4)
+        else:
+            results["warmup_error"] = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "warmup failed"
+        return results
+    finally:
+        shutil.rmtree(mount, ignore_errors=True)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(name, args, results):
+    """Writes one JSON result file per run, tagged with parameters and environment."""
+    payload = {
+        "benchmark": name,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {k: v for k, v in vars(args).items() if k not in ("func", "out")},
+        "results": results,
+    }
+    out = args.out
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"\nResults written to {out}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG-Service benchmark suite")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(sub):
+        sub.add_argument("--seed", type=int, default=42)
+        sub.add_argument("--embed-latency-ms", type=float, default=0.0, help="Simulated latency per embedding call")
+        sub.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated latency per chat model call")
+        sub.add_argument("--out", help="Result file path (default: benchmark_results/<name>-<timestamp>.json)")
+
+    e2e = subparsers.add_parser("e2e", help="Ingest, index build, query latency and memory")
+    e2e.add_argument("--docs", type=int, default=100, help="Documents ingested into user sessions")
+    e2e.add_argument("--base-docs", type=int, default=50, help="Documents in the base knowledge store")
+    e2e.add_argument("--doc-words", type=int, default=800, help="Words per synthetic document")
+    e2e.add_argument("--sessions", type=int, default=10)
+    e2e.add_argument("--queries", type=int, default=50)
+    add_common(e2e)
+    e2e.set_defaults(func=run_e2e)
+
+    chunking = subparsers.add_parser("chunking", help="Index size and retrieval quality per chunking strategy")
+    chunking.add_argument("--docs", type=int, default=100)
+    chunking.add_argument("--doc-words", type=int, default=1500)
+    chunking.add_argument("--queries", type=int, default=200)
+    chunking.add_argument("--k", type=int, default=3)
+    chunking.add_argument("--chunk-tokens", type=int, nargs="+", default=[128, 256, 384])
+    chunking.add_argument("--overlaps", type=int, nargs="+", default=[0, 24, 48])
+    add_common(chunking)
+    chunking.set_defaults(func=run_chunking)
+
+    quantization = subparsers.add_parser("quantization", help="Quantized vs float32 user stores")
+    quantization.add_argument("--docs", type=int, default=300)
+    quantization.add_argument("--doc-words", type=int, default=1500)
+    quantization.add_argument("--queries", type=int, default=200)
+    quantization.add_argument("--k", type=int, default=5)
+    add_common(quantization)
+    quantization.set_defaults(func=run_quantization)
+
+    tenant = subparsers.add_parser("tenant", help="Per-session FAISS directories vs the multi-tenant store")
+    tenant.add_argument("--sessions", type=int, default=300, help="Sessions, each ingesting one small document")
+    tenant.add_argument("--doc-words", type=int, default=300)
+    tenant.add_argument("--queries", type=int, default=300)
+    tenant.add_argument("--k", type=int, default=3)
+    add_common(tenant)
+    tenant.set_defaults(func=run_tenant)
+
+    rerank = subparsers.add_parser("rerank", help="Plain top-k retrieval vs over-fetch + local rerank")
+    rerank.add_argument("--docs", type=int, default=200)
+    rerank.add_argument("--doc-words", type=int, default=1500)
+    rerank.add_argument("--queries", type=int, default=300)
+    rerank.add_argument("--baseline-k", type=int, default=6, help="Chunks stuffed without reranking (3 per store, 2 stores)")
+    rerank.add_argument("--fetch-k", type=int, default=20)
+    rerank.add_argument("--top-n", type=int, default=3)
+    add_common(rerank)
+    rerank.set_defaults(func=run_rerank)
+
+    search = subparsers.add_parser("search", help="Vectorized search/MMR vs LangChain's FAISS wrapper")
+    search.add_argument("--docs", type=int, default=300)
+    search.add_argument("--doc-words", type=int, default=1500)
+    search.add_argument("--queries", type=int, default=200)
+    search.add_argument("--k", type=int, default=4)
+    search.add_argument("--fetch-k", type=int, default=20)
+    search.add_argument("--lambda-mult", type=float, default=0.5)
+    add_common(search)
+    search.set_defaults(func=run_search)
+
+    batch = subparsers.add_parser("batch", help="Sequential /rag-style answers vs the batch path")
+    batch.add_argument("--docs", type=int, default=50)
+    batch.add_argument("--doc-words", type=int, default=800)
+    batch.add_argument("--queries", type=int, default=100)
+    batch.add_argument("--concurrency", type=int, default=8)
+    add_common(batch)
+    batch.set_defaults(func=run_batch)
+
+    memory = subparsers.add_parser("memory", help="Client-sent history vs server-side conversation memory")
+    memory.add_argument("--docs", type=int, default=20)
+    memory.add_argument("--doc-words", type=int, default=800)
+    memory.add_argument("--turns", type=int, default=60)
+    add_common(memory)
+    memory.set_defaults(func=run_memory)
+
+    importtime = subparsers.add_parser("importtime", help="Cold-start import profile (python -X importtime)")
+    importtime.add_argument("--modules", nargs="+", default=["app", "rag", "TextProcessor"])
+    importtime.add_argument("--top", type=int, default=15, help="Number of packages/modules to list")
+    importtime.add_argument("--out", help="Result file path (default: benchmark_results/<name>-<timestamp>.json)")
+    importtime.set_defaults(func=run_importtime)
+
+    args = parser.parse_args()
+    results = args.func(args)
+    write_results(args.command, args, results)
+
+
+if __name__ == "__main__":
+    main()
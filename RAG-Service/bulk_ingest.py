@@ -0,0 +1,251 @@
+"""
+Bulk ingestion of a directory of mixed documents (PDF, DOCX, JSON, TXT, MD) into a
+FAISS vector store.
+
+Files are converted and chunked in a process pool, chunks are streamed into batched
+embedding calls in the main process, and the store is written in one pass. Progress
+is checkpointed next to the target store so an interrupted run can be resumed.
+
+Usage:
+    python bulk_ingest.py                      # base_data -> base_db
+    python bulk_ingest.py docs/ --store my_db --workers 8 --batch-size 100
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+import config
+import backends
+
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".json", ".txt", ".md"}
+MANIFEST_NAME = "ingest_manifest.json"
+
+
+def _convert_file(path, root):
+    """Worker: converts and chunks one file. Returns (relative_path, chunks, error)."""
+    from TextProcessor import FileConverter
+    from chunker import StructureAwareChunker
+
+    relative_path = os.path.relpath(path, root)
+    try:
+        converter = FileConverter(path)
+        sections = converter.convert_sections()
+        chunks = StructureAwareChunker(source_type=converter.input_type).split_sections(sections)
+    except Exception as e:
+        return relative_path, [], str(e)
+    return relative_path, [(text, dict(metadata, source=relative_path)) for text, metadata in chunks], None
+
+
+def _file_signature(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def find_files(root):
+    """Lists supported files under root in a stable order."""
+    paths = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                paths.append(os.path.join(directory, name))
+    return sorted(paths)
+
+
+class BulkIngestor:
+    """Streams converted chunks into batched embedding calls and a single FAISS store."""
+
+    def __init__(self, root, store_path, workers=None, batch_size=100, checkpoint_every=200, resume=True):
+        self.root = root
+        self.store_path = store_path.rstrip("/\\")
+        self.partial_path = self.store_path + ".partial"
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.checkpoint_every = checkpoint_every
+        self.resume = resume
+        self.embeddings = backends.get_embeddings()
+
+        self.vector_store = None
+        self.manifest = {"files": {}, "failed": {}}
+        self.pending_chunks = []
+        self.pending_files = {}
+        self.stats = {"files": 0, "chunks": 0, "bytes": 0, "failed": 0, "skipped": 0}
+
+    def _load_checkpoint(self):
+        manifest_path = os.path.join(self.partial_path, MANIFEST_NAME)
+        if not (self.resume and os.path.isfile(manifest_path)):
+            shutil.rmtree(self.partial_path, ignore_errors=True)
+            return
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+        if os.path.isfile(os.path.join(self.partial_path, "index.faiss")):
+            from langchain_community.vectorstores import FAISS
+            self.vector_store = FAISS.load_local(self.partial_path, self.embeddings, allow_dangerous_deserialization=True)
+        print(f"Resuming: {len(self.manifest['files'])} files already ingested in {self.partial_path}")
+
+    def _save_checkpoint(self):
+        os.makedirs(self.partial_path, exist_ok=True)
+        if self.vector_store is not None:
+            self.vector_store.save_local(self.partial_path)
+        # Write the manifest last and atomically, so it never lists files missing from the index
+        manifest_path = os.path.join(self.partial_path, MANIFEST_NAME)
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def _flush(self):
+        """Embeds all pending chunks in batches, adds them to the store and marks their files done."""
+        from langchain_community.vectorstores import FAISS
+
+        for start in range(0, len(self.pending_chunks), self.batch_size):
+            batch = self.pending_chunks[start:start + self.batch_size]
+            texts = [text for text, _ in batch]
+            vectors = self.embeddings.embed_documents(texts)
+            text_embeddings = list(zip(texts, vectors))
+            metadatas = [metadata for _, metadata in batch]
+            if self.vector_store is None:
+                self.vector_store = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas)
+            else:
+                self.vector_store.add_embeddings(text_embeddings, metadatas=metadatas)
+        self.manifest["files"].update(self.pending_files)
+        self.pending_chunks = []
+        self.pending_files = {}
+
+    def _finalize(self):
+        """Atomically replaces the target store with the newly built one."""
+        tmp_path = self.store_path + ".tmp"
+        old_path = self.store_path + ".old"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        self.vector_store.save_local(tmp_path)
+        with open(os.path.join(tmp_path, MANIFEST_NAME), "w") as f:
+            json.dump(self.manifest, f)
+        if os.path.exists(self.store_path):
+            shutil.rmtree(old_path, ignore_errors=True)
+            os.replace(self.store_path, old_path)
+        os.replace(tmp_path, self.store_path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        shutil.rmtree(self.partial_path, ignore_errors=True)
+
+    def _report(self, done, total, start, final=False):
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        line = (f"[{done}/{total} files] {self.stats['chunks']} chunks | "
+                f"{self.stats['files'] / elapsed:.1f} files/s, {self.stats['chunks'] / elapsed:.1f} chunks/s, "
+                f"{self.stats['bytes'] / elapsed / 1e6:.2f} MB/s | {self.stats['failed']} failed")
+        print(("Done: " if final else "") + line, flush=True)
+
+    def run(self):
+        """Ingests every supported file under root. Returns the run statistics."""
+        self._load_checkpoint()
+        paths = find_files(self.root)
+        todo = []
+        for path in paths:
+            previous = self.manifest["files"].get(os.path.relpath(path, self.root))
+            if previous is not None and {k: previous.get(k) for k in ("size", "mtime_ns")} == _file_signature(path):
+                self.stats["skipped"] += 1
+            else:
+                todo.append(path)
+
+        print(f"Ingesting {len(todo)} files from '{self.root}' with {self.workers} workers "
+              f"({self.stats['skipped']} already done)")
+        start = time.perf_counter()
+        last_report = start
+        files_since_checkpoint = 0
+        done = self.stats["skipped"]
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            # Keep a bounded number of files in flight so memory stays flat on huge directories
+            iterator = iter(todo)
+            in_flight = {}
+
+            def submit_next():
+                path = next(iterator, None)
+                if path is not None:
+                    in_flight[executor.submit(_convert_file, path, self.root)] = path
+
+            for _ in range(self.workers * 4):
+                submit_next()
+
+            while in_flight:
+                future = next(as_completed(in_flight))
+                path = in_flight.pop(future)
+                submit_next()
+
+                relative_path, chunks, error = future.result()
+                done += 1
+                if error:
+                    print(f"Failed to ingest {relative_path}: {error}")
+                    self.manifest["failed"][relative_path] = error
+                    self.stats["failed"] += 1
+                    continue
+
+                self.pending_chunks.extend(chunks)
+                self.pending_files[relative_path] = dict(_file_signature(path), chunks=len(chunks))
+                self.manifest["failed"].pop(relative_path, None)
+                self.stats["files"] += 1
+                self.stats["chunks"] += len(chunks)
+                self.stats["bytes"] += os.path.getsize(path)
+                files_since_checkpoint += 1
+
+                if len(self.pending_chunks) >= self.batch_size:
+                    self._flush()
+                if files_since_checkpoint >= self.checkpoint_every:
+                    self._flush()
+                    self._save_checkpoint()
+                    files_since_checkpoint = 0
+                if time.perf_counter() - last_report >= 5:
+                    self._report(done, len(paths), start)
+                    last_report = time.perf_counter()
+
+        self._flush()
+        if self.vector_store is None:
+            print("No content could be extracted; the store was not written.")
+            shutil.rmtree(self.partial_path, ignore_errors=True)
+            return self.stats
+
+        self._finalize()
+        self.stats["seconds"] = round(time.perf_counter() - start, 3)
+        self._report(done, len(paths), start, final=True)
+        print(f"Vector store written to '{self.store_path}'.")
+        return self.stats
+
+
+def ingest_directory(root, store_path, **kwargs):
+    """Convenience wrapper around BulkIngestor(...).run()."""
+    return BulkIngestor(root, store_path, **kwargs).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory of documents into a FAISS store")
+    parser.add_argument("directory", nargs="?", default=config.BASE_DATA_PATH)
+    parser.add_argument("--store", default=config.BASE_VECTOR_STORE_PATH, help="Target vector store directory")
+    parser.add_argument("--workers", type=int, default=None, help="Conversion processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Chunks per embedding call")
+    parser.add_argument("--checkpoint-every", type=int, default=200, help="Files between resume checkpoints")
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint from an interrupted run")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if config.MODEL_BACKEND == "google" and not os.getenv("GOOGLE_API_KEY"):
+        print("Error: GOOGLE_API_KEY environment variable not set in your .env file.")
+        sys.exit(1)
+    if not os.path.isdir(args.directory):
+        print(f"The directory '{args.directory}' does not exist.")
+        sys.exit(1)
+
+    ingest_directory(
+        args.directory,
+        args.store,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        checkpoint_every=args.checkpoint_every,
+        resume=not args.restart,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Structure-aware chunking for ingestion.
+
+Converters hand over their natural units as sections (PDF pages, DOCX paragraphs,
+top-level JSON keys, paragraphs of plain text). The chunker packs whole sections into
+chunks of up to `chunk_tokens` tokens and only breaks a section apart (at sentence,
+then word boundaries) when it is too large on its own. Overlap is added only where a
+section was cut mid-text, never across section boundaries, so far fewer tokens are
+embedded twice than with a fixed character overlap.
+
+Token counts are approximated with a word/punctuation regex, which tracks model
+tokenizers closely enough for sizing chunks and needs no extra dependency.
+"""
+import re
+
+import config
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+_PARAGRAPH_BOUNDARY = re.compile(r"\n\s*\n")
+
+# Section metadata keys describing a position; when a chunk spans several sections the
+# last position is recorded as "<key>_end".
+_POSITION_KEYS = ("page", "paragraph", "json_index")
+
+
+def count_tokens(text):
+    """Approximate token count of a text."""
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+def sections_from_text(text, metadata=None):
+    """Splits plain text into paragraph sections."""
+    metadata = metadata or {}
+    sections = []
+    for index, paragraph in enumerate(p.strip() for p in _PARAGRAPH_BOUNDARY.split(text)):
+        if paragraph:
+            sections.append((paragraph, dict(metadata, paragraph=index)))
+    return sections
+
+
+def overlap_for(source_type):
+    """Returns the configured overlap (tokens) for a corpus/source type."""
+    return config.CHUNK_OVERLAP_BY_TYPE.get(source_type, config.CHUNK_OVERLAP_TOKENS)
+
+
+class StructureAwareChunker:
+    """Packs converter sections into token-sized chunks."""
+
+    def __init__(self, chunk_tokens=None, overlap_tokens=None, source_type=None):
+        self.chunk_tokens = chunk_tokens or config.CHUNK_TOKENS
+        if overlap_tokens is None:
+            overlap_tokens = overlap_for(source_type)
+        self.overlap_tokens = min(overlap_tokens, self.chunk_tokens // 2)
+
+    def _pieces(self, section_index, text):
+        """Yields (section_index, text, tokens) pieces no larger than chunk_tokens."""
+        tokens = count_tokens(text)
+        if tokens <= self.chunk_tokens:
+            yield section_index, text, tokens
+            return
+        for sentence in _SENTENCE_BOUNDARY.split(text):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            tokens = count_tokens(sentence)
+            if tokens <= self.chunk_tokens:
+                yield section_index, sentence, tokens
+                continue
+            # A single run-on "sentence" (tables, code, JSON values): cut it by words
+            words = sentence.split()
+            step = max(1, len(words) * self.chunk_tokens // tokens)
+            for start in range(0, len(words), step):
+                piece = " ".join(words[start:start + step])
+                yield section_index, piece, count_tokens(piece)
+
+    def _build_chunk(self, pieces, sections):
+        parts = []
+        previous_section = None
+        for section_index, text, _ in pieces:
+            if previous_section is None:
+                parts.append(text)
+            elif section_index == previous_section:
+                parts.append(" " + text)
+            else:
+                parts.append("\n\n" + text)
+            previous_section = section_index
+
+        first_section, last_section = pieces[0][0], pieces[-1][0]
+        metadata = dict(sections[first_section][1])
+        if last_section != first_section:
+            last_metadata = sections[last_section][1]
+            for key in _POSITION_KEYS:
+                if key in last_metadata and last_metadata[key] != metadata.get(key):
+                    metadata[f"{key}_end"] = last_metadata[key]
+        return "".join(parts), metadata
+
+    def split_sections(self, sections):
+        """
+        Chunks a list of (text, metadata) sections.
+        Returns a list of (chunk_text, metadata) tuples.
+        """
+        chunks = []
+        current, current_tokens = [], 0
+        for section_index, (text, _) in enumerate(sections):
+            for piece in self._pieces(section_index, text):
+                if current and current_tokens + piece[2] > self.chunk_tokens:
+                    chunks.append(self._build_chunk(current, sections))
+                    # Carry trailing sentences over only when the cut falls inside a section
+                    carried, carried_tokens = [], 0
+                    if self.overlap_tokens and current[-1][0] == piece[0]:
+                        for previous in reversed(current):
+                            if previous[0] != piece[0] or carried_tokens + previous[2] > self.overlap_tokens:
+                                break
+                            carried.insert(0, previous)
+                            carried_tokens += previous[2]
+                        if carried_tokens + piece[2] > self.chunk_tokens:
+                            carried, carried_tokens = [], 0
+                    current, current_tokens = carried, carried_tokens
+                current.append(piece)
+                current_tokens += piece[2]
+        if current:
+            chunks.append(self._build_chunk(current, sections))
+        return chunks
+
+    def split_text(self, text, metadata=None):
+        """Chunks plain text using its paragraphs as sections."""
+        return self.split_sections(sections_from_text(text, metadata))
+
+    def split_documents(self, documents):
+        """Chunks LangChain documents, keeping each document's metadata on its chunks."""
+        from langchain_core.documents import Document
+
+        split_docs = []
+        for doc in documents:
+            for text, metadata in self.split_text(doc.page_content, doc.metadata):
+                split_docs.append(Document(page_content=text, metadata=metadata))
+        return split_docs
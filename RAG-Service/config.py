@@ -1,4 +1,6 @@
 import os
+import socket
+import tempfile
 
 # The root path provided by the Cloud Run volume mount.
 # Default to a local directory for testing.
@@ -14,12 +16,126 @@ BASE_VECTOR_STORE_PATH = os.path.join(MOUNT_PATH, "base_db")
 USER_UPLOADS_PATH = os.path.join(MOUNT_PATH, "user_uploads")
 USER_VECTOR_STORES_PATH = os.path.join(MOUNT_PATH, "user_dbs")
 
+# --- Chunking ---
+
+# Target chunk size and default overlap, in (approximate) tokens. Overlap is only
+# applied where a section (page, paragraph, JSON key) has to be cut mid-text.
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "24"))
+
+# Per-corpus overlap overrides keyed by input type, e.g. "pdf=32,docx=16,json=0"
+CHUNK_OVERLAP_BY_TYPE = {
+    key.strip(): int(value)
+    for key, value in (item.split("=", 1) for item in os.getenv("CHUNK_OVERLAP_BY_TYPE", "json=0").split(",") if "=" in item)
+}
+
+# --- Sharding and Session Affinity ---
+
+# Number of hashed directory levels used to fan user stores out under
+# USER_VECTOR_STORES_PATH (e.g. 2 -> user_dbs/3f/a2/<session_id>). 0 keeps the flat layout.
+USER_STORE_SHARD_DEPTH = int(os.getenv("USER_STORE_SHARD_DEPTH", "2"))
+
+# Identity of this instance and the comma-separated list of all instances that
+# take part in the consistent-hash ring used for session-affinity hints.
+INSTANCE_ID = os.getenv("INSTANCE_ID", socket.gethostname())
+SERVICE_INSTANCES = [i.strip() for i in os.getenv("SERVICE_INSTANCES", "").split(",") if i.strip()]
+
+# Maximum number of user vector stores kept loaded in memory per instance.
+USER_STORE_CACHE_SIZE = int(os.getenv("USER_STORE_CACHE_SIZE", "64"))
+
+# Number of query embeddings kept in memory per instance (0 disables the cache).
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+
+# --- User Store Format ---
+
+# "none" keeps float32 FAISS stores. "fp16" or "sq8" write new user stores as scalar-
+# quantized NumPy stores (see quantized_store.py); existing stores keep their format.
+USER_STORE_QUANTIZATION = os.getenv("USER_STORE_QUANTIZATION", "none")
+# For sq8: keep a memory-mapped float16 copy to re-score the top candidates exactly,
+# fetching RESCORE_FACTOR * k candidates from the quantized search.
+USER_STORE_RESCORE = os.getenv("USER_STORE_RESCORE", "1") == "1"
+RESCORE_FACTOR = int(os.getenv("RESCORE_FACTOR", "4"))
+
+# "faiss" keeps one vector store directory per session under USER_VECTOR_STORES_PATH.
+# "tenant" appends every session's chunks to a shared segment log under TENANT_STORE_PATH
+# and searches per-session posting lists held in memory (see tenant_store.py).
+USER_STORE_BACKEND = os.getenv("USER_STORE_BACKEND", "faiss")
+TENANT_STORE_PATH = os.path.join(MOUNT_PATH, "tenant_store")
+# How often segments appended by other instances are picked up (0 disables tailing).
+TENANT_REFRESH_SECONDS = float(os.getenv("TENANT_REFRESH_SECONDS", "2"))
+
+# --- Batch Answering ---
+
+# Concurrent reformulation/generation calls per /rag/batch request (and batch_rag.py run),
+# and the largest number of questions one request may carry.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "1000"))
+
+# --- Conversation Memory ---
+
+# /rag requests without a "history" field use the conversation kept server-side for the
+# session (see conversation_store.py). Once more than CONVERSATION_MAX_MESSAGES messages
+# are stored verbatim, all but the newest CONVERSATION_KEEP_MESSAGES are folded into a
+# running summary by the chat model, so every session's memory stays bounded.
+# The database (WAL mode) must be on a disk local to the instance: WAL's shared-memory
+# index only works between processes on one host, and SQLite locking is unreliable on
+# network/FUSE mounts such as MOUNT_PATH. A load balancer following the session-affinity
+# hint (X-Session-Affinity, see sharding.py) keeps a session on the instance holding it.
+CONVERSATION_MEMORY = os.getenv("CONVERSATION_MEMORY", "1") == "1"
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", os.path.join(tempfile.gettempdir(), "rag-service", "conversations.sqlite3"))
+CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", "20"))
+CONVERSATION_KEEP_MESSAGES = int(os.getenv("CONVERSATION_KEEP_MESSAGES", "6"))
+
+# --- Uploads ---
+
+# Largest accepted request body (Flask's MAX_CONTENT_LENGTH); bigger uploads are
+# rejected with 413 from their Content-Length before the body is read.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+# Uploads are converted straight from memory (or Werkzeug's spooled temp file). Set to
+# "1" to also keep a copy under USER_UPLOADS_PATH after a successful ingest.
+KEEP_UPLOADS = os.getenv("KEEP_UPLOADS", "0") == "1"
+
+# --- Reranking ---
+
+# Over-fetch RERANK_FETCH_K chunks per store, rescore them locally (vector + lexical
+# relevance with MMR diversity, see rerank.py) and stuff only the best RERANK_TOP_N
+# into the prompt. "0" keeps the plain top-3 per store.
+RERANK = os.getenv("RERANK", "1") == "1"
+RERANK_FETCH_K = int(os.getenv("RERANK_FETCH_K", "20"))
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "3"))
+RERANK_LEXICAL_WEIGHT = float(os.getenv("RERANK_LEXICAL_WEIGHT", "0.3"))
+# 1.0 ranks by relevance only; lower values favour diverse chunks
+RERANK_MMR_LAMBDA = float(os.getenv("RERANK_MMR_LAMBDA", "0.7"))
+# For follow-up questions, also search with the user's original wording next to the
+# standalone reformulation (one extra embedding call, one batched search).
+SEARCH_ORIGINAL_QUESTION = os.getenv("SEARCH_ORIGINAL_QUESTION", "1") == "1"
+# Optional directory holding a cross-encoder as model.onnx + tokenizer.json (needs
+# onnxruntime and tokenizers); used instead of the vector + lexical relevance.
+RERANK_MODEL_PATH = os.getenv("RERANK_MODEL_PATH", "")
+
+# --- Instrumentation ---
+
+# Attach a Server-Timing header with the per-stage breakdown to every response.
+# Clients can also request it for a single call with the "X-Debug-Timing: 1" header.
+TIMING_HEADER = os.getenv("TIMING_HEADER", "0") == "1"
+
+# --- Cold Start ---
+
+# Start loading model clients, the base index and converter libraries in a background
+# thread as soon as the app is imported, instead of on the first request.
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "1") == "1"
+
 # --- Ensure Directories Exist on Startup ---
 os.makedirs(BASE_DATA_PATH, exist_ok=True)
 os.makedirs(BASE_VECTOR_STORE_PATH, exist_ok=True)
 os.makedirs(USER_UPLOADS_PATH, exist_ok=True)
 os.makedirs(USER_VECTOR_STORES_PATH, exist_ok=True)
+os.makedirs(os.path.dirname(CONVERSATION_DB_PATH) or ".", exist_ok=True)
 
 # --- Model and Embeddings Configuration ---
 EMBEDDING_MODEL = "models/embedding-001"
-CHAT_MODEL = "gemini-1.5-flash-latest"
\ No newline at end of file
+CHAT_MODEL = "gemini-1.5-flash-latest"
+
+# "google" uses Gemini; "fake" uses the deterministic offline backends in
+# fake_backends.py (for benchmarks and local runs without an API key).
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "google")
\ No newline at end of file
@@ -0,0 +1,208 @@
+"""
+Server-side conversation memory, so clients send only their new message instead of
+the whole chat history on every /rag call.
+
+Messages are appended to a SQLite database (CONVERSATION_DB_PATH, WAL mode) keyed by
+session_id and a per-session sequence number. It lives on the instance's local disk and
+is shared by that instance's workers only; never point it at the network mount.
+Memory is bounded per session: once more than CONVERSATION_MAX_MESSAGES messages are
+stored verbatim, all but the newest CONVERSATION_KEEP_MESSAGES are folded into a
+running summary by the chat model and deleted. Compaction runs in a background
+thread after the answer has been returned, so it never adds to a request's latency.
+
+The history handed to the chains is the summary (as one user/assistant exchange)
+followed by the verbatim messages, in the frontend's {"role", "content"} format.
+"""
+import sqlite3
+import threading
+
+import config
+from metrics import stage
+
+SUMMARY_PROMPT = (
+    "You maintain the memory of a conversation between a user and an assistant. Merge the "
+    "existing summary and the new messages into one updated summary of at most 200 words. "
+    "Keep facts, names, numbers, the user's goals and any open questions; drop small talk."
+)
+SUMMARY_REQUEST = "Summarize our conversation so far."
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS summaries (
+    session_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    through_seq INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def _transcript(messages):
+    return "\n".join(f"{'User' if role == 'user' else 'Assistant'}: {content}" for role, content in messages)
+
+
+# The summarization chain only depends on the (shared) chat model, so build it once per model
+_summary_chains = {}
+_summary_chains_lock = threading.Lock()
+
+def _summary_chain(llm):
+    with _summary_chains_lock:
+        chain = _summary_chains.get(id(llm))
+        if chain is None or chain[0] is not llm:
+            from langchain_core.prompts import ChatPromptTemplate
+            from langchain_core.output_parsers import StrOutputParser
+
+            prompt = ChatPromptTemplate.from_messages([
+                ("system", SUMMARY_PROMPT),
+                ("human", "Existing summary:\n{summary}\n\nNew messages:\n{transcript}"),
+            ])
+            chain = (llm, prompt | llm | StrOutputParser())
+            _summary_chains[id(llm)] = chain
+        return chain[1]
+
+
+class ConversationStore:
+    """Per-session message log with a running summary, in one SQLite database."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._compacting = set()
+        self._compacting_lock = threading.Lock()
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    def _connect(self):
+        """This thread's connection (sqlite3 connections can't be shared between threads)."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def history(self, session_id):
+        """The session's memory as {"role", "content"} messages: summary first, then verbatim turns."""
+        db = self._connect()
+        with stage("memory.load"):
+            summary = db.execute("SELECT summary FROM summaries WHERE session_id = ?", (session_id,)).fetchone()
+            rows = db.execute("SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)).fetchall()
+        history = []
+        if summary:
+            history += [{"role": "user", "content": SUMMARY_REQUEST}, {"role": "assistant", "content": summary[0]}]
+        return history + [{"role": role, "content": content} for role, content in rows]
+
+    def append(self, session_id, messages):
+        """Appends (role, content) messages to the session's log."""
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Sequence numbers keep growing past messages already folded into the summary
+            last = db.execute(
+                "SELECT MAX(COALESCE((SELECT MAX(seq) FROM messages WHERE session_id = ?), 0),"
+                " COALESCE((SELECT through_seq FROM summaries WHERE session_id = ?), 0))",
+                (session_id, session_id),
+            ).fetchone()[0]
+            db.executemany(
+                "INSERT INTO messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                [(session_id, last + i, role, content) for i, (role, content) in enumerate(messages, 1)],
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def clear(self, session_id):
+        """Forgets the session's conversation."""
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            db.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def compact(self, session_id, llm):
+        """
+        Folds all but the newest CONVERSATION_KEEP_MESSAGES messages into the summary once
+        the session holds more than CONVERSATION_MAX_MESSAGES. Returns whether it compacted.
+        """
+        db = self._connect()
+        rows = db.execute("SELECT seq, role, content FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)).fetchall()
+        if len(rows) <= config.CONVERSATION_MAX_MESSAGES:
+            return False
+        # Keep whole exchanges: the verbatim part starts with a user message
+        cut = max(len(rows) - config.CONVERSATION_KEEP_MESSAGES, 1)
+        while cut < len(rows) and rows[cut][1] != "user":
+            cut += 1
+        old = rows[:cut]
+        current = db.execute("SELECT summary, through_seq FROM summaries WHERE session_id = ?", (session_id,)).fetchone()
+        with stage("memory.compact"):
+            summary = _summary_chain(llm).invoke({
+                "summary": current[0] if current else "(none)",
+                "transcript": _transcript([(role, content) for _, role, content in old]),
+            })
+
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            latest = db.execute("SELECT through_seq FROM summaries WHERE session_id = ?", (session_id,)).fetchone()
+            still_there = db.execute("SELECT 1 FROM messages WHERE session_id = ? AND seq = ?", (session_id, old[-1][0])).fetchone()
+            if (latest[0] if latest else None) != (current[1] if current else None) or still_there is None:
+                # Another worker compacted (or the session was cleared) meanwhile
+                db.execute("ROLLBACK")
+                return False
+            db.execute(
+                "INSERT INTO summaries (session_id, summary, through_seq) VALUES (?, ?, ?)"
+                " ON CONFLICT(session_id) DO UPDATE SET summary = excluded.summary, through_seq = excluded.through_seq",
+                (session_id, summary, old[-1][0]),
+            )
+            db.execute("DELETE FROM messages WHERE session_id = ? AND seq <= ?", (session_id, old[-1][0]))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return True
+
+    def compact_in_background(self, session_id, llm):
+        """Runs compact() in a daemon thread, at most one at a time per session."""
+        with self._compacting_lock:
+            if session_id in self._compacting:
+                return
+            self._compacting.add(session_id)
+
+        def run():
+            try:
+                self.compact(session_id, llm)
+            except Exception as e:
+                print(f"Conversation compaction failed for session {session_id}: {e}")
+            finally:
+                with self._compacting_lock:
+                    self._compacting.discard(session_id)
+
+        threading.Thread(target=run, name="conversation-compact", daemon=True).start()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Returns the process-wide conversation store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore(config.CONVERSATION_DB_PATH)
+        return _store
+
+def reset_store():
+    """Drops the process-wide store so the next call reopens CONVERSATION_DB_PATH (used by benchmarks)."""
+    global _store
+    with _store_lock:
+        _store = None
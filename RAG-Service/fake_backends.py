@@ -0,0 +1,95 @@
+"""
+Deterministic offline stand-ins for the Gemini embeddings and chat model.
+
+They let the service and the benchmark suite run without network access or an API
+key, while still behaving like real backends: embeddings of texts that share words
+are close together, so retrieval quality can be measured, and both backends can
+simulate per-call latency.
+"""
+import re
+import time
+import hashlib
+import threading
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class FakeEmbeddings(Embeddings):
+    """Feature-hashing bag-of-words embeddings with optional simulated latency."""
+
+    def __init__(self, size=768, latency=0.0, per_text_latency=0.0):
+        self.size = size
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.calls = 0
+        self.texts_embedded = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in _TOKEN_PATTERN.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+            vector[h % self.size] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = 1.0
+            norm = 1.0
+        return (vector / norm).tolist()
+
+    def _record_call(self, count):
+        with self._lock:
+            self.calls += 1
+            self.texts_embedded += count
+        if self.latency or self.per_text_latency:
+            time.sleep(self.latency + self.per_text_latency * count)
+
+    def embed_documents(self, texts: List[str], **kwargs: Any) -> List[List[float]]:
+        self._record_call(len(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str, **kwargs: Any) -> List[float]:
+        self._record_call(1)
+        return self._embed(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers deterministically from its prompt.
+
+    Question-reformulation prompts get the latest user question back unchanged,
+    conversation-summary prompts its first 200 words, and any other prompt an answer
+    built from the first sentence of the stuffed context.
+    """
+
+    latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        system_text = " ".join(m.content for m in messages if isinstance(m, SystemMessage))
+        question = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+
+        if "standalone question" in system_text:
+            content = question
+        elif "memory of a conversation" in system_text:
+            content = " ".join(question.split()[:200])
+        else:
+            context = system_text.split("\n\n", 1)[1] if "\n\n" in system_text else ""
+            first_sentence = context.strip().split(".")[0][:200]
+            content = f"Answer to '{question}': {first_sentence}."
+
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
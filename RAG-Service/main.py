@@ -1,57 +1,98 @@
+"""
+Command-line question answering on the same engine as the service (rag.RAGManager):
+shared model clients, cached chains, the warm base index and the query embedding
+cache. A text file (output.txt by default) is indexed into the CLI session's user
+store once; later runs reuse that store instead of embedding the file again.
+
+Usage:
+    python main.py "What is the main topic?"     # answer one question
+    python main.py                               # interactive REPL
+    python main.py --file notes.md --reindex     # rebuild the session's store from another file first
+"""
 import os
+import sys
+import time
+import argparse
+
 from dotenv import load_dotenv
-import pickle
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_core.output_parsers import StrOutputParser
-from langchain_community.document_loaders import TextLoader
-from langchain.prompts import PromptTemplate
-from langchain_community.vectorstores import FAISS
-from langchain.docstore.document import Document
-from operator import itemgetter
-
-VECTOR_DB_PATH = "faiss_index"
-
-def RAG(user_input):
-    load_dotenv()
-    GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-    MODEL1 = "gemini-2.0-flash"
-
-    model = ChatGoogleGenerativeAI(model=MODEL1, google_api_key=GOOGLE_API_KEY)
-    parser = StrOutputParser()
-
-    prompt_template = """Answer the question based on the context below. If you don't know the answer, 
-    just say that you don't know — don't try to make up an answer.
-
-    Context: {context}
-    Question: {question}
+
+load_dotenv()
+
+CLI_SESSION_ID = "cli"
+DEFAULT_FILE = "output.txt"
+
+
+def get_manager(session_id=CLI_SESSION_ID, path=None, reindex=False):
+    """
+    Returns the RAG manager for a CLI session, indexing path into it if it has no store
+    yet. With reindex, the session's store is rebuilt from path (not appended to).
     """
-    prompt = PromptTemplate.from_template(prompt_template)
+    from rag import RAGManager
 
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+    manager = RAGManager(session_id)
+    if path and os.path.exists(path) and (reindex or not manager.has_user_store()):
+        from TextProcessor import FileConverter
 
-    if os.path.exists(VECTOR_DB_PATH):
-        print("Loading cached FAISS vector store...")
-        vectorstore = FAISS.load_local(VECTOR_DB_PATH, embeddings, allow_dangerous_deserialization=True)
-    else:
-        print("Computing embeddings and saving to FAISS...")
-        loader = TextLoader("output.txt", encoding="utf-8")
-        pages = loader.load_and_split()
+        print(f"Indexing {path} into session '{session_id}'...")
+        converter = FileConverter(path)
+        manager.add_sections_to_user_store(converter.convert_sections(), source_type=converter.input_type, replace=reindex)
+    return manager
 
-        vectorstore = FAISS.from_documents(pages, embedding=embeddings)
-        vectorstore.save_local(VECTOR_DB_PATH)
 
-    retriever = vectorstore.as_retriever()
+def RAG(user_input, session_id=CLI_SESSION_ID, chat_history=None):
+    """Answers a question from the base store and the CLI session's store."""
+    manager = get_manager(session_id, DEFAULT_FILE)
+    return manager.answer_question(user_input, chat_history or [])
 
-    chain = {
-        "context": itemgetter("question") | retriever,
-        "question": itemgetter("question")
-    } | prompt | model | parser
 
-    result = chain.invoke({"question": user_input})
-    return result
+def repl(manager, keep_history=False):
+    """Reads questions until EOF or 'exit'; every question reuses the loaded stores and chains."""
+    import rag
 
-if __name__ == "__main__":
-    user_input = input("Enter your question: ")
-    result = RAG(user_input)
-    print(result)
+    print("Loading models and indexes...")
+    manager.get_vector_stores()
+    rag.get_chains(manager.llm)
+    print("Ask a question ('exit' to quit).")
+    history = []
+    while True:
+        try:
+            question = input("> ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if not question:
+            continue
+        if question.lower() in ("exit", "quit"):
+            break
+        start = time.perf_counter()
+        answer = manager.answer_question(question, history)
+        print(answer)
+        print(f"({(time.perf_counter() - start) * 1000:.0f} ms)")
+        if keep_history:
+            history += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
 
+
+def main():
+    parser = argparse.ArgumentParser(description="Ask the RAG engine questions from the command line")
+    parser.add_argument("question", nargs="*", help="Question to answer (omit for the interactive REPL)")
+    parser.add_argument("--session", default=CLI_SESSION_ID, help="Session whose user store is searched with the base store")
+    parser.add_argument("--file", default=DEFAULT_FILE, help="Text file indexed into the session if it has no store yet")
+    parser.add_argument("--reindex", action="store_true", help="Rebuild the session's store from --file, replacing what it holds")
+    parser.add_argument("--history", action="store_true", help="In the REPL, treat questions as a conversation (follow-ups get reformulated)")
+    args = parser.parse_args()
+
+    import sharding
+
+    if not sharding.is_valid_session_id(args.session):
+        print(f"Invalid session ID: {args.session}", file=sys.stderr)
+        sys.exit(1)
+
+    manager = get_manager(args.session, args.file, args.reindex)
+    if args.question:
+        print(manager.answer_question(" ".join(args.question), []))
+    else:
+        repl(manager, keep_history=args.history)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""
+Scalar-quantized vector store for per-session user stores.
+
+A NumPy-backed alternative to the float32 FAISS flat index, with two modes:
+
+- "fp16": vectors stored as float16 (half the footprint, effectively exact search).
+- "sq8":  vectors stored as uint8 codes with a per-dimension min/scale (a quarter of
+          the footprint). Search runs on the codes, then the top candidates are
+          re-scored against a float16 copy that stays memory-mapped on disk, so it only
+          costs RAM for the rows that are actually touched.
+
+Rows are quantized on their own when they are added, with the per-dimension ranges
+set by the first batch. A later vector outside those ranges widens them and
+re-quantizes the store from the float16 copy; without one (rescore off) the first
+ranges are padded and later vectors are clipped to them, so codes are never
+re-quantized from codes. New arrays are
+built on the side and published together with the texts under the store's lock, so
+a concurrent search sees either the old rows or the new ones.
+
+Scores are squared L2 distances, like FAISS.load_local/from_texts stores, so results
+are interchangeable with the existing stores. Texts and metadata are kept as JSON
+instead of a pickle, so loading needs no dangerous deserialization.
+"""
+import os
+import json
+import threading
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+import config
+
+MODES = ("fp16", "sq8")
+INDEX_FILE = "vectors.npz"
+RESCORE_FILE = "rescore.f16.npy"
+DOCS_FILE = "docs.json"
+INFO_FILE = "quantization.json"
+
+# Rows processed per block when scanning, to bound temporary float32 buffers
+_BLOCK_ROWS = 8192
+
+
+def is_quantized_store(path):
+    """Whether path holds a store written by QuantizedVectorStore."""
+    return os.path.isfile(os.path.join(path, INDEX_FILE))
+
+
+def _append(rows, new):
+    return new if rows is None else np.concatenate([rows, new])
+
+
+def _quantize(full, vmin, scale):
+    return np.clip(np.rint((full - vmin) / scale), 0, 255).astype(np.uint8)
+
+
+def _code_norms(codes, vmin, scale):
+    """Squared norms of the vectors the codes decode to."""
+    norms = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), _BLOCK_ROWS):
+        block = codes[start:start + _BLOCK_ROWS].astype(np.float32) * scale + vmin
+        norms[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+    return norms
+
+
+def _atomic_write(path, write):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+class QuantizedVectorStore(VectorStore):
+    """LangChain vector store keeping scalar-quantized embeddings in NumPy arrays."""
+
+    def __init__(self, embedding: Embeddings, mode: str = "sq8", rescore: bool = True):
+        if mode not in MODES:
+            raise ValueError(f"Unsupported quantization mode: {mode}")
+        self.embedding_function = embedding
+        self.mode = mode
+        self.rescore = rescore and mode == "sq8"
+        self.texts = []
+        self.metadatas = []
+        self._vectors = None    # fp16: float16 (n, d)
+        self._codes = None      # sq8: uint8 (n, d)
+        self._vmin = None       # sq8: float32 (d,)
+        self._scale = None      # sq8: float32 (d,)
+        self._norms = None      # float32 (n,) squared norms of the stored (quantized) vectors
+        self._rescore = None    # sq8: float16 (n, d), memory-mapped once saved
+        self._lock = threading.Lock()        # publishes arrays and texts together
+        self._write_lock = threading.Lock()  # serializes adds
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding_function
+
+    def __len__(self):
+        return len(self.texts)
+
+    @property
+    def nbytes_in_memory(self):
+        """Bytes held in RAM by the search structures (memory-mapped re-score rows excluded)."""
+        arrays = [self._vectors, self._codes, self._vmin, self._scale, self._norms]
+        if isinstance(self._rescore, np.ndarray) and not isinstance(self._rescore, np.memmap):
+            arrays.append(self._rescore)
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    # --- Quantization -------------------------------------------------------
+
+    def _snapshot(self):
+        """The arrays as of the last published add: (rows, vectors, codes, vmin, scale, norms, rescore)."""
+        with self._lock:
+            return len(self.texts), self._vectors, self._codes, self._vmin, self._scale, self._norms, self._rescore
+
+    def _quantized_rows(self, new):
+        """The sq8 arrays after appending the float32 rows `new`, as {attribute: array}."""
+        if self._codes is None:
+            vmin, vmax = new.min(axis=0), new.max(axis=0)
+            if not self.rescore:
+                # Nothing to re-quantize from later, so leave room for vectors outside this batch
+                pad = 0.5 * np.maximum(vmax - vmin, np.abs(new).max())
+                vmin, vmax = vmin - pad, vmax + pad
+            scale = (vmax - vmin) / 255.0
+            scale[scale == 0] = 1.0
+            vmin, scale = vmin.astype(np.float32), scale.astype(np.float32)
+            codes = _quantize(new, vmin, scale)
+            return {"_vmin": vmin, "_scale": scale, "_codes": codes, "_norms": _code_norms(codes, vmin, scale),
+                    "_rescore": new.astype(np.float16) if self.rescore else None}
+
+        rescore = _append(self._rescore, new.astype(np.float16)) if self._rescore is not None else None
+        top = self._vmin + 255.0 * self._scale
+        low, high = new.min(axis=0), new.max(axis=0)
+        if rescore is not None and ((low < self._vmin).any() or (high > top).any()):
+            # Widen the ranges and re-quantize every row from the float16 copy
+            vmin = np.minimum(self._vmin, low).astype(np.float32)
+            scale = ((np.maximum(top, high) - vmin) / 255.0).astype(np.float32)
+            scale[scale == 0] = 1.0
+            codes = np.empty(rescore.shape, dtype=np.uint8)
+            for start in range(0, len(rescore), _BLOCK_ROWS):
+                codes[start:start + _BLOCK_ROWS] = _quantize(np.asarray(rescore[start:start + _BLOCK_ROWS], dtype=np.float32), vmin, scale)
+            return {"_vmin": vmin, "_scale": scale, "_codes": codes, "_norms": _code_norms(codes, vmin, scale), "_rescore": rescore}
+
+        codes = _quantize(new, self._vmin, self._scale)
+        return {"_codes": _append(self._codes, codes),
+                "_norms": _append(self._norms, _code_norms(codes, self._vmin, self._scale)),
+                "_rescore": rescore}
+
+    def _full_vectors(self):
+        """Best float32 reconstruction of the stored vectors."""
+        n, vectors, codes, vmin, scale, _, rescore = self._snapshot()
+        if not n:
+            return None
+        if self.mode == "fp16":
+            return vectors[:n].astype(np.float32)
+        if rescore is not None:
+            return np.asarray(rescore[:n], dtype=np.float32)
+        return codes[:n].astype(np.float32) * scale + vmin
+
+    def vectors_for(self, docs):
+        """Float32 vectors of documents returned by this store's searches (rows from their ids)."""
+        rows = np.asarray([int(doc.id) for doc in docs], dtype=np.int64)
+        _, vectors, codes, vmin, scale, _, rescore = self._snapshot()
+        if self.mode == "fp16":
+            return vectors[rows].astype(np.float32)
+        if rescore is not None:
+            return np.asarray(rescore[rows], dtype=np.float32)
+        return codes[rows].astype(np.float32) * scale + vmin
+
+    # --- Writing ------------------------------------------------------------
+
+    def add_embeddings(self, text_embeddings: Iterable[Tuple[str, List[float]]], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        text_embeddings = list(text_embeddings)
+        if not text_embeddings:
+            return []
+        texts = [text for text, _ in text_embeddings]
+        new = np.asarray([vector for _, vector in text_embeddings], dtype=np.float32)
+        with self._write_lock:
+            if self.mode == "fp16":
+                vectors = new.astype(np.float16)
+                wide = vectors.astype(np.float32)
+                update = {"_vectors": _append(self._vectors, vectors),
+                          "_norms": _append(self._norms, np.einsum("ij,ij->i", wide, wide))}
+            else:
+                update = self._quantized_rows(new)
+            with self._lock:
+                for name, value in update.items():
+                    setattr(self, name, value)
+                first_id = len(self.texts)
+                self.metadatas.extend(metadatas or [{} for _ in texts])
+                self.texts.extend(texts)
+        return [str(i) for i in range(first_id, first_id + len(texts))]
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        vectors = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(zip(texts, vectors), metadatas=metadatas)
+
+    @classmethod
+    def from_embeddings(cls, text_embeddings, embedding: Embeddings, metadatas: Optional[List[dict]] = None, mode: str = "sq8", rescore: bool = True, **kwargs: Any):
+        store = cls(embedding, mode=mode, rescore=rescore)
+        store.add_embeddings(text_embeddings, metadatas=metadatas)
+        return store
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, mode: str = "sq8", rescore: bool = True, **kwargs: Any):
+        vectors = embedding.embed_documents(texts)
+        return cls.from_embeddings(zip(texts, vectors), embedding, metadatas=metadatas, mode=mode, rescore=rescore)
+
+    def save_local(self, folder_path: str) -> None:
+        """Saves the store. The index file is written last, as it is the store's version stamp."""
+        os.makedirs(folder_path, exist_ok=True)
+        n, vectors, codes, vmin, scale, norms, rescore = self._snapshot()
+        with open(os.path.join(folder_path, DOCS_FILE + ".tmp"), "w", encoding="utf-8") as f:
+            json.dump([{"text": t, "metadata": m} for t, m in zip(self.texts[:n], self.metadatas[:n])], f, ensure_ascii=False)
+        os.replace(os.path.join(folder_path, DOCS_FILE + ".tmp"), os.path.join(folder_path, DOCS_FILE))
+
+        rescore_path = os.path.join(folder_path, RESCORE_FILE)
+        if rescore is not None:
+            _atomic_write(rescore_path, lambda f: np.save(f, np.asarray(rescore)))
+        elif os.path.exists(rescore_path):
+            os.remove(rescore_path)
+
+        info = {"mode": self.mode, "rescore": rescore is not None, "count": n}
+        with open(os.path.join(folder_path, INFO_FILE), "w") as f:
+            json.dump(info, f)
+
+        if self.mode == "fp16":
+            arrays = {"vectors": vectors, "norms": norms}
+        else:
+            arrays = {"codes": codes, "vmin": vmin, "scale": scale, "norms": norms}
+        _atomic_write(os.path.join(folder_path, INDEX_FILE), lambda f: np.savez(f, **arrays))
+
+        # Drop the in-memory re-score copy in favour of the memory-mapped file, unless an
+        # add replaced it in the meantime
+        if rescore is not None:
+            mapped = np.load(rescore_path, mmap_mode="r")
+            with self._lock:
+                if self._rescore is rescore:
+                    self._rescore = mapped
+
+    @classmethod
+    def load_local(cls, folder_path: str, embeddings: Embeddings, **kwargs: Any):
+        with open(os.path.join(folder_path, INFO_FILE)) as f:
+            info = json.load(f)
+        store = cls(embeddings, mode=info["mode"], rescore=info.get("rescore", False))
+        with open(os.path.join(folder_path, DOCS_FILE), encoding="utf-8") as f:
+            docs = json.load(f)
+        store.texts = [d["text"] for d in docs]
+        store.metadatas = [d["metadata"] for d in docs]
+
+        with np.load(os.path.join(folder_path, INDEX_FILE)) as arrays:
+            store._norms = arrays["norms"]
+            if store.mode == "fp16":
+                store._vectors = arrays["vectors"]
+            else:
+                store._codes = arrays["codes"]
+                store._vmin = arrays["vmin"]
+                store._scale = arrays["scale"]
+        rescore_path = os.path.join(folder_path, RESCORE_FILE)
+        if store.rescore and os.path.exists(rescore_path):
+            store._rescore = np.load(rescore_path, mmap_mode="r")
+        else:
+            store.rescore = False
+        return store
+
+    # --- Search -------------------------------------------------------------
+
+    def _approximate_distances(self, query, snapshot):
+        """Squared L2 distances from query to every stored (quantized) vector."""
+        n, vectors, codes, vmin, scale, norms, _ = snapshot
+        dots = np.empty(n, dtype=np.float32)
+        if self.mode == "fp16":
+            for start in range(0, n, _BLOCK_ROWS):
+                block = vectors[start:start + _BLOCK_ROWS].astype(np.float32)
+                dots[start:start + len(block)] = block @ query
+        else:
+            # codes * scale + vmin, dotted with q == codes @ (q * scale) + vmin . q
+            scaled_query = query * scale
+            offset = float(vmin @ query)
+            for start in range(0, n, _BLOCK_ROWS):
+                block = codes[start:start + _BLOCK_ROWS].astype(np.float32)
+                dots[start:start + len(block)] = block @ scaled_query + offset
+        return norms - 2.0 * dots + float(query @ query)
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        snapshot = self._snapshot()
+        n, rescore = snapshot[0], snapshot[-1]
+        if n == 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        k = min(k, n)
+        distances = self._approximate_distances(query, snapshot)
+
+        if rescore is not None:
+            fetch = min(n, k * config.RESCORE_FACTOR)
+            candidates = np.argpartition(distances, fetch - 1)[:fetch] if fetch < n else np.arange(n)
+            # Sorted row order keeps reads from the memory-mapped file sequential
+            candidates = np.sort(candidates)
+            exact = np.asarray(rescore[candidates], dtype=np.float32)
+            diffs = exact - query
+            distances = np.einsum("ij,ij->i", diffs, diffs)
+            order = np.argsort(distances)[:k]
+            ids, scores = candidates[order], distances[order]
+        else:
+            top = np.argpartition(distances, k - 1)[:k] if k < n else np.arange(n)
+            ids = top[np.argsort(distances[top])]
+            scores = distances[ids]
+
+        return [
+            (Document(id=str(i), page_content=self.texts[i], metadata=self.metadatas[i]), float(score))
+            for i, score in zip(ids, scores)
+        ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding_function.embed_query(query), k=k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+
+def convert_faiss_store(path, embeddings, mode="sq8", rescore=True, output_path=None):
+    """Rewrites a LangChain FAISS store as a quantized store (in place unless output_path is given)."""
+    from langchain_community.vectorstores import FAISS
+
+    faiss_store = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+    vectors = faiss_store.index.reconstruct_n(0, faiss_store.index.ntotal)
+    docs = [faiss_store.docstore.search(faiss_store.index_to_docstore_id[i]) for i in range(len(vectors))]
+    store = QuantizedVectorStore.from_embeddings(
+        [(doc.page_content, vector) for doc, vector in zip(docs, vectors)],
+        embeddings,
+        metadatas=[doc.metadata for doc in docs],
+        mode=mode,
+        rescore=rescore,
+    )
+    output_path = output_path or path
+    store.save_local(output_path)
+    if output_path == path:
+        for name in ("index.faiss", "index.pkl"):
+            if os.path.exists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+    return store
+
+
+def main():
+    import argparse
+    import backends
+
+    parser = argparse.ArgumentParser(description="Convert FAISS vector stores to scalar-quantized stores in place")
+    parser.add_argument("paths", nargs="+", help="Store directories (e.g. user_dbs/ab/cd/<session_id>)")
+    parser.add_argument("--mode", choices=MODES, default="sq8")
+    parser.add_argument("--no-rescore", action="store_true", help="Don't keep the float16 re-scoring copy (sq8 only)")
+    args = parser.parse_args()
+
+    embeddings = backends.get_embeddings()
+    for path in args.paths:
+        if is_quantized_store(path):
+            print(f"Skipping {path}: already quantized")
+            continue
+        before = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        convert_faiss_store(path, embeddings, mode=args.mode, rescore=not args.no_rescore)
+        after = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        print(f"Converted {path}: {before} -> {after} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,28 @@
 import os
+import time
+import shutil
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables import RunnablePassthrough
-from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.retrievers import MergerRetriever
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain.chains.history_aware_retriever import create_history_aware_retriever
-from langchain.chains.retrieval import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.messages import AIMessage, HumanMessage
 
 import config
+import backends
+import sharding
+from metrics import stage
+from chunker import StructureAwareChunker, sections_from_text
+from singleflight import Group, make_key
 
 load_dotenv()
 
+# LangChain, FAISS and the model clients are imported on first use rather than at module
+# import, so a cold-starting instance can bind its port and answer health checks (and
+# /warmup can load them in the background) before paying for the heavy imports.
+
+def _faiss():
+    """Returns the LangChain FAISS vector store class, importing it on first use."""
+    from langchain_community.vectorstores import FAISS
+    return FAISS
+
 # Global cache for the base vector store to avoid reloading from disk for every session
 _base_db = None
 
@@ -23,13 +30,11 @@ def load_base_db(path, embeddings):
     """Loads the base FAISS vector store from the specified path into a global variable."""
     global _base_db
     if _base_db is None:
-        if os.path.exists(path):
+        # config creates the directory on startup, so check for an actual saved index
+        if _store_version(path) is not None:
             print(f"Loading base FAISS vector store for the first time from: {path}")
-            _base_db = FAISS.load_local(
-                path,
-                embeddings,
-                allow_dangerous_deserialization=True
-            )
+            with stage("store.load_base"):
+                _base_db = _load_store(path, embeddings)
         else:
             # In a real scenario, you might want to create an empty base DB
             # or handle this more gracefully.
@@ -38,37 +43,245 @@ def load_base_db(path, embeddings):
     return _base_db
 
 
+# LRU cache of loaded vector stores keyed by path. Entries are validated against the
+# index file's stat so a store rewritten by another instance is picked up again.
+_store_cache = OrderedDict()
+_store_cache_lock = threading.Lock()
+
+# Serializes ingests into the same store (striped by path, so the set of locks stays bounded)
+_ingest_locks = [threading.Lock() for _ in range(64)]
+
+def _ingest_lock(path):
+    return _ingest_locks[hash(path) % len(_ingest_locks)]
+
+# The file written last when a quantized store (quantized_store.INDEX_FILE) or a FAISS
+# store (see _save_store) is saved, so its stat doubles as the store version.
+_INDEX_FILES = ("vectors.npz", "index.pkl")
+
+def _store_version(path):
+    """Returns a cheap version stamp for a saved vector store, or None if it doesn't exist."""
+    for name in _INDEX_FILES:
+        try:
+            st = os.stat(os.path.join(path, name))
+        except OSError:
+            continue
+        return (name, st.st_mtime_ns, st.st_size)
+    return None
+
+def _load_store(path, embeddings, attempts=5):
+    """Loads a saved vector store: scalar-quantized (see quantized_store.py) or FAISS."""
+    import quantized_store
+    if quantized_store.is_quantized_store(path):
+        return quantized_store.QuantizedVectorStore.load_local(path, embeddings)
+    for attempt in range(attempts):
+        store = _faiss().load_local(path, embeddings, allow_dangerous_deserialization=True)
+        # Read between the two renames of a concurrent save (index and docstore from
+        # different versions): load it again once the save has finished
+        if store.index.ntotal == len(store.index_to_docstore_id):
+            break
+        time.sleep(0.05 * (attempt + 1))
+    return store
+
+def _save_store(store, path):
+    """
+    Saves a vector store without readers ever seeing a partly written file. FAISS's
+    save_local writes index.faiss and index.pkl in place, so it writes to a temporary
+    directory whose files are renamed into place, index.pkl (the version stamp) last.
+    """
+    if not hasattr(store, "index_to_docstore_id"):
+        store.save_local(path)  # quantized stores replace their files atomically themselves
+        return
+    tmp_path = f"{path}.tmp{os.getpid()}-{threading.get_ident()}"
+    try:
+        store.save_local(tmp_path)
+        os.makedirs(path, exist_ok=True)
+        for name in ("index.faiss", "index.pkl"):
+            os.replace(os.path.join(tmp_path, name), os.path.join(path, name))
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+def _create_user_store(text_embeddings, embeddings, metadatas):
+    """Creates a new user store in the format selected by USER_STORE_QUANTIZATION."""
+    if config.USER_STORE_QUANTIZATION in ("fp16", "sq8"):
+        from quantized_store import QuantizedVectorStore
+        return QuantizedVectorStore.from_embeddings(
+            text_embeddings, embeddings, metadatas=metadatas,
+            mode=config.USER_STORE_QUANTIZATION, rescore=config.USER_STORE_RESCORE
+        )
+    return _faiss().from_embeddings(text_embeddings, embeddings, metadatas=metadatas)
+
+def cache_store(path, store, version=None):
+    """Puts a vector store into the in-memory cache, evicting the least recently used one."""
+    if version is None:
+        version = _store_version(path)
+    with _store_cache_lock:
+        _store_cache[path] = (version, store)
+        _store_cache.move_to_end(path)
+        while len(_store_cache) > config.USER_STORE_CACHE_SIZE:
+            _store_cache.popitem(last=False)
+
+def evict_store(path):
+    """Drops a vector store from the in-memory cache."""
+    with _store_cache_lock:
+        _store_cache.pop(path, None)
+
+def load_cached_store(path, embeddings):
+    """Loads a vector store from path, reusing the cached copy while it is still current."""
+    version = _store_version(path)
+    if version is None:
+        return None
+    with _store_cache_lock:
+        cached = _store_cache.get(path)
+        if cached and cached[0] == version:
+            _store_cache.move_to_end(path)
+            return cached[1]
+
+    print(f"Loading existing vector store from: {path}")
+    with stage("store.load"):
+        store = _load_store(path, embeddings)
+    cache_store(path, store, version)
+    return store
+
+def clear_caches():
+    """Forgets every loaded vector store so the next access reads from disk again."""
+    global _base_db
+    _base_db = None
+    with _store_cache_lock:
+        _store_cache.clear()
+    with _query_vector_lock:
+        _query_vector_cache.clear()
+    if config.USER_STORE_BACKEND == "tenant":
+        import tenant_store
+        tenant_store.reset_index()
+
+
+CONTEXTUALIZE_Q_SYSTEM_PROMPT = "Given a chat history and the latest user question which might reference context in the chat history, formulate a standalone question which can be understood without the chat history. Do NOT answer the question, just reformulate it if needed and otherwise return it as is."
+QA_SYSTEM_PROMPT = "You are an assistant for question-answering tasks. Use the following pieces of retrieved context to answer the question. If you don't know the answer, just say that you don't know. Use three sentences maximum and keep the answer concise.\n\n{context}"
+
+# Chains only depend on the (shared) chat model, so build them once per model
+_chains = {}
+_chains_lock = threading.Lock()
+
+def get_chains(llm):
+    """Returns the cached (reformulation, question-answering) chains for a chat model."""
+    with _chains_lock:
+        chains = _chains.get(id(llm))
+        if chains is None or chains[0] is not llm:
+            from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+            from langchain_core.output_parsers import StrOutputParser
+            from langchain.chains.combine_documents import create_stuff_documents_chain
+
+            contextualize_q_prompt = ChatPromptTemplate.from_messages(
+                [
+                    ("system", CONTEXTUALIZE_Q_SYSTEM_PROMPT),
+                    MessagesPlaceholder("chat_history"),
+                    ("human", "{input}"),
+                ]
+            )
+            qa_prompt = ChatPromptTemplate.from_messages(
+                [
+                    ("system", QA_SYSTEM_PROMPT),
+                    MessagesPlaceholder("chat_history"),
+                    ("human", "{input}"),
+                ]
+            )
+            reformulate_chain = contextualize_q_prompt | llm | StrOutputParser()
+            question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
+            chains = (llm, reformulate_chain, question_answer_chain)
+            _chains[id(llm)] = chains
+        return chains[1], chains[2]
+
+def to_langchain_history(chat_history):
+    """Converts chat history from the frontend format to LangChain message objects."""
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    langchain_chat_history = []
+    for msg in chat_history:
+        if msg.get("role") == "user":
+            langchain_chat_history.append(HumanMessage(content=msg.get("content")))
+        elif msg.get("role") == "assistant":
+            langchain_chat_history.append(AIMessage(content=msg.get("content")))
+    return langchain_chat_history
+
+# Chunks taken from each store when answering without reranking
+SEARCH_K = 3
+
+NO_KNOWLEDGE_BASE_ANSWER = "I'm sorry, but no knowledge base has been loaded. Please upload a document to begin."
+
+# Identical concurrent upstream calls (same prompt, model and store version) share one call
+_reformulate_flights = Group("reformulate")
+_embed_flights = Group("embed_query")
+_generate_flights = Group("generate")
+
+# LRU cache of query embeddings keyed by (embedding model, question), so a repeated
+# question (a CLI/REPL session, an evaluation rerun, a popular query) skips the embedding call
+_query_vector_cache = OrderedDict()
+_query_vector_lock = threading.Lock()
+
+def _cache_query_vector(key, vector):
+    if config.QUERY_EMBEDDING_CACHE_SIZE <= 0:
+        return
+    with _query_vector_lock:
+        _query_vector_cache[key] = vector
+        _query_vector_cache.move_to_end(key)
+        while len(_query_vector_cache) > config.QUERY_EMBEDDING_CACHE_SIZE:
+            _query_vector_cache.popitem(last=False)
+
+def embed_search_queries(embeddings, questions):
+    """
+    Embeds search questions, serving repeats from the query embedding cache. A single
+    miss goes through the coalesced embed_query call; several are embedded in one batch.
+    """
+    model = getattr(embeddings, "model", None) or config.EMBEDDING_MODEL
+    keys = [make_key(model, question) for question in questions]
+    with _query_vector_lock:
+        vectors = [_query_vector_cache.get(key) for key in keys]
+        for key, vector in zip(keys, vectors):
+            if vector is not None:
+                _query_vector_cache.move_to_end(key)
+
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if len(missing) == 1:
+        i = missing[0]
+        vectors[i] = _embed_flights.do(keys[i], lambda: embeddings.embed_query(questions[i]))
+    elif missing:
+        for i, vector in zip(missing, backends.embed_queries([questions[i] for i in missing], embeddings)):
+            vectors[i] = vector
+    for i in missing:
+        _cache_query_vector(keys[i], vectors[i])
+    return vectors
+
+def interleave(result_lists):
+    """Merges per-store results round-robin, the same order MergerRetriever produces."""
+    merged = []
+    for i in range(max((len(r) for r in result_lists), default=0)):
+        for results in result_lists:
+            if i < len(results):
+                merged.append(results[i])
+    return merged
+
+
 class RAGManager:
     """Manages the RAG process for a single user session."""
     def __init__(self, session_id):
         self.session_id = session_id
-        self.google_api_key = os.getenv("GOOGLE_API_KEY")
-        if not self.google_api_key:
-            raise ValueError("GOOGLE_API_KEY environment variable not set.")
-
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model=config.EMBEDDING_MODEL,
-            google_api_key=self.google_api_key
-        )
-        self.llm = ChatGoogleGenerativeAI(
-            model=config.CHAT_MODEL,
-            google_api_key=self.google_api_key,
-            temperature=0.3,
-            convert_system_message_to_human=True # Important for some models
-        )
-        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        self.user_vector_store_path = os.path.join(config.USER_VECTOR_STORES_PATH, self.session_id)
+        # Model clients are shared process-wide; see backends.py
+        self.embeddings = backends.get_embeddings()
+        self.llm = backends.get_chat_model()
+        self.text_splitter = StructureAwareChunker(source_type="plain_text")
+        self.user_vector_store_path = sharding.user_store_path(self.session_id)
 
     def _load_or_create_vector_store(self, store_path, data_path=None):
         """Loads a FAISS vector store from path, or creates it from data_path if it doesn't exist."""
-        # Check for existing store first
-        if os.path.exists(store_path):
-            print(f"Loading existing vector store from: {store_path}")
-            return FAISS.load_local(store_path, self.embeddings, allow_dangerous_deserialization=True)
+        # Check for existing store first (served from the in-memory cache when still current)
+        vector_store = load_cached_store(store_path, self.embeddings)
+        if vector_store is not None:
+            return vector_store
 
         # If no store, try to create one from data_path
         if data_path and os.path.exists(data_path) and os.listdir(data_path):
             print(f"Creating new vector store from: {data_path}")
+            from langchain_community.document_loaders import DirectoryLoader, TextLoader
             loader = DirectoryLoader(data_path, glob="**/*.txt", loader_cls=TextLoader, show_progress=True)
             docs = loader.load()
             if not docs:
@@ -76,8 +289,9 @@ class RAGManager:
                 return None
 
             split_docs = self.text_splitter.split_documents(docs)
-            vector_store = FAISS.from_documents(split_docs, self.embeddings)
-            vector_store.save_local(store_path)
+            vector_store = _faiss().from_documents(split_docs, self.embeddings)
+            _save_store(vector_store, store_path)
+            cache_store(store_path, vector_store)
             print(f"Vector store created and saved to: {store_path}")
             return vector_store
 
@@ -86,82 +300,329 @@ class RAGManager:
 
     def add_text_to_user_store(self, text):
         """Adds new text to the user-specific vector store."""
-        docs = self.text_splitter.create_documents([text])
+        self.add_sections_to_user_store(sections_from_text(text), source_type="plain_text")
 
-        if os.path.exists(self.user_vector_store_path):
-            vector_store = FAISS.load_local(self.user_vector_store_path, self.embeddings, allow_dangerous_deserialization=True)
-            vector_store.add_documents(docs)
-        else:
-            vector_store = FAISS.from_documents(docs, self.embeddings)
+    def add_sections_to_user_store(self, sections, source_type=None, replace=False):
+        """
+        Adds converter sections (see FileConverter.convert_sections) to the user-specific
+        vector store, chunked along their structure with the overlap configured for source_type.
+        With replace, the store is rebuilt from just these sections instead.
+        """
+        if replace and config.USER_STORE_BACKEND == "tenant":
+            raise ValueError("The tenant store is append-only; a session's chunks can't be replaced")
+        with stage("ingest.split"):
+            chunks = StructureAwareChunker(source_type=source_type).split_sections(sections)
+        if not chunks:
+            return
+        texts = [text for text, _ in chunks]
+        metadatas = [metadata for _, metadata in chunks]
+
+        with stage("ingest.embed"):
+            vectors = self.embeddings.embed_documents(texts)
+
+        if config.USER_STORE_BACKEND == "tenant":
+            self._add_to_tenant_store(texts, vectors, metadatas)
+            return
+
+        path = self.user_vector_store_path
+        with _ingest_lock(path):
+            # Copy-on-write: queries may be searching the cached store right now, so the chunks
+            # go into a private copy loaded from disk, which replaces the cache entry once saved
+            with stage("ingest.index"):
+                if not replace and _store_version(path) is not None:
+                    vector_store = _load_store(path, self.embeddings)
+                    vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+                else:
+                    vector_store = _create_user_store(list(zip(texts, vectors)), self.embeddings, metadatas)
+
+            try:
+                with stage("ingest.save"):
+                    _save_store(vector_store, path)
+            except Exception:
+                # A partly written store may no longer match the cached copy
+                evict_store(path)
+                raise
+            cache_store(path, vector_store)
+        print(f"Updated user vector store at: {path}")
+
+    def _add_to_tenant_store(self, texts, vectors, metadatas):
+        """Appends chunks to the shared multi-tenant segment instead of rewriting a session index."""
+        import tenant_store
+        index = tenant_store.get_index()
+        with stage("ingest.index"):
+            if index.count(self.session_id) == 0:
+                # Carry over a store the session built before the switch to the tenant backend
+                legacy_store = load_cached_store(self.user_vector_store_path, self.embeddings)
+                if legacy_store is not None:
+                    index.append(self.session_id, *tenant_store.store_contents(legacy_store))
+                    evict_store(self.user_vector_store_path)
+            index.append(self.session_id, texts, vectors, metadatas)
+        print(f"Appended {len(texts)} chunks for session {self.session_id} to tenant segment: {index.segment}")
 
-        vector_store.save_local(self.user_vector_store_path)
-        print(f"Updated user vector store at: {self.user_vector_store_path}")
+    def _load_user_store(self):
+        """Returns the session's own store: its rows in the tenant index, or its FAISS directory."""
+        if config.USER_STORE_BACKEND == "tenant":
+            import tenant_store
+            user_vs = tenant_store.session_store(self.session_id, self.embeddings)
+            if user_vs is not None:
+                return user_vs
+        return self._load_or_create_vector_store(self.user_vector_store_path)
 
-    def get_retriever(self):
-        """Gets a merged retriever for both base and user-specific knowledge."""
+    def get_vector_stores(self):
+        """Returns the available vector stores: base knowledge first, then the user's own."""
         # Load or create the base vector store (for general knowledge)
         # Use the global caching function
         base_vs = load_base_db(config.BASE_VECTOR_STORE_PATH, self.embeddings)
 
         # Load the user-specific vector store (if it exists)
-        user_vs = self._load_or_create_vector_store(self.user_vector_store_path)
-
-        retrievers = []
-        if base_vs:
-            retrievers.append(base_vs.as_retriever(search_kwargs={"k": 3}))
-        if user_vs:
-            retrievers.append(user_vs.as_retriever(search_kwargs={"k": 3}))
-
-        if not retrievers:
-            # This case happens if neither base nor user data exists.
-            # We can't create a retriever, so we'll have to handle this in the answer_question method.
-            return None
-
-        # If there's more than one retriever, merge them. Otherwise, just use the one.
-        if len(retrievers) > 1:
-            return MergerRetriever(retrievers=retrievers)
-        else:
-            return retrievers[0]
+        user_vs = self._load_user_store()
+
+        return [vs for vs in (base_vs, user_vs) if vs]
+
+    def has_user_store(self):
+        """Whether this session has indexed documents of its own."""
+        if config.USER_STORE_BACKEND == "tenant":
+            import tenant_store
+            if tenant_store.get_index().count(self.session_id):
+                return True
+        return _store_version(self.user_vector_store_path) is not None
+
+    def store_version(self):
+        """Version stamp of the base and user stores, used to key coalesced generation calls."""
+        if config.USER_STORE_BACKEND == "tenant":
+            import tenant_store
+            rows = tenant_store.get_index().count(self.session_id)
+            if rows:
+                return (_store_version(config.BASE_VECTOR_STORE_PATH), ("tenant", rows))
+        return (_store_version(config.BASE_VECTOR_STORE_PATH), _store_version(self.user_vector_store_path))
+
+    def _reformulate(self, user_question, langchain_chat_history, history_key):
+        """Reformulates a follow-up into a standalone question (returned as is without history)."""
+        if not langchain_chat_history:
+            return user_question
+        reformulate_chain, _ = get_chains(self.llm)
+        with stage("query.reformulate"):
+            return _reformulate_flights.do(
+                make_key(config.CHAT_MODEL, user_question, history_key),
+                lambda: reformulate_chain.invoke({"input": user_question, "chat_history": langchain_chat_history})
+            )
+
+    def _search_questions(self, user_question, standalone_question):
+        """The question(s) to search with: for a follow-up, the user's wording as well."""
+        questions = [standalone_question]
+        if config.SEARCH_ORIGINAL_QUESTION and standalone_question.strip() != user_question.strip():
+            questions.append(user_question)
+        return questions
+
+    def _select_context(self, standalone_question, query_vector, result_lists):
+        """Picks the chunks to stuff into the prompt from per-store (Document, vector) results."""
+        if config.RERANK:
+            import rerank
+            with stage("query.rerank"):
+                return rerank.rerank(
+                    standalone_question, query_vector, interleave(result_lists),
+                    baseline=interleave([[doc for doc, _ in results[:SEARCH_K]] for results in result_lists])
+                )
+        return interleave([[doc for doc, _ in results[:SEARCH_K]] for results in result_lists])
+
+    def _generate(self, user_question, langchain_chat_history, history_key, context, version=None):
+        _, question_answer_chain = get_chains(self.llm)
+        with stage("query.generate"):
+            answer = _generate_flights.do(
+                make_key(config.CHAT_MODEL, version or self.store_version(), user_question, history_key,
+                         [doc.page_content for doc in context]),
+                lambda: question_answer_chain.invoke({"input": user_question, "chat_history": langchain_chat_history, "context": context})
+            )
+        return answer or "I could not find an answer."
 
     def answer_question(self, user_question, chat_history):
         """Answers a user's question based on context and chat history."""
-        retriever = self.get_retriever()
-
-        if retriever is None:
-            return "I'm sorry, but no knowledge base has been loaded. Please upload a document to begin."
-
-        # 1. Context-aware retriever to reformulate questions
-        contextualize_q_prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", "Given a chat history and the latest user question which might reference context in the chat history, formulate a standalone question which can be understood without the chat history. Do NOT answer the question, just reformulate it if needed and otherwise return it as is."),
-                MessagesPlaceholder("chat_history"),
-                ("human", "{input}"),
-            ]
-        )
-        history_aware_retriever = create_history_aware_retriever(self.llm, retriever, contextualize_q_prompt)
-
-        # 2. Question-answering chain
-        qa_prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", "You are an assistant for question-answering tasks. Use the following pieces of retrieved context to answer the question. If you don't know the answer, just say that you don't know. Use three sentences maximum and keep the answer concise.\n\n{context}"),
-                MessagesPlaceholder("chat_history"),
-                ("human", "{input}"),
-            ]
-        )
-        question_answer_chain = create_stuff_documents_chain(self.llm, qa_prompt)
+        import vector_search
+
+        with stage("retriever.get"):
+            vector_stores = self.get_vector_stores()
+
+        if not vector_stores:
+            return NO_KNOWLEDGE_BASE_ANSWER
+
+        langchain_chat_history = to_langchain_history(chat_history)
+        history_key = [(message.type, message.content) for message in langchain_chat_history]
+
+        # 1. Reformulate the question into a standalone one (only needed with history)
+        standalone_question = self._reformulate(user_question, langchain_chat_history, history_key)
+
+        # 2. Embed the question(s) once and search every store with the same vectors. For a
+        #    follow-up, the user's own wording is searched alongside the standalone question.
+        with stage("query.embed"):
+            query_vectors = embed_search_queries(self.embeddings, self._search_questions(user_question, standalone_question))
+        # With reranking, over-fetch cheaply and keep only the best few chunks for the prompt
+        fetch_k = config.RERANK_FETCH_K if config.RERANK else SEARCH_K
+        with stage("query.search"):
+            result_lists = [vector_search.search_with_vectors(vs, query_vectors, fetch_k) for vs in vector_stores]
+        context = self._select_context(standalone_question, query_vectors[0], result_lists)
+
+        # 3. Answer from the retrieved context
+        return self._generate(user_question, langchain_chat_history, history_key, context)
+
+    def answer_with_memory(self, user_question):
+        """
+        Answers a question using the conversation kept server-side for this session (see
+        conversation_store.py), then records the exchange and compacts old turns in the background.
+        """
+        import conversation_store
+
+        memory = conversation_store.get_store()
+        answer = self.answer_question(user_question, memory.history(self.session_id))
+        memory.append(self.session_id, [("user", user_question), ("assistant", answer)])
+        memory.compact_in_background(self.session_id, self.llm)
+        return answer
+
+    def answer_questions(self, items, concurrency=None):
+        """
+        Answers many questions against this session's stores, yielding one result dict per
+        item as soon as it is ready (not in input order). Items are {"query", "history"?,
+        "id"?}. Reformulation and generation run on a bounded thread pool; all search
+        questions are embedded in batched calls and every store is searched once for the
+        whole batch. Each result carries per-item timings; a final {"summary": ...} dict
+        reports the shared stages.
+        """
+        import vector_search
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        batch_start = time.perf_counter()
+        concurrency = max(1, concurrency or config.BATCH_CONCURRENCY)
+        items = [dict(item, id=item.get("id", index)) for index, item in enumerate(items)]
+        summary = {"items": len(items), "errors": 0}
+
+        with stage("retriever.get"):
+            vector_stores = self.get_vector_stores()
+        if not vector_stores:
+            for item in items:
+                yield {"id": item["id"], "answer": NO_KNOWLEDGE_BASE_ANSWER, "timing": {"total_ms": 0.0}}
+            yield {"summary": summary}
+            return
+        version = self.store_version()
+
+        def elapsed_ms(start):
+            return round((time.perf_counter() - start) * 1000, 1)
+
+        def prepare(item):
+            start = time.perf_counter()
+            item["history"] = to_langchain_history(item.get("history") or [])
+            item["history_key"] = [(m.type, m.content) for m in item["history"]]
+            item["standalone"] = self._reformulate(item["query"], item["history"], item["history_key"])
+            item["timing"] = {"reformulate_ms": elapsed_ms(start)}
+            return item
+
+        def generate(item):
+            start = time.perf_counter()
+            answer = self._generate(item["query"], item["history"], item["history_key"], item["context"], version)
+            item["timing"]["generate_ms"] = elapsed_ms(start)
+            return item, answer
+
+        def failed(item, error):
+            summary["errors"] += 1
+            return {"id": item["id"], "error": str(error), "timing": dict(item.get("timing", {}), total_ms=elapsed_ms(batch_start))}
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="rag-batch") as executor:
+            # 1. Reformulate follow-ups (bounded concurrency)
+            ready = []
+            futures = {}
+            for item in items:
+                if isinstance(item.get("query"), str) and item["query"].strip():
+                    futures[executor.submit(prepare, item)] = item
+                else:
+                    yield failed(item, "Missing 'query'")
+            for future in as_completed(futures):
+                try:
+                    ready.append(future.result())
+                except Exception as e:
+                    yield failed(futures[future], e)
+
+            # 2. One batched embedding call for every distinct search question not already cached
+            groups, questions, positions = [], [], {}
+            for item in ready:
+                group = []
+                for question in self._search_questions(item["query"], item["standalone"]):
+                    if question not in positions:
+                        positions[question] = len(questions)
+                        questions.append(question)
+                    group.append(positions[question])
+                groups.append(group)
+            start = time.perf_counter()
+            with stage("batch.embed"):
+                query_vectors = embed_search_queries(self.embeddings, questions) if questions else []
+            summary["embed_ms"] = elapsed_ms(start)
+            summary["questions_embedded"] = len(questions)
+
+            # 3. One batched search per store for the whole batch
+            fetch_k = config.RERANK_FETCH_K if config.RERANK else SEARCH_K
+            start = time.perf_counter()
+            with stage("batch.search"):
+                per_store = [vector_search.batch_search_with_vectors(vs, query_vectors, fetch_k, groups) for vs in vector_stores] if ready else []
+            summary["search_ms"] = elapsed_ms(start)
+            for index, item in enumerate(ready):
+                item["context"] = self._select_context(
+                    item["standalone"], query_vectors[groups[index][0]], [results[index] for results in per_store]
+                )
+
+            # 4. Generation with bounded concurrency, streamed back as each answer completes
+            futures = {executor.submit(generate, item): item for item in ready}
+            for future in as_completed(futures):
+                try:
+                    item, answer = future.result()
+                except Exception as e:
+                    yield failed(futures[future], e)
+                    continue
+                yield {"id": item["id"], "answer": answer, "timing": dict(item["timing"], total_ms=elapsed_ms(batch_start))}
+
+        summary["seconds"] = round(time.perf_counter() - batch_start, 3)
+        yield {"summary": summary}
+
+
+# State of the background warmup started by the /warmup hook (or at startup)
+_warmup_state = {"state": "idle", "seconds": None, "error": None}
+_warmup_lock = threading.Lock()
+
+def warmup():
+    """Imports the heavy libraries and preloads the model clients, chains and base index."""
+    from TextProcessor import preload_converters
 
-        # 3. Final RAG chain
-        rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
+    with stage("warmup"):
+        embeddings = backends.get_embeddings()
+        llm = backends.get_chat_model()
+        get_chains(llm)
+        to_langchain_history([])
+        _faiss()
+        import rerank
+        import vector_search
+        load_base_db(config.BASE_VECTOR_STORE_PATH, embeddings)
+        if config.USER_STORE_BACKEND == "tenant":
+            import tenant_store
+            tenant_store.get_index()
+        preload_converters()
 
-        # Convert chat history from frontend format to LangChain message objects
-        langchain_chat_history = []
-        for msg in chat_history:
-            if msg.get("role") == "user":
-                langchain_chat_history.append(HumanMessage(content=msg.get("content")))
-            elif msg.get("role") == "assistant":
-                langchain_chat_history.append(AIMessage(content=msg.get("content")))
+def _run_warmup():
+    start = time.perf_counter()
+    try:
+        warmup()
+    except Exception as e:
+        print(f"Warmup failed: {e}")
+        with _warmup_lock:
+            _warmup_state.update(state="failed", seconds=round(time.perf_counter() - start, 3), error=str(e))
+        return
+    print(f"Warmup finished in {time.perf_counter() - start:.2f}s")
+    with _warmup_lock:
+        _warmup_state.update(state="done", seconds=round(time.perf_counter() - start, 3))
 
-        # Invoke the chain
-        result = rag_chain.invoke({"input": user_question, "chat_history": langchain_chat_history})
+def start_background_warmup():
+    """Starts warmup() in a daemon thread unless it is running or already done; returns its status."""
+    with _warmup_lock:
+        if _warmup_state["state"] in ("idle", "failed"):
+            _warmup_state.update(state="running", seconds=None, error=None)
+            threading.Thread(target=_run_warmup, name="rag-warmup", daemon=True).start()
+        return dict(_warmup_state)
 
-        return result.get("answer", "I could not find an answer.")
+def warmup_status():
+    with _warmup_lock:
+        return dict(_warmup_state)
@@ -0,0 +1,148 @@
+"""
+Local reranking of retrieved chunks before they are stuffed into the prompt.
+
+The stores are over-fetched (RERANK_FETCH_K per store, which is cheap for FAISS) and
+the candidates are rescored on CPU:
+
+- relevance: the query/chunk cosine similarity blended with a lexical score (IDF-
+  weighted share of the query's terms found in the chunk), or the scores of a small
+  ONNX cross-encoder when RERANK_MODEL_PATH points at one and onnxruntime/tokenizers
+  are installed;
+- diversity: maximal marginal relevance over the stored chunk vectors, so near-
+  duplicate chunks (e.g. the same passage in the base and the user store) don't use
+  up the prompt.
+
+Only the best RERANK_TOP_N chunks reach create_stuff_documents_chain. The tokens
+that would have been stuffed without reranking and the tokens actually stuffed are
+counted in rag_context_tokens_total; the stage latency is query.rerank.
+"""
+import os
+import re
+import math
+import threading
+
+import numpy as np
+
+import config
+import metrics
+from chunker import count_tokens
+from vector_search import mmr, normalize_rows
+
+CONTEXT_TOKENS = metrics.Counter(
+    "rag_context_tokens_total",
+    "Approximate tokens of retrieved context: all rerank candidates, what the fixed top-k "
+    "retrieval would have stuffed (baseline), and what was stuffed after reranking.",
+    labelnames=("context",),
+)
+
+_WORD_PATTERN = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from how i if in into is it its me my "
+    "of on or so that the their them then there these they this to was we were what when "
+    "where which who why will with you your about tell".split()
+)
+
+
+def _terms(text):
+    return [w for w in _WORD_PATTERN.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def lexical_scores(query, texts):
+    """Share of the query's terms (IDF-weighted over the candidates) that each text contains."""
+    query_terms = set(_terms(query))
+    if not query_terms or not texts:
+        return np.zeros(len(texts), dtype=np.float32)
+    text_terms = [set(_terms(text)) for text in texts]
+    idf = {}
+    for term in query_terms:
+        df = sum(1 for terms in text_terms if term in terms)
+        idf[term] = math.log((len(texts) + 1) / (df + 0.5))
+    total = sum(idf.values()) or 1.0
+    return np.asarray([sum(idf[t] for t in query_terms if t in terms) / total for terms in text_terms], dtype=np.float32)
+
+
+def _min_max(scores):
+    spread = scores.max() - scores.min()
+    return (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+
+
+class _CrossEncoder:
+    """ONNX cross-encoder (model.onnx + tokenizer.json in one directory) scoring (query, text) pairs."""
+
+    def __init__(self, path):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.session = onnxruntime.InferenceSession(os.path.join(path, "model.onnx"), providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=512)
+        self.tokenizer.enable_padding()
+
+    def score(self, query, texts):
+        encodings = self.tokenizer.encode_batch([(query, text) for text in texts])
+        feeds = {
+            "input_ids": np.asarray([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.asarray([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.asarray([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        logits = self.session.run(None, {name: value for name, value in feeds.items() if name in self.input_names})[0]
+        return np.asarray(logits, dtype=np.float32).reshape(len(texts), -1)[:, -1]
+
+
+_cross_encoder = None
+_cross_encoder_lock = threading.Lock()
+
+
+def get_cross_encoder():
+    """Returns the configured cross-encoder, or None if none is configured or it can't be loaded."""
+    global _cross_encoder
+    if not config.RERANK_MODEL_PATH:
+        return None
+    with _cross_encoder_lock:
+        if _cross_encoder is None:
+            try:
+                _cross_encoder = _CrossEncoder(config.RERANK_MODEL_PATH)
+                print(f"Loaded cross-encoder reranker from: {config.RERANK_MODEL_PATH}")
+            except Exception as e:
+                print(f"Cross-encoder reranker unavailable, using lexical + vector scores: {e}")
+                _cross_encoder = False
+        return _cross_encoder or None
+
+
+def rerank(query, query_vector, candidates, top_n=None, baseline=None):
+    """
+    Picks the best top_n of (Document, vector) candidates for the prompt. `baseline` is
+    the list of documents a plain top-k retrieval would have used, for token accounting.
+    """
+    top_n = top_n or config.RERANK_TOP_N
+    # The same chunk can come back from several stores
+    unique, seen = [], set()
+    for doc, vector in candidates:
+        if doc.page_content not in seen:
+            seen.add(doc.page_content)
+            unique.append((doc, vector))
+    if not unique:
+        return []
+
+    docs = [doc for doc, _ in unique]
+    texts = [doc.page_content for doc in docs]
+    vectors = normalize_rows(np.asarray([vector for _, vector in unique], dtype=np.float32))
+
+    cross_encoder = get_cross_encoder()
+    if cross_encoder is not None:
+        relevance = _min_max(cross_encoder.score(query, texts))
+    else:
+        query_unit = np.asarray(query_vector, dtype=np.float32)
+        query_unit = query_unit / (np.linalg.norm(query_unit) or 1.0)
+        dense = _min_max(vectors @ query_unit)
+        weight = config.RERANK_LEXICAL_WEIGHT
+        relevance = (1.0 - weight) * dense + weight * lexical_scores(query, texts)
+
+    selected = [docs[i] for i in mmr(relevance, vectors, top_n, config.RERANK_MMR_LAMBDA)]
+
+    CONTEXT_TOKENS.inc(sum(count_tokens(t) for t in texts), context="candidates")
+    if baseline is not None:
+        CONTEXT_TOKENS.inc(sum(count_tokens(doc.page_content) for doc in baseline), context="baseline")
+    CONTEXT_TOKENS.inc(sum(count_tokens(doc.page_content) for doc in selected), context="reranked")
+    return selected
@@ -0,0 +1,97 @@
+import os
+import re
+import bisect
+import hashlib
+
+import config
+
+# Session IDs end up in filesystem paths, so only allow a conservative character set.
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]{0,127}$")
+
+
+def _hash(key):
+    """Returns a stable 64-bit integer hash for a string key."""
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+
+def is_valid_session_id(session_id):
+    """Checks that a session ID is safe to use as a directory name."""
+    return bool(session_id) and _SESSION_ID_PATTERN.match(session_id) is not None
+
+
+def shard_path(root, session_id, depth=None):
+    """
+    Returns the hashed fan-out directory for a session under root.
+
+    With depth=2 a session maps to root/ab/cd/<session_id>, where ab and cd are the
+    leading bytes of the SHA-1 of the session ID. This keeps directory listings small
+    on the shared mount no matter how many sessions exist.
+    """
+    if depth is None:
+        depth = config.USER_STORE_SHARD_DEPTH
+    digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+    parts = [digest[2 * i:2 * i + 2] for i in range(depth)]
+    return os.path.join(root, *parts, session_id)
+
+
+def user_store_path(session_id):
+    """
+    Returns the sharded vector store path for a session.
+
+    Stores written with the old flat layout (user_dbs/<session_id>) are moved into
+    their shard the first time they are looked up.
+    """
+    path = shard_path(config.USER_VECTOR_STORES_PATH, session_id)
+    legacy_path = os.path.join(config.USER_VECTOR_STORES_PATH, session_id)
+    if path != legacy_path and not os.path.exists(path) and os.path.isdir(legacy_path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.replace(legacy_path, path)
+            print(f"Migrated user vector store for session {session_id} to: {path}")
+        except OSError as e:
+            # Another instance may have moved it first; fall back to whichever exists.
+            print(f"Could not migrate legacy store for session {session_id}: {e}")
+            if not os.path.exists(path):
+                return legacy_path
+    return path
+
+
+class HashRing:
+    """Consistent-hash ring mapping session IDs onto service instances."""
+
+    def __init__(self, nodes=(), replicas=100):
+        self.replicas = replicas
+        self._keys = []
+        self._nodes = {}
+        for node in nodes:
+            self.add_node(node)
+
+    def add_node(self, node):
+        for i in range(self.replicas):
+            key = _hash(f"{node}#{i}")
+            if key in self._nodes:
+                continue
+            bisect.insort(self._keys, key)
+            self._nodes[key] = node
+
+    def remove_node(self, node):
+        for i in range(self.replicas):
+            key = _hash(f"{node}#{i}")
+            if self._nodes.get(key) == node:
+                del self._nodes[key]
+                self._keys.remove(key)
+
+    def get_node(self, key):
+        """Returns the instance responsible for key, or None if the ring is empty."""
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[self._keys[index]]
+
+
+_ring = HashRing(config.SERVICE_INSTANCES or [config.INSTANCE_ID])
+
+
+def affinity_for(session_id):
+    """Returns the instance that should serve a session so its indexes stay hot there."""
+    return _ring.get_node(session_id)
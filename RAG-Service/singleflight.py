@@ -0,0 +1,78 @@
+"""
+Request coalescing ("single-flight") for upstream model calls.
+
+When several threads ask for the same thing at the same time (e.g. dozens of sessions
+asking the identical first question after a link is shared), only the first caller
+runs the upstream call; the others wait for it and receive the same result.
+"""
+import json
+import hashlib
+import threading
+
+import metrics
+
+CALLS = metrics.Counter(
+    "rag_singleflight_calls_total",
+    "Calls that went through a single-flight group.",
+    labelnames=("operation",),
+)
+UPSTREAM_CALLS = metrics.Counter(
+    "rag_singleflight_upstream_calls_total",
+    "Calls that actually ran upstream (the leader of each coalesced group).",
+    labelnames=("operation",),
+)
+SAVED_CALLS = metrics.Counter(
+    "rag_singleflight_saved_calls_total",
+    "Calls served from another in-flight call's result instead of going upstream.",
+    labelnames=("operation",),
+)
+
+
+def make_key(*parts):
+    """Hashes JSON-serialisable parts (prompt, model, store version, ...) into a coalescing key."""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Group:
+    """Coalesces concurrent calls that share a key into a single execution."""
+
+    def __init__(self, operation):
+        self.operation = operation
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Runs fn() unless an identical call is in flight, in which case its result is shared."""
+        CALLS.inc(operation=self.operation)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            SAVED_CALLS.inc(operation=self.operation)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        UPSTREAM_CALLS.inc(operation=self.operation)
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,335 @@
+"""
+Multi-tenant user store: one shared, append-only vector segment instead of a FAISS
+directory per session.
+
+Every process appends to its own segment under TENANT_STORE_PATH:
+
+- segment-<instance>-<pid>-<nonce>.f32    raw float32 vectors, one row per chunk
+- segment-<instance>-<pid>-<nonce>.jsonl  one record per chunk: session_id, byte offset
+                                          of its vector, text and metadata
+
+The record log is the commit point: a vector only exists once its record line has
+been written. Each process keeps a posting list per session in memory (the session's
+vectors as a contiguous matrix, plus texts and metadata), so a query is a brute-force
+search over that session's rows only and never touches the disk. An ingest appends a
+few rows to two files instead of rewriting a whole index. Segments written by other
+instances are tailed in a background thread every TENANT_REFRESH_SECONDS; with session
+affinity (see sharding.py) a session's ingest and queries land on the same instance and
+see each other immediately.
+
+Scores are squared L2 distances, like the FAISS stores, so results are interchangeable.
+"""
+import os
+import json
+import uuid
+import threading
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+import config
+
+SEGMENT_PREFIX = "segment-"
+VECTORS_SUFFIX = ".f32"
+RECORDS_SUFFIX = ".jsonl"
+
+
+class _Posting:
+    """The rows of one session: a growable float32 matrix with texts and metadata."""
+
+    def __init__(self, dim):
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.norms = np.empty(0, dtype=np.float32)
+        self.count = 0
+        self.texts = []
+        self.metadatas = []
+
+    def append(self, vectors, texts, metadatas):
+        needed = self.count + len(vectors)
+        if needed > len(self.vectors):
+            # Most sessions never grow past their first ingest, so only over-allocate on growth
+            capacity = needed if self.count == 0 else max(needed, 2 * len(self.vectors))
+            grown = np.empty((capacity, self.vectors.shape[1]), dtype=np.float32)
+            grown[:self.count] = self.vectors[:self.count]
+            grown_norms = np.empty(capacity, dtype=np.float32)
+            grown_norms[:self.count] = self.norms[:self.count]
+            self.vectors, self.norms = grown, grown_norms
+        self.vectors[self.count:needed] = vectors
+        self.norms[self.count:needed] = np.einsum("ij,ij->i", vectors, vectors)
+        self.texts.extend(texts)
+        self.metadatas.extend(metadatas)
+        # Publish the new count last, so a concurrent reader never sees unfilled rows
+        self.count = needed
+
+    def snapshot(self):
+        count = self.count
+        return self.vectors[:count], self.norms[:count], self.texts[:count], self.metadatas[:count]
+
+
+class TenantIndex:
+    """In-memory posting lists over all segments in a directory, appending to its own segment."""
+
+    def __init__(self, root, segment_name=None):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        # One writer per segment: a fresh segment per process start, so restarts and
+        # several workers on one host never append to the same file
+        self.segment = segment_name or f"{SEGMENT_PREFIX}{config.INSTANCE_ID}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._postings = {}
+        self._consumed = {}     # segment name -> bytes of its record log already applied
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._tailer = None
+        self.refresh()
+
+    def _paths(self, segment):
+        base = os.path.join(self.root, segment)
+        return base + VECTORS_SUFFIX, base + RECORDS_SUFFIX
+
+    def _posting(self, session_id, dim):
+        posting = self._postings.get(session_id)
+        if posting is None:
+            posting = self._postings[session_id] = _Posting(dim)
+        return posting
+
+    # --- Writing ------------------------------------------------------------
+
+    def append(self, session_id, texts, vectors, metadatas=None):
+        """Appends a session's chunks to this process's segment and its posting list."""
+        texts = list(texts)
+        if not texts:
+            return 0
+        metadatas = list(metadatas or [{} for _ in texts])
+        array = np.ascontiguousarray(vectors, dtype=np.float32)
+        row_bytes = array.shape[1] * 4
+        vectors_path, records_path = self._paths(self.segment)
+
+        with self._write_lock:
+            with open(vectors_path, "ab") as f:
+                offset = f.tell()
+                f.write(array.tobytes())
+            data = "".join(
+                json.dumps({"session_id": session_id, "offset": offset + i * row_bytes, "dim": array.shape[1],
+                            "text": text, "metadata": metadata}, ensure_ascii=False) + "\n"
+                for i, (text, metadata) in enumerate(zip(texts, metadatas))
+            ).encode("utf-8")
+            with open(records_path, "ab") as f:
+                f.write(data)
+            with self._lock:
+                self._posting(session_id, array.shape[1]).append(array, texts, metadatas)
+        return len(texts)
+
+    # --- Reading ------------------------------------------------------------
+
+    def _tail_segment(self, segment, records_size):
+        """Applies the complete records a segment gained since the last refresh."""
+        vectors_path, records_path = self._paths(segment)
+        start = self._consumed.get(segment, 0)
+        if records_size <= start:
+            return 0
+        with open(records_path, "rb") as f:
+            f.seek(start)
+            data = f.read(records_size - start)
+        # A writer may be mid-line; only consume up to the last complete record
+        data = data[:data.rfind(b"\n") + 1]
+        if not data:
+            return 0
+
+        applied = 0
+        consumed = start
+        batches = {}
+        with open(vectors_path, "rb") as vf:
+            for line in data.splitlines(keepends=True):
+                record = json.loads(line)
+                vf.seek(record["offset"])
+                raw = vf.read(record["dim"] * 4)
+                if len(raw) < record["dim"] * 4:
+                    break   # vector bytes not visible yet; retry on the next refresh
+                batch = batches.setdefault((record["session_id"], record["dim"]), ([], [], []))
+                batch[0].append(np.frombuffer(raw, dtype=np.float32))
+                batch[1].append(record["text"])
+                batch[2].append(record["metadata"])
+                consumed += len(line)
+                applied += 1
+
+        with self._lock:
+            for (session_id, dim), (vectors, texts, metadatas) in batches.items():
+                self._posting(session_id, dim).append(np.vstack(vectors), texts, metadatas)
+            self._consumed[segment] = consumed
+        return applied
+
+    def refresh(self):
+        """Picks up records appended to other processes' segments. Returns the number applied."""
+        with self._refresh_lock:
+            applied = 0
+            with os.scandir(self.root) as entries:
+                segments = [(entry.name[:-len(RECORDS_SUFFIX)], entry.stat().st_size) for entry in entries
+                            if entry.name.startswith(SEGMENT_PREFIX) and entry.name.endswith(RECORDS_SUFFIX)]
+            for segment, size in sorted(segments):
+                if segment != self.segment:
+                    applied += self._tail_segment(segment, size)
+            return applied
+
+    def start_tailing(self, interval=None):
+        """Refreshes from the shared directory in a daemon thread every `interval` seconds."""
+        interval = config.TENANT_REFRESH_SECONDS if interval is None else interval
+        if self._tailer is not None or interval <= 0:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Tenant store refresh failed: {e}")
+
+        self._tailer = threading.Thread(target=loop, name="tenant-store-tail", daemon=True)
+        self._tailer.start()
+
+    def stop_tailing(self):
+        self._stop.set()
+
+    def count(self, session_id):
+        """Number of chunks stored for a session (also its version stamp, as rows are append-only)."""
+        posting = self._postings.get(session_id)
+        return posting.count if posting is not None else 0
+
+    @property
+    def sessions(self):
+        return len(self._postings)
+
+    @property
+    def nbytes_in_memory(self):
+        """Bytes held by the posting-list matrices."""
+        with self._lock:
+            return sum(p.vectors.nbytes + p.norms.nbytes for p in self._postings.values())
+
+    def vectors(self, session_id, rows):
+        """Float32 vectors of a session's rows."""
+        return self._postings[session_id].vectors[np.asarray(rows, dtype=np.int64)]
+
+    def search(self, session_id, embedding, k=4):
+        """Exact search over one session's rows. Returns (Document, squared L2 distance) pairs."""
+        posting = self._postings.get(session_id)
+        if posting is None:
+            return []
+        vectors, norms, texts, metadatas = posting.snapshot()
+        n = len(texts)
+        if n == 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        k = min(k, n)
+        distances = norms - 2.0 * (vectors @ query) + float(query @ query)
+        top = np.argpartition(distances, k - 1)[:k] if k < n else np.arange(n)
+        ids = top[np.argsort(distances[top])]
+        return [
+            (Document(id=f"{session_id}:{i}", page_content=texts[i], metadata=metadatas[i]), float(distances[i]))
+            for i in ids
+        ]
+
+
+class TenantSessionStore(VectorStore):
+    """LangChain vector store view of one session's rows in a TenantIndex."""
+
+    def __init__(self, index: TenantIndex, session_id: str, embedding: Embeddings):
+        self.index = index
+        self.session_id = session_id
+        self.embedding_function = embedding
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding_function
+
+    def __len__(self):
+        return self.index.count(self.session_id)
+
+    def add_embeddings(self, text_embeddings: Iterable[Tuple[str, List[float]]], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        text_embeddings = list(text_embeddings)
+        if not text_embeddings:
+            return []
+        first_id = len(self)
+        self.index.append(self.session_id, [t for t, _ in text_embeddings], [v for _, v in text_embeddings], metadatas)
+        return [f"{self.session_id}:{i}" for i in range(first_id, first_id + len(text_embeddings))]
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        vectors = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(zip(texts, vectors), metadatas=metadatas)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, session_id: str = "default", **kwargs: Any):
+        store = cls(get_index(), session_id, embedding)
+        store.add_texts(texts, metadatas=metadatas)
+        return store
+
+    def matrix(self):
+        """(vectors, squared norms, document(row)) of the session's rows, without copying (see vector_search.py)."""
+        posting = self.index._postings.get(self.session_id)
+        if posting is None:
+            return np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.float32), None
+        vectors, norms, texts, metadatas = posting.snapshot()
+        return vectors, norms, lambda row: Document(id=f"{self.session_id}:{row}", page_content=texts[row], metadata=metadatas[row])
+
+    def vectors_for(self, docs):
+        """Float32 vectors of documents returned by this store's searches (rows from their ids)."""
+        return self.index.vectors(self.session_id, [int(doc.id.rsplit(":", 1)[1]) for doc in docs])
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.index.search(self.session_id, embedding, k=k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding_function.embed_query(query), k=k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+
+def store_contents(store):
+    """Extracts (texts, float32 vectors, metadatas) from a FAISS or quantized store."""
+    if hasattr(store, "index_to_docstore_id"):
+        ids = [store.index_to_docstore_id[i] for i in range(store.index.ntotal)]
+        docs = [store.docstore.search(doc_id) for doc_id in ids]
+        vectors = store.index.reconstruct_n(0, store.index.ntotal)
+        return [d.page_content for d in docs], vectors, [dict(d.metadata) for d in docs]
+    vectors = store._full_vectors()
+    return list(store.texts), vectors, [dict(m) for m in store.metadatas]
+
+
+# One index per process, shared by every RAGManager
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Returns the process-wide TenantIndex, replaying the shared segments on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = TenantIndex(config.TENANT_STORE_PATH)
+            _index.start_tailing()
+        return _index
+
+
+def reset_index():
+    """Forgets the process-wide index (the segments on disk are kept)."""
+    global _index
+    with _index_lock:
+        if _index is not None:
+            _index.stop_tailing()
+        _index = None
+
+
+def session_store(session_id, embeddings):
+    """Returns the session's view of the shared index, or None if it holds no rows yet."""
+    index = get_index()
+    if index.count(session_id) == 0:
+        return None
+    return TenantSessionStore(index, session_id, embeddings)
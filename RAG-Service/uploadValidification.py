@@ -1,9 +1,16 @@
 import os
 import re
 
+# Bytes sniffed from the start of a body. `filetype` needs 261 for most signatures, but
+# DOCX is recognised from the names of the first zip entries, which can sit further in.
+HEAD_BYTES = 8192
+
+_TEXT_EXTENSIONS = {".txt": "plain_text", ".md": "plain_text", ".json": "json"}
+_URL_PATTERN = re.compile(r'https?://\S+')
+
+
 def detect_file_type(file_path):
     _, ext = os.path.splitext(file_path.lower())
-    print(ext)
     if ext == ".pdf":
         return "pdf"
     elif ext == ".docx":
@@ -15,12 +22,52 @@ def detect_file_type(file_path):
     else:
 
         return "unknown"
-    
+
+
+def _looks_like_text(head):
+    """Whether the first bytes of a body decode as UTF-8 text (a cut multi-byte character is allowed)."""
+    if b"\x00" in head:
+        return False
+    for cut in range(4):
+        try:
+            head[:len(head) - cut].decode("utf-8")
+            return True
+        except UnicodeDecodeError:
+            continue
+    return False
+
+
+def detect_bytes_type(head, filename=None):
+    """
+    Detects the input type from the first HEAD_BYTES of a body by its magic bytes.
+    The filename is only used to tell JSON from plain text, which have no signature.
+    """
+    import filetype
+
+    kind = filetype.guess(bytes(head))
+    if kind is not None:
+        if kind.extension == "pdf":
+            return "pdf"
+        if kind.extension == "docx":
+            return "docx"
+        return "unknown"
+
+    if not _looks_like_text(head):
+        return "unknown"
+    _, ext = os.path.splitext((filename or "").lower())
+    if ext in _TEXT_EXTENSIONS:
+        return _TEXT_EXTENSIONS[ext]
+    return "json" if head.lstrip()[:1] in (b"{", b"[") else "plain_text"
+
+
+def detect_path_type(file_path):
+    """Detects the type of a file on disk from its first bytes."""
+    with open(file_path, "rb") as f:
+        return detect_bytes_type(f.read(HEAD_BYTES), file_path)
 
 
 def detect_string_type(input_str):
-    url_pattern = re.compile(r'https?://\S+')
-    if url_pattern.match(input_str.strip()):
+    if _URL_PATTERN.match(input_str.strip()):
         return "url"
     elif len(input_str.split()) > 5:  # crude check: has enough words
         return "plain_text"
@@ -28,11 +75,17 @@ def detect_string_type(input_str):
         return "unknown"
 
 def detect_input_type(input_data):
-    if os.path.exists(input_data):  # It's a file path
-        print("file type")
-        return detect_file_type(input_data)
+    if isinstance(input_data, (bytes, bytearray, memoryview)):
+        return detect_bytes_type(bytes(input_data[:HEAD_BYTES]))
+    if hasattr(input_data, "read"):  # A file object, e.g. an upload stream
+        position = input_data.tell()
+        head = input_data.read(HEAD_BYTES)
+        input_data.seek(position)
+        name = getattr(input_data, "name", None)
+        return detect_bytes_type(head, name if isinstance(name, str) else None)
+    if _URL_PATTERN.match(input_data.strip()):  # Skip the filesystem probe for URLs
+        return "url"
+    if os.path.isfile(input_data):  # It's a file path
+        return detect_path_type(input_data)
     else:  # It's a string
-        print("String from u")
         return detect_string_type(input_data)
-
-
@@ -0,0 +1,210 @@
+"""
+Vectorized exact search and maximal marginal relevance over the vectors the stores
+already hold in memory.
+
+LangChain's FAISS wrapper searches one query at a time and, for MMR, re-fetches the
+candidate vectors from the index and selects them in a Python loop. Here several
+query vectors (e.g. the user's question and its standalone reformulation) are scored
+against the whole store in one batched call (a single matrix multiply, or one FAISS
+search call with the whole query batch), and MMR runs on a precomputed candidate
+similarity matrix.
+
+For flat FAISS indexes the vector matrix is a copy of the index's storage, taken once
+per store together with the squared row norms and extended incrementally as rows are
+appended. A live view would point into memory that index.add() can reallocate while a
+search is still reading it. Tenant stores (tenant_store.py) expose their posting-list
+matrices directly. Other stores, such as the quantized ones, fall back to their own
+per-query search so their memory savings are kept.
+
+Distances are squared L2, like the FAISS stores.
+"""
+import threading
+import weakref
+
+import numpy as np
+
+# store -> (vectors, squared norms); weak keys, so evicted stores are forgotten
+_matrix_cache = weakref.WeakKeyDictionary()
+_matrix_lock = threading.Lock()
+
+
+def _faiss_matrix(store):
+    """
+    (vectors, squared norms) of a flat L2 FAISS index, copied out of the index and
+    cached per store; only rows added since the last call are copied. None for other
+    index types.
+    """
+    import faiss
+
+    index = store.index
+    if getattr(store, "_normalize_L2", False) or index.metric_type != faiss.METRIC_L2 or not hasattr(index, "get_xb"):
+        return None
+    n, d = index.ntotal, index.d
+    if n == 0:
+        return np.empty((0, d), dtype=np.float32), np.empty(0, dtype=np.float32)
+    with _matrix_lock:
+        cached = _matrix_cache.get(store)
+    if cached is not None and len(cached[0]) == n:
+        return cached
+    start = len(cached[0]) if cached is not None and len(cached[0]) < n else 0
+    # np.array copies, so nothing keeps pointing into storage a later add() may reallocate
+    vectors = np.array(faiss.rev_swig_ptr(index.get_xb(), n * d)[start * d:], dtype=np.float32, copy=True).reshape(-1, d)
+    norms = np.einsum("ij,ij->i", vectors, vectors)
+    if start:
+        vectors, norms = np.vstack([cached[0], vectors]), np.concatenate([cached[1], norms])
+    with _matrix_lock:
+        _matrix_cache[store] = (vectors, norms)
+    return vectors, norms
+
+
+def store_matrix(store):
+    """
+    Returns (vectors, squared norms, document(row)) for a store whose vectors can be
+    searched directly, or None if the store has to search its own representation.
+    """
+    if hasattr(store, "matrix"):  # tenant_store.TenantSessionStore
+        return store.matrix()
+    if hasattr(store, "index_to_docstore_id"):  # LangChain FAISS
+        matrix = _faiss_matrix(store)
+        if matrix is None:
+            return None
+        vectors, norms = matrix
+        return vectors, norms, lambda row: store.docstore.search(store.index_to_docstore_id[row])
+    return None
+
+
+def batch_distances(vectors, norms, query_vectors):
+    """(queries, rows) squared L2 distances from one matrix multiply."""
+    queries = np.asarray(query_vectors, dtype=np.float32).reshape(-1, vectors.shape[1])
+    query_norms = np.einsum("ij,ij->i", queries, queries)
+    # (rows, d) @ (d, queries) streams the store matrix once in its own memory order,
+    # which BLAS runs about twice as fast as queries @ vectors.T
+    return norms[None, :] - 2.0 * (vectors @ queries.T).T + query_norms[:, None]
+
+
+def _top_k(distances, k):
+    """Per-query (distances, rows) of the k nearest rows, nearest first."""
+    n = distances.shape[1]
+    k = min(k, n)
+    rows = np.argpartition(distances, k - 1, axis=1)[:, :k] if k < n else np.broadcast_to(np.arange(n), distances.shape)
+    top = np.take_along_axis(distances, rows, axis=1)
+    order = np.argsort(top, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(rows, order, axis=1)
+
+
+def _merge_rows(distances, rows, k):
+    """Merges per-query (distances, rows) top-k lists into the k rows with the best distance."""
+    best = {}
+    for row, distance in zip(rows.ravel().tolist(), distances.ravel().tolist()):
+        if row >= 0 and (row not in best or distance < best[row]):
+            best[row] = distance
+    return sorted(best, key=best.get)[:k]
+
+
+def _fallback_search(store, query_vectors, k):
+    best = {}
+    for query_vector in query_vectors:
+        for doc, score in store.similarity_search_with_score_by_vector(list(query_vector), k=k):
+            key = doc.id or doc.page_content
+            if key not in best or score < best[key][1]:
+                best[key] = (doc, score)
+    return sorted(best.values(), key=lambda item: item[1])[:k]
+
+
+def search(store, query_vectors, k):
+    """The k documents nearest to any of the query vectors."""
+    return [doc for doc, _ in search_with_vectors(store, query_vectors, k)]
+
+
+def search_with_vectors(store, query_vectors, k):
+    """The k (Document, vector) pairs nearest to any of the query vectors."""
+    query_vectors = _as_queries(query_vectors)
+    return batch_search_with_vectors(store, query_vectors, k, groups=[list(range(len(query_vectors)))])[0]
+
+
+def _as_queries(query_vectors):
+    query_vectors = np.asarray(query_vectors, dtype=np.float32)
+    return query_vectors[None, :] if query_vectors.ndim == 1 else query_vectors
+
+
+def batch_search_with_vectors(store, query_vectors, k, groups=None):
+    """
+    Searches many query vectors in one batched call. Returns, for each group of query
+    indices (default: every query on its own), the k (Document, vector) pairs nearest
+    to any query of the group.
+    """
+    query_vectors = _as_queries(query_vectors)
+    if groups is None:
+        groups = [[i] for i in range(len(query_vectors))]
+    matrix = store_matrix(store)
+    if matrix is None:
+        results = []
+        for group in groups:
+            docs = [doc for doc, _ in _fallback_search(store, query_vectors[group], k)]
+            results.append(list(zip(docs, store.vectors_for(docs))) if docs else [])
+        return results
+
+    vectors, norms, document = matrix
+    if len(norms) == 0:
+        return [[] for _ in groups]
+    if hasattr(store, "index_to_docstore_id"):
+        # FAISS's fused distance + top-k kernel beats a NumPy matmul for the distances
+        # themselves; it takes the whole query batch in one call
+        distances, rows = store.index.search(query_vectors, min(k, len(norms)))
+        # Rows appended after the matrix was copied aren't in it; leave them to the next query
+        rows[rows >= len(norms)] = -1
+    else:
+        distances, rows = _top_k(batch_distances(vectors, norms, query_vectors), k)
+
+    results = []
+    for group in groups:
+        picked_rows = _merge_rows(distances[group], rows[group], k)
+        picked = vectors[np.asarray(picked_rows, dtype=np.int64)]
+        results.append([(document(int(row)), vector) for row, vector in zip(picked_rows, picked)])
+    return results
+
+
+def normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def mmr(relevance, vectors, n, lambda_mult):
+    """
+    Greedy maximal marginal relevance. `vectors` are unit rows; the candidate similarity
+    matrix is computed once and redundancy is updated with one vector op per pick.
+    Returns the selected row indices in selection order.
+    """
+    count = len(relevance)
+    n = min(n, count)
+    if n == 0:
+        return []
+    similarity = vectors @ vectors.T
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of every candidate to anything selected so far
+    redundancy = similarity[selected[0]].copy()
+    available = np.ones(count, dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < n:
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return selected
+
+
+def max_marginal_relevance_search(store, query_vector, k=4, fetch_k=20, lambda_mult=0.5):
+    """
+    Same selection as LangChain's max_marginal_relevance_search_by_vector: the fetch_k
+    nearest chunks, then MMR on cosine similarity to the query and to each other.
+    """
+    candidates = search_with_vectors(store, [query_vector], fetch_k)
+    if not candidates:
+        return []
+    unit = normalize_rows(np.asarray([vector for _, vector in candidates], dtype=np.float32))
+    query = np.asarray(query_vector, dtype=np.float32)
+    relevance = unit @ (query / (np.linalg.norm(query) or 1.0))
+    return [candidates[i][0] for i in mmr(relevance, unit, k, lambda_mult)]
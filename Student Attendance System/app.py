@@ -1,8 +1,8 @@
 from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, Response
 import os
+import io
 import subprocess
 import sys
-import pandas as pd
 from datetime import datetime
 import json
 import cv2
@@ -10,7 +10,16 @@ import csv
 import numpy as np
 import threading
 import time
-from PIL import Image
+
+from frame_pipeline import FramePipeline
+from attendance_ledger import AttendanceLedger
+from attendance_store import AttendanceStore
+from status_board import StatusBoard
+from student_lookup import StudentLookup
+from training_jobs import TrainingJobs
+from face_tracker import FaceTracker
+import face_archive
+import face_training
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'
@@ -18,11 +27,12 @@ app.secret_key = 'your-secret-key-here'
 # Global variables for camera streaming
 recognized_student_message = ''
 already_marked_message = ''
-camera = None
+camera = None  # FramePipeline running the camera while it is active
 camera_active = False
 capture_mode = None  # 'enroll' or 'recognize'
 student_info = {}
 image_count = 0
+captured_faces = []  # normalized face samples of the student being enrolled
 capturing = False
 
 # Common functions
@@ -38,36 +48,22 @@ def get_system_status():
     haarcascade_status = check_haarcascadefile()
     model_trained = os.path.isfile("TrainingImageLabel/Trainner.yml")
     
-    student_count = 0
-    if os.path.isfile("Student_Details/students.csv"):
-        try:
-            df = pd.read_csv("Student_Details/students.csv")
-            student_count = len(df)
-        except:
-            student_count = 0
-    
     return {
         'haarcascade_status': haarcascade_status,
         'model_trained': model_trained,
-        'student_count': student_count
+        'student_count': attendance_store.student_count()
     }
 
 def get_today_attendance():
     """Get today's attendance records"""
-    date = datetime.now().strftime("%Y-%m-%d")
-    status_file = f"Student_Status/Status_for_{date}.csv"
+    return attendance_ledger.records()
+
+def save_student(name, student_id):
+    """Register the student and append them to the CSV file read by the command line tools"""
+    attendance_store.add_student(student_id, name)
+    student_lookup.invalidate()
+    status_board.invalidate()
 
-    
-    if os.path.isfile(status_file):
-        try:
-            df = pd.read_csv(status_file)
-            return df.to_dict('records')
-        except:
-            return []
-    return []
-
-def save_student_to_csv(name, student_id):
-    """Save student data to CSV file"""
     student_details = "Student_Details/"
     assure_path_exists(student_details)
     csv_file = os.path.join(student_details, "students.csv")
@@ -87,88 +83,56 @@ def save_student_to_csv(name, student_id):
             now.strftime("%H:%M:%S")
         ])
 
-def train_face_recognition_model():
-    """Train the face recognition model"""
-    try:
-        # Initialize recognizer
-        recognizer = cv2.face.LBPHFaceRecognizer_create()
-        
-        # Path for face images
-        path = 'Training_Data'
-        
-        # Function to get images and label data
-        def get_images_and_labels(path):
-            image_paths = [os.path.join(path, f) for f in os.listdir(path)]
-            face_samples = []
-            ids = []
-            
-            for image_path in image_paths:
-                if image_path.endswith('.jpg') or image_path.endswith('.png'):
-                    # Get the label (ID) from filename
-                    filename = os.path.basename(image_path)
-                    try:
-                        # Expecting format: name.id.number.jpg
-                        parts = filename.split('.')
-                        if len(parts) >= 3:
-                            label_id = int(parts[1])
-                        else:
-                            continue
-                    except (ValueError, IndexError):
-                        print(f"Skipping file with invalid format: {filename}")
-                        continue
-                    
-                    # Load image and convert to grayscale
-                    pil_image = Image.open(image_path).convert('L')  # Convert to grayscale
-                    img_numpy = np.array(pil_image, 'uint8')
-                    
-                    face_samples.append(img_numpy)
-                    ids.append(label_id)
-            
-            return face_samples, ids
-        
-        print("Training faces. It will take a few seconds. Wait ...")
-        faces, ids = get_images_and_labels(path)
-        
-        if len(faces) == 0:
-            raise Exception("No training images found. Please capture some images first.")
-        
-        # Train the recognizer
-        recognizer.train(faces, np.array(ids))
-        
-        # Save the model
-        assure_path_exists("TrainingImageLabel/")
-        recognizer.write('TrainingImageLabel/Trainner.yml')
-        
-        print(f"Model trained successfully. {len(np.unique(ids))} students trained.")
-        return True, f"Model trained successfully with {len(faces)} images for {len(np.unique(ids))} students."
-        
-    except Exception as e:
-        print(f"Training error: {str(e)}")
-        return False, str(e)
+def records_to_csv(records, columns):
+    """Render a list of dicts as CSV text"""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=columns)
+    writer.writeheader()
+    writer.writerows(records)
+    return out.getvalue()
 
 class CameraStream:
     def __init__(self):
         self.camera = cv2.VideoCapture(0)
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        )
-        # For recognition
-        self.recognizer = None
-        self.students_df = None
-        
-    def __del__(self):
+        # Detects on a downscaled frame every few frames and tracks faces in between
+        self.tracker = FaceTracker()
+        # For recognition (the model itself is the shared recognizer_model)
+        self.students = None
+        self.model_version = None
+        # Time of the last saved enrollment image, to space captures out
+        self.last_capture = 0.0
+
+    def read(self):
+        """Reads the next camera frame (capture thread)."""
+        ret, frame = self.camera.read()
+        return frame if ret else None
+
+    def release(self):
         if self.camera:
             self.camera.release()
-    
-    def get_frame(self):
+            self.camera = None
+
+    def process(self, frame):
+        """Detects faces and runs enrollment capture or recognition on a frame (processing thread)."""
         global capture_mode, student_info, image_count, capturing
-        
-        ret, frame = self.camera.read()
-        if not ret:
-            return None
-            
+
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+        recognizer = None
+        if capture_mode == 'recognize':
+            if self.students is None:
+                self.setup_recognition()
+            # Picks up a retrained model without restarting the camera
+            recognizer = recognizer_model.get()
+            if recognizer_model.version != self.model_version:
+                self.model_version = recognizer_model.version
+                self.tracker.forget_predictions()
+
+        # LBPH prediction only runs for new faces, or ones whose appearance or confidence changed
+        predict = None
+        if recognizer and self.students is not None:
+            predict = lambda roi: recognizer.predict(face_archive.normalize(roi))
+        tracks = self.tracker.update(gray, predict)
+        faces = [track.box for track in tracks]
         
         # Draw rectangles around faces
         for (x, y, w, h) in faces:
@@ -183,74 +147,42 @@ class CameraStream:
             cv2.putText(frame, "Click 'Start Capture' to begin", (10, 90),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
             
-            if capturing and len(faces) == 1 and image_count < 50:
-                # Save face image
+            # Space captures out by 0.2s without holding up the live feed
+            if capturing and len(faces) == 1 and image_count < 50 and time.time() - self.last_capture >= 0.2:
+                self.last_capture = time.time()
+                # Keep the face sample; all 50 are archived together
                 for (x, y, w, h) in faces:
-                    face_img = gray[y:y+h, x:x+w]
-                    data_folder = "Training_Data/"
-                    assure_path_exists(data_folder)
-                    filename = f"{data_folder}{student_info['name']}.{student_info['id']}.{image_count+1}.jpg"
+                    captured_faces.append(face_archive.normalize(gray[y:y+h, x:x+w]))
                     image_count += 1
-                    cv2.imwrite(filename, face_img)
-                    time.sleep(0.2)  # Small delay between captures
-                    
+                status_board.invalidate()
+
                 if image_count >= 50:
-                    save_student_to_csv(student_info['name'], student_info['id'])
+                    face_samples.add(student_info['id'], student_info['name'], captured_faces)
+                    captured_faces.clear()
+                    save_student(student_info['name'], student_info['id'])
                     capturing = False
                     # Auto-stop camera
-                    global camera_active, camera
-                    camera_active = False
-                    if camera:
-                        del camera
-                        camera = None
+                    stop_camera_pipeline()
                     
         elif capture_mode == 'recognize':
             # Recognition mode
-            if self.recognizer is None:
-                self.setup_recognition()
-            
-            if self.recognizer and self.students_df is not None:
-                for (x, y, w, h) in faces:
-                    roi_gray = gray[y:y+h, x:x+w]
-                    serial, conf = self.recognizer.predict(roi_gray)
+            if predict is not None:
+                for track in tracks:
+                    (x, y, w, h), serial, conf = track.box, track.label, track.confidence
 
                     if conf < 50:
-                        student_row = self.students_df[self.students_df['ID'] == serial]
-                        if not student_row.empty:
-                            name = student_row['Name'].iloc[0]
+                        name = self.students.get(serial)
+                        if name is not None:
                             student_id = str(serial)
 
                             # Auto-mark attendance if not already marked today
-                            date = datetime.now().strftime("%Y-%m-%d")
-                            time_str = datetime.now().strftime("%H:%M:%S")
-                            status_file = f"Student_Status/Status_for_{date}.csv"
-                            status_image_folder = f"Status_Images/{date}/"
-                            assure_path_exists(status_image_folder)
-
-                            existing_ids = []
-
-                            if os.path.isfile(status_file):
-                                with open(status_file, 'r') as csvFile:
-                                    reader = csv.reader(csvFile)
-                                    for row in reader:
-                                        if len(row) > 0:
-                                            existing_ids.append(row[0])
-
-                            if student_id not in existing_ids:
-                                assure_path_exists("Student_Status/")
-                                if not os.path.isfile(status_file):
-                                    with open(status_file, 'w', newline='') as csvFile:
-                                        writer = csv.writer(csvFile)
-                                        writer.writerow(['Id', 'Name', 'Date', 'In Time', 'Out Time'])
-
-                                with open(status_file, 'a', newline='') as csvFile:
-                                    writer = csv.writer(csvFile)
-                                    writer.writerow([student_id, name, date, time_str, ''])
-
+                            # (an in-memory lookup; the ledger appends to the day's CSV)
+                            if attendance_ledger.mark(student_id, name):
+                                status_board.invalidate()
                                 #gray[y:y + h, x:x + w] = cropped image
                                 #frame = full image
                                 #gray = full gray image
-                                cv2.imwrite(f"{status_image_folder}{student_id}.{name}.jpg", frame)
+                                cv2.imwrite(f"{attendance_ledger.image_folder()}{student_id}.{name}.jpg", frame)
 
                                 # Set recognition message
                                 global recognized_student_message
@@ -271,39 +203,45 @@ class CameraStream:
             
             cv2.putText(frame, "Face Recognition Active", (10, 30),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        
-        # Encode frame as JPEG
-        ret, buffer = cv2.imencode('.jpg', frame)
-        if ret:
-            return buffer.tobytes()
-        return None
+
+        # JPEG encoding happens once per frame in the pipeline's encoder thread
+        return frame
     
     def setup_recognition(self):
         """Setup face recognition"""
         try:
-            if os.path.isfile("TrainingImageLabel/Trainner.yml"):
-                self.recognizer = cv2.face.LBPHFaceRecognizer_create()
-                self.recognizer.read("TrainingImageLabel/Trainner.yml")
-                
-                if os.path.isfile("Student_Details/students.csv"):
-                    self.students_df = pd.read_csv("Student_Details/students.csv")
+            if recognizer_model.get() is not None:
+                self.students = student_lookup
         except Exception as e:
             print(f"Error setting up recognition: {e}")
 
+camera_lock = threading.Lock()
+
+def start_camera_pipeline():
+    """Starts the shared capture/processing/encoding threads unless they are already running."""
+    global camera, camera_active
+    with camera_lock:
+        camera_active = True
+        if camera is None or not camera.running:
+            stream = CameraStream()
+            camera = FramePipeline(stream, stream.process).start()
+    status_board.invalidate()
+    return camera
+
+def stop_camera_pipeline():
+    """Stops the camera threads; also called from the processing thread when enrollment completes."""
+    global camera, camera_active
+    with camera_lock:
+        camera_active = False
+        pipeline, camera = camera, None
+    if pipeline:
+        pipeline.stop()
+    status_board.invalidate()
+
 def generate_frames():
-    """Generate camera frames"""
-    global camera
-    
-    while camera_active:
-        if camera is None:
-            camera = CameraStream()
-        
-        frame = camera.get_frame()
-        if frame is not None:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-        else:
-            break
+    """Generate camera frames: every client reads the same encoded frames"""
+    pipeline = camera if camera is not None and camera.running else start_camera_pipeline()
+    yield from pipeline.frames()
 
 # Initialize directories
 assure_path_exists("Training_Data/")
@@ -311,6 +249,46 @@ assure_path_exists("TrainingImageLabel/")
 assure_path_exists("Student_Details/")
 assure_path_exists("Student_Status/")
 
+# Enrolled students' face samples, one packed array per student
+face_samples = face_archive.FaceArchive("Face_Samples")
+
+# Students and attendance live in SQLite; the CSV files are imported on first start
+attendance_store = AttendanceStore("attendance.sqlite3")
+attendance_store.migrate_from_csv("Student_Details/students.csv", "Student_Status")
+
+# ID -> name table for recognition, built from the store and rebuilt when its students change
+student_lookup = StudentLookup(attendance_store)
+
+# Today's attendance, loaded once and written to the store (and Student_Status/) in the background
+attendance_ledger = AttendanceLedger("Student_Status", "Status_Images", store=attendance_store)
+
+def build_status():
+    """The /api/status payload; rebuilt by status_board only after a change"""
+    return {
+        'status': get_system_status(),
+        'attendance': get_today_attendance(),
+        'camera_active': camera_active,
+        'capture_mode': capture_mode,
+        'image_count': image_count,
+        'capturing': capturing,
+        'pipeline': dict(camera.status(), detector=dict(camera.source.tracker.counts)) if camera is not None else None,
+        'training': training_jobs.status(),
+    }
+
+# Enrollment, training, camera and attendance events call status_board.invalidate()
+status_board = StatusBoard(build_status, live=lambda: camera is not None and camera.running)
+
+# The trained model, shared by the camera streams and reloaded when Trainner.yml is replaced
+recognizer_model = face_training.LiveRecognizer("TrainingImageLabel/Trainner.yml")
+
+def training_finished(job):
+    """Swap the new model into running recognizers as soon as a training job succeeds"""
+    if job['state'] == 'done':
+        recognizer_model.reload()
+
+# Training runs in a child process; progress updates refresh /api/status
+training_jobs = TrainingJobs(on_change=status_board.invalidate, on_finish=training_finished)
+
 @app.route('/')
 def index():
     """Main dashboard page"""
@@ -323,7 +301,8 @@ def index():
                          attendance=attendance,
                          current_time=current_time,
                          camera_active=camera_active,
-                         capture_mode=capture_mode)
+                         capture_mode=capture_mode,
+                         training=training_jobs.status())
 
 @app.route('/start_camera/<mode>')
 def start_camera(mode):
@@ -331,10 +310,11 @@ def start_camera(mode):
     global camera_active, capture_mode, image_count, capturing
     
     if mode in ['enroll', 'recognize']:
-        camera_active = True
         capture_mode = mode
         image_count = 0
+        captured_faces.clear()
         capturing = False
+        start_camera_pipeline()
         flash(f'Camera started for {mode}', 'success')
     else:
         flash('Invalid camera mode', 'error')
@@ -360,13 +340,8 @@ def get_recognition_message():
 @app.route('/stop_camera')
 def stop_camera():
     """Stop camera"""
-    global camera_active, camera
-    
-    camera_active = False
-    if camera:
-        del camera
-        camera = None
-    
+    stop_camera_pipeline()
+
     flash('Camera stopped', 'info')
     return redirect(url_for('index'))
 
@@ -390,20 +365,21 @@ def enroll_student():
         flash('Please fill in all fields', 'error')
         return redirect(url_for('index'))
 
+    # IDs become the recognizer's integer labels
+    if not student_id.isdigit():
+        flash('Student ID must be a number', 'error')
+        return redirect(url_for('index'))
+
     # Check if student ID already exists
-    if os.path.isfile("Student_Details/students.csv"):
-        try:
-            df = pd.read_csv("Student_Details/students.csv")
-            if int(student_id) in df['ID'].values:
-                flash(f'Student ID {student_id} already exists!', 'error')
-                return redirect(url_for('index'))
-        except:
-            pass
+    if attendance_store.student_exists(student_id):
+        flash(f'Student ID {student_id} already exists!', 'error')
+        return redirect(url_for('index'))
 
     student_info = {'name': name, 'id': student_id}
-    camera_active = True
     capture_mode = 'enroll'
     image_count = 0
+    captured_faces.clear()
+    start_camera_pipeline()
 
     flash(f'Enrollment started for {name} (ID: {student_id})', 'success')
     return redirect(url_for('index'))
@@ -413,6 +389,8 @@ def start_capture():
     global capturing, image_count
     capturing = True
     image_count = 0
+    captured_faces.clear()
+    status_board.invalidate()
     return jsonify({'status': 'started'})
 
 @app.route('/recognize', methods=['POST'])
@@ -424,54 +402,98 @@ def recognize_student():
         flash('Model not trained. Please train the model first.', 'error')
         return redirect(url_for('index'))
     
-    camera_active = True
     capture_mode = 'recognize'
-    
+    start_camera_pipeline()
+
     flash('Face recognition started', 'success')
     return redirect(url_for('index'))
 
 @app.route('/train', methods=['POST'])
 def train_model():
     """Handle model training"""
-    # Check if there are training images
-    training_files = []
-    if os.path.exists("Training_Data/"):
-        training_files = [f for f in os.listdir("Training_Data/") if f.endswith(('.jpg', '.png'))]
-    
-    if len(training_files) < 10:
+    # Check if there are training images (archived samples, or JPEGs still to import)
+    if face_samples.training_sample_count() < 10:
         flash('Please capture at least 10 images before training', 'warning')
         return redirect(url_for('index'))
     
     try:
-        success, message = train_face_recognition_model()
-        
-        if success:
-            flash(message, 'success')
+        job, started = training_jobs.start()
+        if started:
+            flash('Training started. Progress is shown below; recognition switches to the new model when it finishes.', 'success')
         else:
-            flash(f'Training error: {message}', 'error')
+            flash(f"Training is already running ({job['message']})", 'info')
             
     except Exception as e:
         flash(f'Failed to start training: {str(e)}', 'error')
     
     return redirect(url_for('index'))
 
+@app.route('/api/train', methods=['GET', 'POST'])
+def api_train():
+    """
+    GET: the running (or last) training job: state, images loaded / total and elapsed
+    seconds. POST: starts a job (?full=1 to retrain from scratch) unless one is running.
+    """
+    if request.method == 'POST':
+        job, started = training_jobs.start(full=request.args.get('full') == '1')
+        return jsonify({'started': started, 'job': job}), 202 if started else 409
+    return jsonify({'job': training_jobs.status()})
+
 @app.route('/api/status')
 def api_status():
-    """API endpoint for system status"""
-    global image_count, capturing
-    
-    status = get_system_status()
-    attendance = get_today_attendance()
-    
-    return jsonify({
-        'status': status,
-        'attendance': attendance,
-        'camera_active': camera_active,
-        'capture_mode': capture_mode,
-        'image_count': image_count,
-        'capturing': capturing,
-        'timestamp': datetime.now().isoformat()
-    })
+    """
+    API endpoint for system status, served from the cached payload. Answers 304 when
+    If-None-Match matches; with ?wait=<seconds> it long-polls until the status changes.
+    """
+    client_etag = request.headers.get('If-None-Match')
+    wait = request.args.get('wait', type=float)
+    if wait and client_etag:
+        etag, body = status_board.wait_for_change(client_etag, min(wait, 60))
+    else:
+        etag, body = status_board.current()
+
+    if etag == client_etag:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.headers['ETag'] = etag
+    # Let browsers keep the body but revalidate it on every poll
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/status/stream')
+def api_status_stream():
+    """Server-sent events: the status payload on connect and after every change"""
+    def events():
+        etag = None
+        while True:
+            new_etag, body = status_board.wait_for_change(etag, 15)
+            if new_etag == etag:
+                yield ': keep-alive\n\n'
+                continue
+            etag = new_etag
+            yield f'data: {body}\n\n'
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/export/attendance.csv')
+def export_attendance():
+    """A day's attendance (default: today) as CSV, in the Student_Status file format"""
+    date = request.args.get('date') or datetime.now().strftime("%Y-%m-%d")
+    try:
+        datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
+    return Response(records_to_csv(attendance_store.attendance(date), ['Id', 'Name', 'Date', 'In Time', 'Out Time']),
+                    mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename=Status_for_{date}.csv'})
+
+@app.route('/export/students.csv')
+def export_students():
+    """Enrolled students as CSV, in the students.csv format"""
+    return Response(records_to_csv(attendance_store.students(), ["ID", "Name", "Enrollment Date", "Enrollment Time"]),
+                    mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=students.csv'})
 
 @app.route('/attendance')
 def attendance_page():
@@ -0,0 +1,167 @@
+"""
+In-memory attendance ledger for the current day.
+
+The day's records are read once (from the AttendanceStore, or from
+Student_Status/Status_for_<date>.csv without one) into a dict keyed by student ID, so
+checking and marking a recognized face is a dict lookup no matter how many students
+are already marked (an ID it doesn't know yet is also looked up in the store once, so
+marks written by other processes are not repeated). New marks go through a buffered writer: rows are queued in memory
+and written by a background thread every flush_interval seconds, or sooner once
+flush_rows rows are waiting, in one store transaction plus an (fsync'ed) append to the
+day's CSV, which is kept up to date for tools that read it. The ledger switches to
+the next day at midnight.
+"""
+import os
+import csv
+import atexit
+import threading
+from datetime import datetime
+
+COLUMNS = ['Id', 'Name', 'Date', 'In Time', 'Out Time']
+
+
+class AttendanceLedger:
+    def __init__(self, status_dir="Student_Status", image_dir="Status_Images", store=None, flush_interval=1.0, flush_rows=50):
+        self.status_dir = status_dir
+        self.store = store
+        self.image_dir = image_dir
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._date = None
+        self._records = {}
+        self._pending = []  # (status file, row) waiting to be written
+        self._file = None
+        self._file_path = None
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        os.makedirs(status_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._flush_loop, name="attendance-ledger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def status_file(self, date):
+        return os.path.join(self.status_dir, f"Status_for_{date}.csv")
+
+    def _roll_over(self, now):
+        """Switches to now's date if needed, loading that day's records once (call with _lock held)."""
+        date = now.strftime("%Y-%m-%d")
+        if date == self._date:
+            return
+        records = {}
+        path = self.status_file(date)
+        if self.store is not None:
+            for row in self.store.attendance(date):
+                records.setdefault(row['Id'], row)
+        elif os.path.isfile(path):
+            with open(path, 'r', newline='') as f:
+                for row in csv.DictReader(f):
+                    if row.get('Id'):
+                        records.setdefault(row['Id'], row)
+        os.makedirs(os.path.join(self.image_dir, date), exist_ok=True)
+        self._date, self._records = date, records
+
+    def image_folder(self, now=None):
+        """Folder for today's attendance snapshots (created once per day)."""
+        with self._lock:
+            self._roll_over(now or datetime.now())
+            return os.path.join(self.image_dir, self._date) + os.sep
+
+    def _known(self, student_id):
+        """
+        Whether the student is marked today (call with _lock held). IDs the ledger hasn't
+        seen are looked up in the store once, which picks up marks written by another
+        process (the command line tools or a batch run) since the day was loaded.
+        """
+        if student_id in self._records:
+            return True
+        if self.store is not None:
+            row = self.store.attendance_record(self._date, student_id)
+            if row is not None:
+                self._records[student_id] = row
+                return True
+        return False
+
+    def is_marked(self, student_id, now=None):
+        with self._lock:
+            self._roll_over(now or datetime.now())
+            return self._known(str(student_id))
+
+    def mark(self, student_id, name, now=None):
+        """Marks a student present for today. Returns False if they were already marked."""
+        now = now or datetime.now()
+        student_id = str(student_id)
+        with self._lock:
+            self._roll_over(now)
+            if self._known(student_id):
+                return False
+            row = {'Id': student_id, 'Name': name, 'Date': self._date, 'In Time': now.strftime("%H:%M:%S"), 'Out Time': ''}
+            self._records[student_id] = row
+            self._pending.append((self.status_file(self._date), row))
+            if len(self._pending) >= self.flush_rows:
+                self._wake.set()
+        return True
+
+    def records(self, now=None):
+        """Today's attendance records in marking order, including ones not yet flushed."""
+        with self._lock:
+            self._roll_over(now or datetime.now())
+            return [dict(row) for row in self._records.values()]
+
+    def flush(self):
+        """
+        Writes queued rows to the store and appends them to their day's CSV. Rows stay
+        queued until they are written, so a failed flush is retried by the next one.
+        """
+        with self._write_lock:
+            with self._lock:
+                pending = self._pending[:]
+            written = 0
+            try:
+                # INSERT OR IGNORE: rewriting rows after a failed CSV append is harmless
+                if pending and self.store is not None:
+                    self.store.mark_many([row for _, row in pending])
+                for path, row in pending:
+                    if path != self._file_path:
+                        self._open(path)
+                    csv.DictWriter(self._file, fieldnames=COLUMNS, extrasaction='ignore').writerow(row)
+                    written += 1
+                if pending:
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+            finally:
+                # New marks are only appended, so the written rows are still the front of the queue
+                with self._lock:
+                    del self._pending[:written]
+
+    def _open(self, path):
+        if self._file:
+            self._file.close()
+        new_file = not os.path.isfile(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', newline='')
+        self._file_path = path
+        if new_file:
+            csv.writer(self._file).writerow(COLUMNS)
+
+    def _flush_loop(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                # Roll over at midnight even if nobody is marked after it
+                with self._lock:
+                    self._roll_over(datetime.now())
+            except Exception as e:
+                print(f"Error writing attendance: {e}")
+
+    def close(self):
+        """Flushes queued rows and closes the day's file."""
+        self._stopped.set()
+        self._wake.set()
+        self.flush()
+        with self._write_lock:
+            if self._file:
+                self._file.close()
+                self._file, self._file_path = None, None
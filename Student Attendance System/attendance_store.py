@@ -0,0 +1,230 @@
+"""
+SQLite storage for the student registry and attendance events.
+
+students and attendance are indexed tables (primary keys on the student ID and on
+(date, student ID)), so duplicate-ID checks, the enrolled-student count and a day's
+attendance are index lookups instead of re-parsing CSV files on every dashboard hit.
+The student count, and a version bumped on every change to the students table, are
+kept in meta rows by triggers, so reading them doesn't scan the table. The database runs in WAL mode, so the dashboard can read while the camera
+thread writes. All queries are parameterized (sqlite3 caches their prepared statements
+per connection), and each thread uses its own connection.
+
+The existing CSV files are imported once (migrate_from_csv), and students.csv / the
+per-day status CSVs can be exported again for tools that still read them.
+
+Usage:
+    python attendance_store.py migrate
+    python attendance_store.py export --date 2024-05-01 --out attendance.csv
+    python attendance_store.py export-students --out students.csv
+"""
+import os
+import csv
+import glob
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+DB_PATH = "attendance.sqlite3"
+STUDENT_COLUMNS = ["ID", "Name", "Enrollment Date", "Enrollment Time"]
+ATTENDANCE_COLUMNS = ['Id', 'Name', 'Date', 'In Time', 'Out Time']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    enrolled_date TEXT NOT NULL,
+    enrolled_time TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attendance (
+    date TEXT NOT NULL,
+    student_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    in_time TEXT NOT NULL,
+    out_time TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (date, student_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('student_count', 0);
+CREATE TRIGGER IF NOT EXISTS students_count_insert AFTER INSERT ON students
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'student_count';
+END;
+CREATE TRIGGER IF NOT EXISTS students_count_delete AFTER DELETE ON students
+BEGIN
+    UPDATE meta SET value = value - 1 WHERE key = 'student_count';
+END;
+INSERT OR IGNORE INTO meta (key, value) VALUES ('students_version', 0);
+CREATE TRIGGER IF NOT EXISTS students_version_insert AFTER INSERT ON students
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'students_version';
+END;
+CREATE TRIGGER IF NOT EXISTS students_version_update AFTER UPDATE ON students
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'students_version';
+END;
+CREATE TRIGGER IF NOT EXISTS students_version_delete AFTER DELETE ON students
+BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'students_version';
+END;
+"""
+
+
+class AttendanceStore:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self):
+        """This thread's connection (sqlite3 connections can't be shared between threads)."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, cached_statements=64)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _transaction(self, statements):
+        """Runs (sql, parameters) pairs in one write transaction; returns the total changed rows."""
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            changed = 0
+            for sql, parameters in statements:
+                changed += db.executemany(sql, parameters).rowcount
+            db.execute("COMMIT")
+            return changed
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    # --- Students ---
+
+    def add_student(self, student_id, name, now=None):
+        """Registers a student. Returns False if the ID is already taken."""
+        now = now or datetime.now()
+        return self._transaction([(
+            "INSERT OR IGNORE INTO students (id, name, enrolled_date, enrolled_time) VALUES (?, ?, ?, ?)",
+            [(int(student_id), name, now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"))],
+        )]) == 1
+
+    def student_exists(self, student_id):
+        row = self._connect().execute("SELECT 1 FROM students WHERE id = ?", (int(student_id),)).fetchone()
+        return row is not None
+
+    def student_count(self):
+        return self._connect().execute("SELECT value FROM meta WHERE key = 'student_count'").fetchone()[0]
+
+    def students_version(self):
+        """Changes whenever a student is added, renamed or removed (by any process)."""
+        return self._connect().execute("SELECT value FROM meta WHERE key = 'students_version'").fetchone()[0]
+
+    def student_names(self):
+        """ID -> name of every enrolled student."""
+        return dict(self._connect().execute("SELECT id, name FROM students"))
+
+    def students(self):
+        """Enrolled students in students.csv format."""
+        rows = self._connect().execute("SELECT id, name, enrolled_date, enrolled_time FROM students ORDER BY rowid")
+        return [dict(zip(STUDENT_COLUMNS, row)) for row in rows]
+
+    # --- Attendance ---
+
+    def attendance(self, date):
+        """A day's attendance in marking order, in the status CSV's format."""
+        rows = self._connect().execute(
+            "SELECT student_id, name, date, in_time, out_time FROM attendance WHERE date = ? ORDER BY in_time",
+            (date,),
+        )
+        return [dict(zip(ATTENDANCE_COLUMNS, row)) for row in rows]
+
+    def attendance_record(self, date, student_id):
+        """One student's attendance row for a day (status CSV format), or None if they aren't marked."""
+        row = self._connect().execute(
+            "SELECT student_id, name, date, in_time, out_time FROM attendance WHERE date = ? AND student_id = ?",
+            (date, str(student_id)),
+        ).fetchone()
+        return dict(zip(ATTENDANCE_COLUMNS, row)) if row else None
+
+    def mark_many(self, records):
+        """Inserts attendance rows (status CSV format) in one transaction, keeping the first mark per day."""
+        return self._transaction([(
+            "INSERT OR IGNORE INTO attendance (date, student_id, name, in_time, out_time) VALUES (?, ?, ?, ?, ?)",
+            [(r['Date'], str(r['Id']), r['Name'], r['In Time'], r.get('Out Time') or '') for r in records],
+        )])
+
+    # --- CSV migration and export ---
+
+    def migrate_from_csv(self, students_csv="Student_Details/students.csv", status_dir="Student_Status"):
+        """Imports the CSV files once; later calls do nothing. Returns (students, attendance rows) imported."""
+        db = self._connect()
+        if db.execute("SELECT 1 FROM meta WHERE key = 'csv_migrated'").fetchone():
+            return 0, 0
+
+        students = []
+        if os.path.isfile(students_csv):
+            with open(students_csv, newline='') as f:
+                for row in csv.DictReader(f):
+                    try:
+                        students.append((int(row["ID"]), row["Name"], row.get("Enrollment Date") or "", row.get("Enrollment Time") or ""))
+                    except (KeyError, TypeError, ValueError):
+                        print(f"Skipping student row with invalid ID: {row}")
+
+        records = []
+        for path in sorted(glob.glob(os.path.join(status_dir, "Status_for_*.csv"))):
+            date = os.path.basename(path)[len("Status_for_"):-len(".csv")]
+            with open(path, newline='') as f:
+                for row in csv.DictReader(f):
+                    if row.get('Id'):
+                        records.append((row.get('Date') or date, row['Id'], row.get('Name') or '',
+                                        row.get('In Time') or '', row.get('Out Time') or ''))
+
+        self._transaction([
+            ("INSERT OR IGNORE INTO students (id, name, enrolled_date, enrolled_time) VALUES (?, ?, ?, ?)", students),
+            ("INSERT OR IGNORE INTO attendance (date, student_id, name, in_time, out_time) VALUES (?, ?, ?, ?, ?)", records),
+            ("INSERT OR IGNORE INTO meta (key, value) VALUES ('csv_migrated', 1)", [()]),
+        ])
+        print(f"Imported {len(students)} students and {len(records)} attendance rows from CSV")
+        return len(students), len(records)
+
+    def export_students_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=STUDENT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.students())
+
+    def export_attendance_csv(self, date, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=ATTENDANCE_COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.attendance(date))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate or export attendance data')
+    parser.add_argument('command', choices=['migrate', 'export', 'export-students'])
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--date', default=datetime.now().strftime("%Y-%m-%d"), help='Day to export (default: today)')
+    parser.add_argument('--out', help='Output CSV file')
+    args = parser.parse_args()
+
+    store = AttendanceStore(args.db)
+    if args.command == 'migrate':
+        store.migrate_from_csv()
+    elif args.command == 'export':
+        out = args.out or f"Status_for_{args.date}.csv"
+        store.export_attendance_csv(args.date, out)
+        print(f"Exported attendance for {args.date} to {out}")
+    else:
+        out = args.out or "students.csv"
+        store.export_students_csv(out)
+        print(f"Exported students to {out}")
+
+
+if __name__ == "__main__":
+    main()
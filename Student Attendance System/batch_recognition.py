@@ -0,0 +1,175 @@
+"""
+Offline attendance from a recorded classroom video or a folder of snapshots.
+
+One thread decodes frames (every `every`-th frame of a video, or each image of a
+folder) into a bounded queue; a pool of worker threads runs downscaled face detection
+and LBPH recognition on them (OpenCV releases the GIL, so the workers use all cores;
+each has its own cascade, the trained model is shared read-only). Sightings are
+deduplicated per student, keeping the most confident one, and everyone found is marked
+in one bulk write through the AttendanceLedger (one store transaction plus one append
+to the day's CSV) once the whole source has been processed.
+"""
+import os
+import time
+import queue
+import threading
+from datetime import datetime
+
+import cv2
+
+from face_archive import normalize, IMAGE_EXTENSIONS
+from student_lookup import StudentLookup
+from attendance_store import AttendanceStore
+from attendance_ledger import AttendanceLedger
+
+CASCADE = "haarcascade_frontalface_default.xml"
+MODEL_PATH = "TrainingImageLabel/Trainner.yml"
+
+
+def read_frames(source, every=1):
+    """Yields (frame number, grayscale frame) from a video file or a folder of images."""
+    if os.path.isdir(source):
+        names = sorted(name for name in os.listdir(source) if name.lower().endswith(IMAGE_EXTENSIONS + ('.jpeg',)))
+        for number, name in enumerate(names):
+            gray = cv2.imread(os.path.join(source, name), cv2.IMREAD_GRAYSCALE)
+            if gray is not None:
+                yield number, gray
+        return
+    video = cv2.VideoCapture(source)
+    if not video.isOpened():
+        raise Exception(f"Could not open video {source}")
+    try:
+        number = 0
+        while True:
+            # grab() skips decoding the frames that aren't processed
+            if not video.grab():
+                break
+            if number % every == 0:
+                ok, frame = video.retrieve()
+                if ok:
+                    yield number, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            number += 1
+    finally:
+        video.release()
+
+
+class BatchRecognizer:
+    def __init__(self, model_path=MODEL_PATH, cascade_path=CASCADE, db_path="attendance.sqlite3",
+                 workers=None, detect_scale=0.5, min_face=60, confident=50):
+        if not os.path.isfile(model_path):
+            raise Exception("Model Missing... Please train the model first.")
+        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
+        self.recognizer.read(model_path)
+        self.cascade_path = cascade_path if os.path.isfile(cascade_path) else cv2.data.haarcascades + CASCADE
+        store = AttendanceStore(db_path)
+        store.migrate_from_csv()
+        self.students = StudentLookup(store)
+        self.workers = workers or os.cpu_count() or 1
+        self.detect_scale = detect_scale
+        self.min_face = min_face
+        self.confident = confident
+
+    def _worker(self, frames, found, counts, lock):
+        cascade = cv2.CascadeClassifier(self.cascade_path)
+        min_size = max(1, int(self.min_face * self.detect_scale))
+        while True:
+            item = frames.get()
+            if item is None:
+                return
+            number, gray = item
+            faces, sightings = [], []
+            try:
+                small = cv2.resize(gray, None, fx=self.detect_scale, fy=self.detect_scale, interpolation=cv2.INTER_AREA)
+                faces = cascade.detectMultiScale(small, 1.2, 5, minSize=(min_size, min_size))
+                for box in faces:
+                    x, y, w, h = (int(round(v / self.detect_scale)) for v in box)
+                    face = gray[y:y + h, x:x + w]
+                    serial, conf = self.recognizer.predict(normalize(face))
+                    if conf < self.confident and self.students.get(serial) is not None:
+                        sightings.append((serial, conf, face))
+            except Exception as e:
+                print(f"Error processing frame {number}: {e}")
+            with lock:
+                counts['frames'] += 1
+                counts['faces'] += len(faces)
+                for serial, conf, face in sightings:
+                    best = found.get(serial)
+                    if best is None:
+                        found[serial] = {'sightings': 1, 'confidence': conf, 'frame': number, 'first_frame': number, 'face': face.copy()}
+                    else:
+                        best['sightings'] += 1
+                        best['first_frame'] = min(best['first_frame'], number)
+                        if conf < best['confidence']:
+                            best.update(confidence=conf, frame=number, face=face.copy())
+
+    def run(self, source, every=1, progress=None):
+        """
+        Recognizes the students in a video file or image folder. Returns a report with the
+        frames processed, elapsed time, frames per second and {student ID: best sighting}.
+        """
+        frames = queue.Queue(maxsize=self.workers * 4)
+        found, counts, lock = {}, {'frames': 0, 'faces': 0}, threading.Lock()
+        error = []
+
+        def decode():
+            try:
+                for item in read_frames(source, every):
+                    frames.put(item)
+            except Exception as e:
+                error.append(e)
+            finally:
+                for _ in range(self.workers):
+                    frames.put(None)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=decode, name="batch-decode", daemon=True)]
+        threads += [threading.Thread(target=self._worker, args=(frames, found, counts, lock), name=f"batch-worker-{n}",
+                                     daemon=True) for n in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1.0)
+                if progress:
+                    progress(counts['frames'])
+        if error:
+            raise error[0]
+
+        seconds = time.perf_counter() - start
+        return {
+            'source': source,
+            'frames': counts['frames'],
+            'faces': counts['faces'],
+            'seconds': round(seconds, 3),
+            'fps': round(counts['frames'] / seconds, 1) if seconds else 0.0,
+            'workers': self.workers,
+            'students': {serial: dict(entry, name=self.students.get(serial)) for serial, entry in found.items()},
+        }
+
+
+def mark_found(report, now=None, db_path="attendance.sqlite3", status_dir="Student_Status", image_dir="Status_Images"):
+    """
+    Marks every student in a run() report present in one bulk write, and saves their best
+    face crop as the status image. Returns (newly marked, already marked) student IDs.
+    Each student is looked up in the store right before being queued (see
+    AttendanceLedger.mark), so marks the app or the command line tools wrote while the
+    source was being processed aren't repeated.
+    """
+    now = now or datetime.now()
+    store = AttendanceStore(db_path)
+    store.migrate_from_csv("Student_Details/students.csv", status_dir)
+    # Large thresholds keep the ledger from flushing before the explicit flush below
+    ledger = AttendanceLedger(status_dir, image_dir, store=store, flush_interval=3600, flush_rows=10 ** 9)
+    marked, already = [], []
+    try:
+        folder = ledger.image_folder(now)
+        for serial, entry in sorted(report['students'].items()):
+            (marked if ledger.mark(serial, entry['name'], now) else already).append(serial)
+        # Write the marks right after the check, before the (slower) image writes
+        ledger.flush()
+        for serial in marked:
+            entry = report['students'][serial]
+            cv2.imwrite(f"{folder}{serial}.{entry['name']}.jpg", entry['face'])
+    finally:
+        ledger.close()
+    return marked, already
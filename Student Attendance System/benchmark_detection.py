@@ -0,0 +1,101 @@
+"""
+Benchmark: per-frame face detection cost of the former full-resolution
+detectMultiScale on every frame vs FaceTracker (downscaled detection every
+--redetect-every frames, template tracking in between).
+
+Reads frames from --video (e.g. a classroom recording) or generates synthetic frames of
+--width x --height. With --model, recognized faces are also run through LBPH, which
+shows how many predictions the tracker saves. Synthetic frames contain no faces, so
+they only measure the detection side.
+
+Usage:
+    python benchmark_detection.py --frames 300 --width 1280 --height 720
+    python benchmark_detection.py --video classroom.mp4 --model TrainingImageLabel/Trainner.yml
+"""
+import os
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from face_archive import normalize
+from face_tracker import FaceTracker
+
+CASCADE = "haarcascade_frontalface_default.xml"
+
+
+def load_frames(args):
+    frames = []
+    if args.video:
+        video = cv2.VideoCapture(args.video)
+        while len(frames) < args.frames:
+            ok, frame = video.read()
+            if not ok:
+                break
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+        video.release()
+    else:
+        rng = np.random.default_rng(42)
+        scene = cv2.GaussianBlur(rng.integers(0, 256, (args.height, args.width), dtype=np.uint8), (0, 0), 3)
+        for n in range(args.frames):
+            # A slowly panning scene with a little sensor noise
+            frame = np.roll(scene, n * 2, axis=1)
+            frames.append(cv2.add(frame, rng.integers(0, 8, frame.shape, dtype=np.uint8)))
+    return frames
+
+
+def run_full(frames, cascade, predict):
+    predictions = 0
+    start = time.perf_counter()
+    for gray in frames:
+        for (x, y, w, h) in cascade.detectMultiScale(gray, 1.3, 5):
+            if predict:
+                predict(gray[y:y + h, x:x + w])
+                predictions += 1
+    return time.perf_counter() - start, len(frames), predictions
+
+
+def run_tracker(frames, tracker, predict):
+    start = time.perf_counter()
+    for gray in frames:
+        tracker.update(gray, predict)
+    return time.perf_counter() - start, tracker.counts['detections'], tracker.counts['predictions']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Face detection path benchmark')
+    parser.add_argument('--video', help='Video file to read frames from (default: synthetic frames)')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--detect-scale', type=float, default=0.5)
+    parser.add_argument('--redetect-every', type=int, default=5)
+    parser.add_argument('--model', help='Trained LBPH model, to include recognition')
+    args = parser.parse_args()
+
+    cascade_path = CASCADE if os.path.isfile(CASCADE) else cv2.data.haarcascades + CASCADE
+    frames = load_frames(args)
+    if not frames:
+        raise SystemExit("No frames to process")
+    predict = None
+    if args.model:
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(args.model)
+        predict = lambda roi: recognizer.predict(normalize(roi))
+
+    height, width = frames[0].shape
+    print(f"{len(frames)} frames of {width}x{height}{' from ' + args.video if args.video else ' (synthetic)'}")
+    results = {
+        "full-resolution, every frame": run_full(frames, cv2.CascadeClassifier(cascade_path), predict),
+        f"FaceTracker (x{args.detect_scale}, every {args.redetect_every})": run_tracker(
+            frames, FaceTracker(cascade_path, detect_scale=args.detect_scale, redetect_every=args.redetect_every), predict),
+    }
+    baseline = results["full-resolution, every frame"][0]
+    for name, (seconds, detections, predictions) in results.items():
+        print(f"  {name:32s} {len(frames) / seconds:8.1f} fps  {seconds / len(frames) * 1000:7.2f} ms/frame  "
+              f"{detections:5d} detections  {predictions:5d} predictions  {baseline / seconds:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Microbenchmark: resolving recognized IDs to names with the old per-face pandas
+filters vs the compiled StudentLookup table.
+
+Writes a synthetic students.csv with --students rows to a temporary directory, imports
+it into an AttendanceStore there and resolves --lookups random IDs (including some
+unknown ones) per method.
+
+Usage:
+    python benchmark_lookup.py --students 10000 --lookups 20000
+"""
+import os
+import csv
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+import pandas as pd
+
+from student_lookup import StudentLookup
+from attendance_store import AttendanceStore
+
+
+def write_students(path, count, sparse=False, seed=42):
+    rng = random.Random(seed)
+    ids = rng.sample(range(10 ** 9), count) if sparse else list(range(1, count + 1))
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["ID", "Name", "Enrollment Date", "Enrollment Time"])
+        for student_id in ids:
+            writer.writerow([student_id, f"Student {student_id}", "2024-01-01", "09:00:00"])
+    return ids
+
+
+def time_per_lookup(resolve, ids):
+    start = time.perf_counter()
+    for serial in ids:
+        resolve(serial)
+    return (time.perf_counter() - start) / len(ids) * 1e6
+
+
+def app_filter(df):
+    """What CameraStream did per face: one boolean-mask filter."""
+    def resolve(serial):
+        row = df[df['ID'] == serial]
+        return row['Name'].iloc[0] if not row.empty else None
+    return resolve
+
+
+def cli_filter(df):
+    """What recognize_student.py did per face: two boolean-mask filters."""
+    def resolve(serial):
+        names = df.loc[df['ID'] == serial]['Name'].values
+        ids = df.loc[df['ID'] == serial]['ID'].values
+        return str(names[0]) if len(ids) else None
+    return resolve
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ID -> name lookup microbenchmark')
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--pandas-lookups', type=int, default=2000, help='Lookups for the (slow) pandas filters')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="lookup-bench-")
+    try:
+        for layout in ("dense", "sparse"):
+            path = os.path.join(workdir, f"students_{layout}.csv")
+            ids = write_students(path, args.students, sparse=layout == "sparse")
+            rng = random.Random(7)
+            # One in ten recognized labels isn't enrolled (e.g. a stale model)
+            queries = [rng.choice(ids) if rng.random() < 0.9 else -1 for _ in range(args.lookups)]
+
+            start = time.perf_counter()
+            df = pd.read_csv(path)
+            pandas_load_ms = (time.perf_counter() - start) * 1000
+            store = AttendanceStore(os.path.join(workdir, f"{layout}.sqlite3"))
+            store.migrate_from_csv(path, os.path.join(workdir, "no_status"))
+            start = time.perf_counter()
+            lookup = StudentLookup(store)
+            lookup_load_ms = (time.perf_counter() - start) * 1000
+
+            expected = app_filter(df)
+            assert all(lookup.get(q) == expected(q) for q in queries[:200]), "lookup disagrees with pandas"
+
+            results = {
+                "pandas filter (app.py)": time_per_lookup(app_filter(df), queries[:args.pandas_lookups]),
+                "2x pandas filter (recognize_student.py)": time_per_lookup(cli_filter(df), queries[:args.pandas_lookups]),
+                "StudentLookup.get": time_per_lookup(lookup.get, queries),
+            }
+            print(f"\n{args.students} students, {layout} IDs "
+                  f"(load: pandas {pandas_load_ms:.1f} ms, StudentLookup {lookup_load_ms:.1f} ms)")
+            baseline = results["pandas filter (app.py)"]
+            for name, micros in results.items():
+                print(f"  {name:42s} {micros:10.2f} us/lookup  {baseline / micros:8.1f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: loading training faces from Training_Data/ JPEGs (list the directory,
+parse every file name, decode every image) vs the packed FaceArchive (one memory-
+mapped array per student).
+
+Writes --students x --images synthetic face crops of varying size as name.id.n.jpg
+files to a temporary directory (plus one corrupt JPEG, which the conversion must skip),
+converts them with FaceArchive.convert() and times loading every sample both ways.
+
+Usage:
+    python benchmark_training_data.py --students 1000 --images 50
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from face_archive import FaceArchive
+
+
+def write_jpegs(path, students, images, seed=42):
+    rng = np.random.default_rng(seed)
+    os.makedirs(path)
+    for student_id in range(1, students + 1):
+        size = int(rng.integers(120, 240))
+        base = rng.integers(0, 256, (size, size), dtype=np.uint8)
+        for n in range(1, images + 1):
+            noise = rng.integers(-20, 20, (size, size))
+            face = np.clip(base.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+            cv2.imwrite(os.path.join(path, f"Student{student_id}.{student_id}.{n}.jpg"), face)
+    # A truncated file, like a capture interrupted mid-write
+    with open(os.path.join(path, f"Student1.1.{images + 1}.jpg"), 'wb') as f:
+        f.write(b'\xff\xd8\xff\xe0 not a jpeg')
+
+
+def load_jpegs(path):
+    """What training did before the archive: one listing, name parse and decode per image."""
+    faces, ids = [], []
+    for name in os.listdir(path):
+        if name.endswith('.jpg'):
+            try:
+                faces.append(np.array(Image.open(os.path.join(path, name)).convert('L'), 'uint8'))
+            except OSError:
+                continue
+            ids.append(int(name.split('.')[1]))
+    return faces, ids
+
+
+def load_archive(archive):
+    faces, ids = [], []
+    for student_id in archive.manifest():
+        samples = archive.load(student_id)
+        faces.extend(samples)
+        ids.extend([student_id] * len(samples))
+    return faces, ids
+
+
+def disk_usage(path):
+    files = [entry for entry in os.scandir(path) if entry.is_file()]
+    return len(files), sum(entry.stat().st_size for entry in files)
+
+
+def drop_page_cache(path):
+    # Best effort (Linux): makes the next read come from disk instead of memory
+    for entry in os.scandir(path):
+        if entry.is_file() and hasattr(os, 'posix_fadvise'):
+            fd = os.open(entry.path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Training data load benchmark')
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--images', type=int, default=50, help='Images per student')
+    parser.add_argument('--workers', type=int, default=None, help='Decoding processes for the conversion')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="facedata-bench-")
+    try:
+        jpeg_dir = os.path.join(workdir, "Training_Data")
+        start = time.perf_counter()
+        write_jpegs(jpeg_dir, args.students, args.images)
+        print(f"Wrote {args.students * args.images} JPEGs for {args.students} students in {time.perf_counter() - start:.1f}s")
+
+        archive = FaceArchive(os.path.join(workdir, "Face_Samples"))
+        start = time.perf_counter()
+        archive.convert(jpeg_dir, workers=args.workers)
+        print(f"Converted to the archive in {time.perf_counter() - start:.1f}s (one-off)")
+        assert archive.sample_count() == args.students * args.images, "corrupt image was not skipped"
+
+        results = {}
+        for label, load, path in (("JPEG directory", lambda: load_jpegs(jpeg_dir), jpeg_dir),
+                                  ("FaceArchive", lambda: load_archive(archive), archive.path)):
+            drop_page_cache(path)
+            start = time.perf_counter()
+            faces, ids = load()
+            # Touch every pixel, so memory-mapped samples are actually read
+            sum(int(face.sum()) for face in faces)
+            seconds = time.perf_counter() - start
+            files, size = disk_usage(path)
+            results[label] = seconds
+            print(f"  {label:15s} {len(faces):7d} faces  {seconds:7.2f}s  {seconds / len(faces) * 1e6:8.1f} us/face  "
+                  f"{files:6d} files  {size / 2 ** 20:7.1f} MiB")
+        print(f"  FaceArchive loads {results['JPEG directory'] / results['FaceArchive']:.1f}x faster")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
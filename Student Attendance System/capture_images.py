@@ -3,7 +3,10 @@ import csv
 import cv2
 import argparse
 from datetime import datetime
-from PIL import Image
+
+from face_archive import FaceArchive, normalize
+from face_tracker import FaceTracker
+from attendance_store import AttendanceStore
 
 def assure_path_exists(path):
     """Ensure directory exists, create if it doesn't"""
@@ -11,20 +14,25 @@ def assure_path_exists(path):
         os.makedirs(path)
 
 def capture_student_images(student_name=None, student_id=None):
-    """Capture face images for a new student"""
-    data_folder = "Training_Data/"
-    assure_path_exists(data_folder)
-    
+    """Capture face images for a new student into the face archive"""
     # Get student information if not provided
     if student_name is None:
         student_name = input("Enter student name: ").strip()
     if student_id is None:
         student_id = input("Enter student ID: ").strip()
+    if not str(student_id).isdigit():
+        print("Error: Student ID must be a number")
+        return False
     
-    # Initialize face detector
-    face_cascade = cv2.CascadeClassifier(
-        cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-    )
+    # The web app checks IDs against the store; it imports students.csv only once
+    store = AttendanceStore()
+    store.migrate_from_csv()
+    if store.student_exists(student_id):
+        print(f"Error: Student ID {student_id} already exists")
+        return False
+
+    # Initialize face detector (downscaled detection every few frames, faces tracked in between)
+    tracker = FaceTracker()
     
     # Initialize webcam
     cap = cv2.VideoCapture(0)
@@ -37,6 +45,7 @@ def capture_student_images(student_name=None, student_id=None):
     print("Press 'q' to quit")
     
     image_count = 0
+    samples = []
     capturing = False
     
     while image_count < 50:
@@ -45,7 +54,7 @@ def capture_student_images(student_name=None, student_id=None):
             break
             
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+        faces = [track.box for track in tracker.update(gray)]
         
         # Draw rectangle around faces
         for (x, y, w, h) in faces:
@@ -67,11 +76,9 @@ def capture_student_images(student_name=None, student_id=None):
             break
             
         if capturing and len(faces) == 1:
-            # Save face image
+            # Keep the face sample; all 50 are archived together
             for (x, y, w, h) in faces:
-                face_img = gray[y:y+h, x:x+w]
-                filename = f"{data_folder}{student_name}.{student_id}.{image_count+1}.jpg"
-                cv2.imwrite(filename, face_img)
+                samples.append(normalize(gray[y:y+h, x:x+w]))
                 image_count += 1
     
     cap.release()
@@ -79,6 +86,7 @@ def capture_student_images(student_name=None, student_id=None):
     
     if image_count >= 50:
         print("\nSuccessfully captured 50 images!")
+        FaceArchive().add(student_id, student_name, samples)
         save_to_csv(student_name, student_id)
         return True
     else:
@@ -86,7 +94,9 @@ def capture_student_images(student_name=None, student_id=None):
         return False
 
 def save_to_csv(name, id):
-    """Save student data to CSV file"""
+    """Register the student in the attendance store and save student data to CSV file"""
+    AttendanceStore().add_student(id, name)
+
     student_details = "Student_Details/"
     assure_path_exists(student_details)
     csv_file = os.path.join(student_details, "students.csv")
@@ -0,0 +1,238 @@
+"""
+Packed per-student face sample archive.
+
+Instead of 50 small JPEGs per student, each student's faces are stored as one array
+of normalized (FACE_SIZE x FACE_SIZE grayscale) samples in Face_Samples/<id>.npy, so
+training reads a student with one memory-mapped np.load() and no per-file listing,
+name parsing or decoding. Face_Samples/manifest.json lists the students with their
+name, sample count and a version that changes whenever their samples are replaced.
+
+Legacy Training_Data/name.id.n.jpg images are imported by convert() (decoded in a
+process pool for large batches); a student is re-imported only when their JPEG files
+changed. Run this module to convert a Training_Data directory:
+
+    python face_archive.py convert
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+ARCHIVE_DIR = "Face_Samples"
+TRAINING_DIR = "Training_Data"
+IMAGE_EXTENSIONS = ('.jpg', '.png')
+FACE_SIZE = 100
+
+# Below this many images to decode, a process pool costs more than it saves
+POOL_MIN_IMAGES = 200
+
+
+def normalize(face):
+    """A grayscale face crop resized to the archive's FACE_SIZE x FACE_SIZE (use it before predict() too)."""
+    if face.ndim == 3:
+        face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+    if face.shape != (FACE_SIZE, FACE_SIZE):
+        face = cv2.resize(face, (FACE_SIZE, FACE_SIZE), interpolation=cv2.INTER_AREA)
+    return face
+
+
+def list_training_images(path=TRAINING_DIR):
+    """Groups training images by the student ID in their file name (name.id.n.jpg)."""
+    groups = {}
+    if not os.path.isdir(path):
+        return groups
+    for entry in os.scandir(path):
+        if not entry.name.endswith(IMAGE_EXTENSIONS):
+            continue
+        parts = entry.name.split('.')
+        try:
+            label = int(parts[1]) if len(parts) >= 3 else None
+        except ValueError:
+            label = None
+        if label is None:
+            print(f"Skipping file with invalid format: {entry.name}")
+            continue
+        groups.setdefault(label, []).append(entry)
+    return {label: sorted(entries, key=lambda e: e.name) for label, entries in groups.items()}
+
+
+def _signature(entries):
+    """Digest of the file names, sizes and mtimes a student's samples were imported from."""
+    files = [[e.name, e.stat().st_size, e.stat().st_mtime_ns] for e in entries]
+    return hashlib.sha1(json.dumps(files).encode()).hexdigest()
+
+
+def _pending(groups, manifest):
+    """{student ID: signature} of the grouped images convert() has to (re-)import."""
+    pending = {}
+    for label, entries in groups.items():
+        signature = _signature(entries)
+        if manifest.get(label, {}).get('source') != signature:
+            pending[label] = signature
+    return pending
+
+
+def _decode(path):
+    """Worker: loads one image as a normalized grayscale face, or None if it can't be read."""
+    try:
+        return normalize(np.array(Image.open(path).convert('L'), 'uint8'))
+    except Exception:
+        return None
+
+
+class FaceArchive:
+    def __init__(self, path=ARCHIVE_DIR):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _sample_path(self, student_id):
+        return os.path.join(self.path, f"{int(student_id)}.npy")
+
+    def _manifest_path(self):
+        return os.path.join(self.path, "manifest.json")
+
+    def manifest(self):
+        """{student ID: {'name', 'count', 'version', 'source'}} for every archived student."""
+        try:
+            with open(self._manifest_path()) as f:
+                return {int(student_id): entry for student_id, entry in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest):
+        tmp = f"{self._manifest_path()}.tmp{os.getpid()}"
+        with open(tmp, 'w') as f:
+            json.dump({str(student_id): entry for student_id, entry in sorted(manifest.items())}, f, indent=1)
+        os.replace(tmp, self._manifest_path())
+
+    def sample_count(self):
+        return sum(entry['count'] for entry in self.manifest().values())
+
+    def training_sample_count(self, training_dir=TRAINING_DIR):
+        """
+        Samples training would use: archived ones plus Training_Data images still to be
+        imported, each student counted once (imported JPEGs aren't counted again).
+        """
+        groups = list_training_images(training_dir)
+        manifest = self.manifest()
+        pending = _pending(groups, manifest)
+        archived = sum(entry['count'] for label, entry in manifest.items() if label not in pending)
+        return archived + sum(len(groups[label]) for label in pending)
+
+    def _save_samples(self, student_id, name, faces, source=None):
+        """Writes a student's samples file; returns their manifest entry."""
+        samples = np.stack([normalize(face) for face in faces]).astype(np.uint8)
+        tmp = os.path.join(self.path, f"{int(student_id)}.tmp{os.getpid()}.npy")
+        np.save(tmp, samples)
+        os.replace(tmp, self._sample_path(student_id))
+        return {'name': name, 'count': len(samples), 'version': time.time_ns(), 'source': source}
+
+    def _update_manifest(self, entries):
+        with self._lock:
+            manifest = self.manifest()
+            manifest.update(entries)
+            self._write_manifest(manifest)
+
+    def add(self, student_id, name, faces, source=None):
+        """Stores (replacing) a student's samples; faces are normalized first. Returns the sample count."""
+        entry = self._save_samples(student_id, name, faces, source)
+        self._update_manifest({int(student_id): entry})
+        return entry['count']
+
+    def load(self, student_id, mmap=True):
+        """A student's samples as an (n, FACE_SIZE, FACE_SIZE) uint8 array (memory-mapped by default)."""
+        return np.load(self._sample_path(student_id), mmap_mode='r' if mmap else None)
+
+    def remove(self, student_id):
+        with self._lock:
+            manifest = self.manifest()
+            if manifest.pop(int(student_id), None) is not None:
+                self._write_manifest(manifest)
+        try:
+            os.remove(self._sample_path(student_id))
+        except OSError:
+            pass
+
+    def convert(self, training_dir=TRAINING_DIR, workers=None, progress=None):
+        """
+        Imports Training_Data/name.id.n.jpg images of students that aren't archived, or
+        whose JPEG files changed since they were imported. Returns the number of students
+        imported; progress(decoded, total) is called while decoding. Images that can't be
+        decoded are skipped (and reported), a student with none left isn't imported.
+        """
+        groups = list_training_images(training_dir)
+        pending = _pending(groups, self.manifest())
+        if not pending:
+            return 0
+
+        to_decode = [(label, e.path) for label in sorted(pending) for e in groups[label]]
+        total, done, faces, entries = len(to_decode), 0, [], {}
+        seen, skipped = 0, 0  # images of the current student processed, unreadable images
+        paths = [path for _, path in to_decode]
+
+        def save(label):
+            # Each student is written as soon as their last image is decoded
+            name = groups[label][0].name.split('.')[0]
+            if faces:
+                entries[label] = self._save_samples(label, name, faces, source=pending[label])
+            faces.clear()
+        workers = workers or os.cpu_count() or 1
+        if len(paths) >= POOL_MIN_IMAGES and workers > 1:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            results = pool.map(_decode, paths, chunksize=32)
+        else:
+            pool, results = None, map(_decode, paths)
+        try:
+            for (label, path), face in zip(to_decode, results):
+                if face is None:
+                    print(f"Skipping unreadable image: {path}")
+                    skipped += 1
+                else:
+                    faces.append(face)
+                done += 1
+                seen += 1
+                if seen == len(groups[label]):
+                    save(label)
+                    seen = 0
+                if progress and (done % 50 == 0 or done == total):
+                    progress(done, total)
+        finally:
+            if pool:
+                pool.shutdown()
+            self._update_manifest(entries)
+        if skipped:
+            print(f"Skipped {skipped} unreadable images out of {total}")
+        return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Packed face sample archive')
+    sub = parser.add_subparsers(dest='command', required=True)
+    convert = sub.add_parser('convert', help='Import Training_Data/ JPEGs into the archive')
+    convert.add_argument('--source', default=TRAINING_DIR)
+    convert.add_argument('--archive', default=ARCHIVE_DIR)
+    convert.add_argument('--workers', type=int, default=None)
+    sub.add_parser('list', help='List archived students')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        start = time.perf_counter()
+        archive = FaceArchive(args.archive)
+        count = archive.convert(args.source, workers=args.workers,
+                                progress=lambda done, total: print(f"  decoded {done}/{total} images", end='\r', flush=True))
+        print(f"\nImported {count} students into {args.archive}/ in {time.perf_counter() - start:.2f}s")
+    else:
+        for student_id, entry in FaceArchive().manifest().items():
+            print(f"{student_id}\t{entry['name']}\t{entry['count']} samples")
+
+
+if __name__ == "__main__":
+    main()
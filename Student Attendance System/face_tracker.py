@@ -0,0 +1,188 @@
+"""
+Face detection engine for the live feed and the command line tools.
+
+Running the Haar cascade on every full-resolution frame is the most expensive step per
+frame. FaceTracker runs it on a copy of the frame downscaled by detect_scale, and only
+every redetect_every frames. In between, each face is followed by template matching
+its last detected appearance in a small window around its previous position (on the
+downscaled frame as well). LBPH prediction is only re-run for a track when it is new,
+when its appearance drifted from the face that was last recognized, when its last
+prediction wasn't confident (retried on detection frames), or every repredict_every
+frames as a safety net. A track a detection pass missed is kept for up to max_misses
+passes (and followed in between), but only tracks detected or matched on the current
+frame are returned, so a stale box never counts as a face.
+"""
+import itertools
+
+import cv2
+
+
+class Track:
+    """One face followed across frames; box is (x, y, w, h) in full-resolution pixels."""
+
+    __slots__ = ('id', 'box', 'small_box', 'template', 'label', 'confidence', 'predicted_at', 'reference', 'fresh', 'misses', 'seen')
+
+    def __init__(self, track_id, small_box, template, scale):
+        self.id = track_id
+        self.label = None
+        self.confidence = None
+        self.predicted_at = None  # frame number of the last prediction
+        self.reference = None  # appearance at the last prediction, to detect drift
+        self.fresh = False  # predicted on the current frame
+        self.misses = 0
+        self.seen = True  # detected or matched on the current frame
+        self.move(small_box, scale, template)
+
+    def move(self, small_box, scale, template=None):
+        self.small_box = small_box
+        self.box = tuple(int(round(v / scale)) for v in small_box)
+        if template is not None:
+            self.template = template
+
+
+def _iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / (aw * ah + bw * bh - inter)
+
+
+def _similarity(patch, reference):
+    """Normalized cross-correlation of two patches (resized to the reference's size)."""
+    if patch.shape != reference.shape:
+        patch = cv2.resize(patch, (reference.shape[1], reference.shape[0]), interpolation=cv2.INTER_AREA)
+    return float(cv2.matchTemplate(patch, reference, cv2.TM_CCOEFF_NORMED)[0, 0])
+
+
+class FaceTracker:
+    def __init__(self, cascade_path=None, detect_scale=0.5, redetect_every=5, scale_factor=1.3, min_neighbors=5,
+                 min_face=60, search_margin=0.5, track_threshold=0.5, drift_threshold=0.7, confident=50,
+                 repredict_every=90, max_misses=1):
+        self.face_cascade = cv2.CascadeClassifier(
+            cascade_path or cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        )
+        self.detect_scale = detect_scale
+        self.redetect_every = max(1, redetect_every)
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_face = min_face
+        self.search_margin = search_margin
+        self.track_threshold = track_threshold
+        self.drift_threshold = drift_threshold
+        self.confident = confident
+        self.repredict_every = repredict_every
+        self.max_misses = max_misses
+        self.tracks = []
+        self.frame = 0
+        self.counts = {'frames': 0, 'detections': 0, 'predictions': 0}
+        self._ids = itertools.count(1)
+
+    def reset(self):
+        """Forgets all tracks (e.g. when the camera restarts)."""
+        self.tracks = []
+
+    def forget_predictions(self):
+        """Makes every track be recognized again (e.g. after the model was retrained)."""
+        for track in self.tracks:
+            track.predicted_at = None
+
+    def _detect(self, small):
+        min_size = max(1, int(self.min_face * self.detect_scale))
+        faces = self.face_cascade.detectMultiScale(small, self.scale_factor, self.min_neighbors, minSize=(min_size, min_size))
+        self.counts['detections'] += 1
+        detections = [tuple(int(v) for v in face) for face in faces]
+
+        # Greedily pair detections with the tracks they overlap most
+        pairs = sorted(((_iou(track.small_box, box), i, j) for i, track in enumerate(self.tracks)
+                        for j, box in enumerate(detections)), reverse=True)
+        matched_tracks, matched_boxes = set(), set()
+        for overlap, i, j in pairs:
+            if overlap < 0.3:
+                break
+            if i in matched_tracks or j in matched_boxes:
+                continue
+            matched_tracks.add(i)
+            matched_boxes.add(j)
+            x, y, w, h = detections[j]
+            self.tracks[i].move(detections[j], self.detect_scale, small[y:y + h, x:x + w].copy())
+            self.tracks[i].misses = 0
+            self.tracks[i].seen = True
+
+        tracks = []
+        for i, track in enumerate(self.tracks):
+            if i not in matched_tracks:
+                track.misses += 1
+                track.seen = False
+                if track.misses > self.max_misses:
+                    continue
+            tracks.append(track)
+        for j, (x, y, w, h) in enumerate(detections):
+            if j not in matched_boxes:
+                tracks.append(Track(next(self._ids), (x, y, w, h), small[y:y + h, x:x + w].copy(), self.detect_scale))
+        self.tracks = tracks
+
+    def _follow(self, small):
+        """Moves each track to the best template match near its previous position."""
+        height, width = small.shape[:2]
+        tracks = []
+        for track in self.tracks:
+            x, y, w, h = track.small_box
+            margin = int(max(w, h) * self.search_margin)
+            x0, y0 = max(0, x - margin), max(0, y - margin)
+            x1, y1 = min(width, x + w + margin), min(height, y + h + margin)
+            window = small[y0:y1, x0:x1]
+            if window.shape[0] < h or window.shape[1] < w:
+                continue
+            _, score, _, (dx, dy) = cv2.minMaxLoc(cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED))
+            if score < self.track_threshold:
+                continue  # lost; the next detection picks the face up again
+            track.move((x0 + dx, y0 + dy, w, h), self.detect_scale)
+            track.seen = True
+            tracks.append(track)
+        self.tracks = tracks
+
+    def _needs_prediction(self, track, small, detected):
+        if track.predicted_at is None or self.frame - track.predicted_at >= self.repredict_every:
+            return True
+        if not detected:
+            return False
+        if track.confidence >= self.confident:
+            return True
+        x, y, w, h = track.small_box
+        return _similarity(small[y:y + h, x:x + w], track.reference) < self.drift_threshold
+
+    def update(self, gray, predict=None):
+        """
+        Detects or tracks the faces in a grayscale frame and returns the tracks seen on
+        it. With predict (a function of a full-resolution face crop returning (label,
+        confidence)), tracks that need it are recognized; their label and confidence
+        carry over to the following frames.
+        """
+        self.frame += 1
+        self.counts['frames'] += 1
+        if self.detect_scale != 1:
+            small = cv2.resize(gray, None, fx=self.detect_scale, fy=self.detect_scale, interpolation=cv2.INTER_AREA)
+        else:
+            small = gray
+        detected = self.frame % self.redetect_every == 1 or self.redetect_every == 1
+        if detected:
+            self._detect(small)
+        else:
+            self._follow(small)
+
+        tracks = [track for track in self.tracks if track.seen]
+        for track in tracks:
+            track.fresh = False
+            if predict is not None and self._needs_prediction(track, small, detected):
+                x, y, w, h = track.box
+                track.label, track.confidence = predict(gray[y:y + h, x:x + w])
+                sx, sy, sw, sh = track.small_box
+                track.reference = small[sy:sy + sh, sx:sx + sw].copy()
+                track.predicted_at = self.frame
+                track.fresh = True
+                self.counts['predictions'] += 1
+        return tracks
@@ -0,0 +1,204 @@
+"""
+Incremental LBPH training from the packed face archive.
+
+Training reads each student's normalized faces from the FaceArchive (one memory-mapped
+array per student, see face_archive.py); JPEGs still found in Training_Data/ are
+imported into the archive first. TrainingImageLabel/trained_students.json records
+which students (and which version of their samples) the saved model contains. When
+the only change is new students, the saved model is loaded and
+LBPHFaceRecognizer.update() adds just their samples; if a trained student's samples
+changed or were removed, the model is retrained. The model file is replaced
+atomically, and LiveRecognizer picks up the new file in running processes. Run as a
+script, the module trains once and reports progress as JSON lines (see
+training_jobs.py).
+"""
+import os
+import json
+import time
+import threading
+
+import cv2
+import numpy as np
+
+from face_archive import FaceArchive, TRAINING_DIR
+
+MODEL_PATH = "TrainingImageLabel/Trainner.yml"
+MANIFEST_PATH = "TrainingImageLabel/trained_students.json"
+
+
+def load_faces(archive, labels, progress=None):
+    """Returns {label: (n, h, w) sample array} for the given students, read from the archive."""
+    counts = archive.manifest()
+    total = sum(counts[label]['count'] for label in labels)
+    faces, loaded = {}, 0
+    for label in labels:
+        faces[label] = archive.load(label)
+        loaded += len(faces[label])
+        if progress:
+            progress(loaded, total)
+    return faces
+
+
+def _read_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return {int(label): version for label, version in json.load(f).items()}
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path, write):
+    # Keep the extension: OpenCV picks the file format from it
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.tmp{os.getpid()}{ext}"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def train(workers=None, full=False, progress=None, archive=None):
+    """
+    Trains or updates the LBPH model from the face archive (after importing any new
+    Training_Data/ JPEGs with `workers` decoding processes). Returns a report dict with
+    the mode ("update" or "full"), image and student counts and timings, including the
+    train time per image.
+    """
+    start = time.perf_counter()
+    archive = archive or FaceArchive()
+    archive.convert(TRAINING_DIR, workers=workers, progress=progress)
+    versions = {label: entry['version'] for label, entry in archive.manifest().items()}
+    if not versions:
+        raise Exception("No training images found. Please capture some images first.")
+
+    manifest = _read_manifest() if os.path.isfile(MODEL_PATH) and not full else None
+    # update() can only add samples: any change to an already trained student needs a full retrain
+    incremental = manifest is not None and all(versions.get(label) == version for label, version in manifest.items())
+    labels = sorted(set(versions) - set(manifest)) if incremental else sorted(versions)
+
+    report = {'mode': 'update' if incremental else 'full', 'students': len(versions), 'new_students': len(labels)}
+    if incremental and not labels:
+        report.update(images=0, load_seconds=0.0, train_seconds=0.0, seconds=round(time.perf_counter() - start, 3),
+                      ms_per_image=0.0)
+        return report
+
+    faces_by_label = load_faces(archive, labels, progress=progress)
+    load_done = time.perf_counter()
+    faces, ids = [], []
+    for label in labels:
+        faces.extend(faces_by_label[label])
+        ids.extend([label] * len(faces_by_label[label]))
+
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    if incremental:
+        recognizer.read(MODEL_PATH)
+        recognizer.update(faces, np.array(ids))
+    else:
+        recognizer.train(faces, np.array(ids))
+    train_done = time.perf_counter()
+
+    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+    _write_atomic(MODEL_PATH, recognizer.write)
+    trained = dict(manifest) if incremental else {}
+    trained.update({label: versions[label] for label in labels})
+
+    def write_manifest(path):
+        with open(path, 'w') as f:
+            json.dump({str(label): version for label, version in trained.items()}, f)
+    _write_atomic(MANIFEST_PATH, write_manifest)
+
+    seconds = time.perf_counter() - start
+    report.update(
+        images=len(faces),
+        load_seconds=round(load_done - start, 3),
+        train_seconds=round(train_done - load_done, 3),
+        seconds=round(seconds, 3),
+        ms_per_image=round(seconds / len(faces) * 1000, 3),
+    )
+    return report
+
+
+def describe(report):
+    """One-line summary of a train() report."""
+    if report['images'] == 0:
+        return f"Model already up to date ({report['students']} students)."
+    action = "Updated model with" if report['mode'] == 'update' else "Model trained successfully with"
+    return (f"{action} {report['images']} images for {report['new_students']} students "
+            f"in {report['seconds']:.2f}s ({report['ms_per_image']:.2f} ms per image).")
+
+
+class LiveRecognizer:
+    """
+    The trained model shared by the camera streams. get() checks the model file's mtime
+    at most every check_interval seconds; when it changed (a training run replaced it),
+    the new model is read in a background thread and swapped in as one reference, so
+    recognition keeps using the old model until the new one is ready.
+    """
+
+    def __init__(self, path=MODEL_PATH, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+        self._recognizer = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._loading = False
+        self._lock = threading.Lock()
+
+    def _model_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self, mtime):
+        try:
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+            recognizer.read(self.path)
+            with self._lock:
+                self._recognizer, self._mtime = recognizer, mtime
+                self.version += 1
+            print(f"Loaded recognition model (version {self.version})")
+        except Exception as e:
+            print(f"Error loading recognition model: {e}")
+        finally:
+            self._loading = False
+
+    def reload(self, wait=False):
+        """Loads the model file if it changed since it was last read (in the background unless wait)."""
+        mtime = self._model_mtime()
+        with self._lock:
+            self._next_check = time.monotonic() + self.check_interval
+            if mtime is None or mtime == self._mtime or self._loading:
+                return
+            self._loading = True
+        if wait:
+            self._load(mtime)
+        else:
+            threading.Thread(target=self._load, args=(mtime,), name="model-reload", daemon=True).start()
+
+    def get(self):
+        """The current recognizer, or None if no model has been loaded yet."""
+        if self._recognizer is None:
+            self.reload(wait=True)
+        elif time.monotonic() >= self._next_check:
+            self.reload()
+        return self._recognizer
+
+
+def _emit(event, **fields):
+    print(json.dumps(dict(fields, event=event)), flush=True)
+
+
+if __name__ == "__main__":
+    # Worker for the web app's background training jobs: one JSON event per line
+    import argparse
+    parser = argparse.ArgumentParser(description='Train the face recognition model, reporting progress as JSON lines')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--full', action='store_true')
+    args = parser.parse_args()
+    try:
+        report = train(workers=args.workers, full=args.full,
+                       progress=lambda loaded, total: _emit('progress', loaded=loaded, total=total))
+        _emit('done', report=report, message=describe(report))
+    except Exception as e:
+        _emit('error', message=str(e))
+        raise SystemExit(1)
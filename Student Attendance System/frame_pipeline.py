@@ -0,0 +1,187 @@
+"""
+Threaded camera pipeline behind the live video feed.
+
+A capture thread reads the camera as fast as it delivers frames, a processing thread
+runs face detection/recognition on the newest captured frame, and an encoder thread
+JPEG-encodes the newest processed frame once and broadcasts it to every /video_feed
+client. Each hand-off is a single "latest frame" slot that is replaced, never queued,
+so a slow stage drops stale frames instead of building up lag, and extra viewers cost
+no extra camera reads, detection or encoding.
+"""
+import threading
+import time
+
+import cv2
+
+
+class LatestFrame:
+    """
+    Newest item passed from one stage to the next. The writer swaps in a new
+    (sequence, item) tuple, which readers pick up without taking a lock; waiting for
+    a newer item uses a condition only to sleep.
+    """
+
+    def __init__(self):
+        self.item = (0, None)
+        self._changed = threading.Condition()
+
+    def publish(self, value):
+        # One writer per slot, so the sequence number needs no lock
+        self.item = (self.item[0] + 1, value)
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait(self, seen, timeout=1.0):
+        """Returns the newest (sequence, item), waiting up to timeout for one newer than seen."""
+        item = self.item
+        if item[0] != seen:
+            return item
+        with self._changed:
+            self._changed.wait_for(lambda: self.item[0] != seen, timeout)
+        return self.item
+
+    def wake(self):
+        with self._changed:
+            self._changed.notify_all()
+
+
+class StageStats:
+    """Smoothed latency and frame rate of one pipeline stage."""
+
+    def __init__(self, smoothing=0.1):
+        self.smoothing = smoothing
+        self.frames = 0
+        self.latency_ms = None
+        self.fps = None
+        self._last_frame = None
+
+    def record(self, seconds):
+        now = time.perf_counter()
+        a = self.smoothing
+        ms = seconds * 1000
+        self.latency_ms = ms if self.latency_ms is None else (1 - a) * self.latency_ms + a * ms
+        if self._last_frame is not None and now > self._last_frame:
+            fps = 1.0 / (now - self._last_frame)
+            self.fps = fps if self.fps is None else (1 - a) * self.fps + a * fps
+        self._last_frame = now
+        self.frames += 1
+
+    def as_dict(self):
+        return {
+            'frames': self.frames,
+            'fps': round(self.fps, 1) if self.fps is not None else None,
+            'latency_ms': round(self.latency_ms, 2) if self.latency_ms is not None else None,
+        }
+
+
+class FramePipeline:
+    """
+    Runs capture -> process -> encode in three threads. `source` needs read(), returning
+    a frame or None when the camera fails, and release(); `process(frame)` returns the
+    frame to show (annotated in place or a new one).
+    """
+
+    def __init__(self, source, process):
+        self.source = source
+        self.process = process
+        self.captured = LatestFrame()
+        self.processed = LatestFrame()
+        self.encoded = LatestFrame()
+        self.stats = {name: StageStats() for name in ('capture', 'process', 'encode')}
+        self.clients = 0
+        self._clients_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    @property
+    def running(self):
+        return not self._stopping.is_set()
+
+    def start(self):
+        for name, target in (('capture', self._capture), ('process', self._process), ('encode', self._encode)):
+            thread = threading.Thread(target=target, name=f"camera-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """Stops all stages. Safe to call from a stage thread (e.g. when enrollment finishes)."""
+        self._stopping.set()
+        for slot in (self.captured, self.processed, self.encoded):
+            slot.wake()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=2)
+
+    def _capture(self):
+        try:
+            while self.running:
+                start = time.perf_counter()
+                frame = self.source.read()
+                if frame is None:
+                    print("Camera read failed, stopping the camera pipeline")
+                    self._stopping.set()
+                    break
+                self.stats['capture'].record(time.perf_counter() - start)
+                self.captured.publish(frame)
+        finally:
+            self.source.release()
+            self.captured.wake()
+
+    def _process(self):
+        seen = 0
+        while self.running:
+            seen_before = seen
+            seen, frame = self.captured.wait(seen)
+            if seen == seen_before or frame is None:
+                continue
+            start = time.perf_counter()
+            try:
+                frame = self.process(frame)
+            except Exception as e:
+                print(f"Error processing frame: {e}")
+                continue
+            self.stats['process'].record(time.perf_counter() - start)
+            if frame is not None:
+                self.processed.publish(frame)
+
+    def _encode(self):
+        seen = 0
+        while self.running:
+            seen_before = seen
+            seen, frame = self.processed.wait(seen)
+            if seen == seen_before or frame is None:
+                continue
+            start = time.perf_counter()
+            ret, buffer = cv2.imencode('.jpg', frame)
+            if not ret:
+                continue
+            self.stats['encode'].record(time.perf_counter() - start)
+            self.encoded.publish(buffer.tobytes())
+
+    def frames(self):
+        """MJPEG multipart chunks of every newly encoded frame, for one client."""
+        with self._clients_lock:
+            self.clients += 1
+        try:
+            seen = 0
+            while self.running:
+                seen_before = seen
+                seen, jpeg = self.encoded.wait(seen)
+                if seen == seen_before or jpeg is None:
+                    continue
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+        finally:
+            with self._clients_lock:
+                self.clients -= 1
+
+    def status(self):
+        """FPS and smoothed latency per stage, connected clients and frames dropped between stages."""
+        capture, process, encode = (self.stats[name].frames for name in ('capture', 'process', 'encode'))
+        return {
+            'running': self.running,
+            'clients': self.clients,
+            'stages': {name: stats.as_dict() for name, stats in self.stats.items()},
+            'dropped_frames': {'before_process': max(capture - process, 0), 'before_encode': max(process - encode, 0)},
+        }
@@ -2,11 +2,16 @@ import os
 import csv
 import cv2
 import numpy as np
-import pandas as pd
 import argparse
 from datetime import datetime
 import sys
 
+from student_lookup import StudentLookup
+from attendance_store import AttendanceStore
+from face_archive import normalize
+from face_tracker import FaceTracker
+from batch_recognition import BatchRecognizer, mark_found
+
 def assure_path_exists(path):
     """Ensure directory exists, create if it doesn't"""
     if not os.path.exists(path):
@@ -35,15 +40,20 @@ def mark_status():
     
     recognizer.read("TrainingImageLabel/Trainner.yml")
     harcascadePath = "haarcascade_frontalface_default.xml"
-    faceCascade = cv2.CascadeClassifier(harcascadePath)
+    # Downscaled detection every few frames, faces tracked in between
+    tracker = FaceTracker(harcascadePath, scale_factor=1.2, min_neighbors=5)
+    predict = lambda roi: recognizer.predict(normalize(roi))
     font = cv2.FONT_HERSHEY_SIMPLEX
     
-    if not os.path.isfile("Student_Details/students.csv"):
+    # Names and attendance live in the store the web app reads (the day's CSV is kept up
+    # to date as well)
+    store = AttendanceStore("attendance.sqlite3")
+    store.migrate_from_csv("Student_Details/students.csv", "Student_Status")
+    students = StudentLookup(store)
+    if not len(students):
         print("Students details are missing, please check!")
         return False
     
-    df = pd.read_csv("Student_Details/students.csv")
-    
     now = datetime.now()
     date = now.strftime("%Y-%m-%d")
     time = now.strftime("%H:%M:%S")
@@ -51,14 +61,8 @@ def mark_status():
     status_file = f"Student_Status/Status_for_{date}.csv"
     col_names = ['Id', 'Name', 'Date', 'In Time', 'Out Time']
     
-    in_students = []
-    if os.path.isfile(status_file):
-        with open(status_file, 'r') as csvFile1:
-            reader1 = csv.reader(csvFile1)
-            for lines in reader1:
-                if len(lines) > 0:
-                    in_students.append(lines[0])
-    else:
+    in_students = [row['Id'] for row in store.attendance(date)]
+    if not os.path.isfile(status_file):
         with open(status_file, 'a+', newline='') as csvFile1:
             writer = csv.writer(csvFile1)
             writer.writerow(col_names)
@@ -79,22 +83,23 @@ def mark_status():
             break
             
         gray = cv2.cvtColor(im, cv2.COLOR_BGR2GRAY)  
-        faces = faceCascade.detectMultiScale(gray, 1.2, 5)  
+        tracks = tracker.update(gray, predict)
         
-        for (x, y, w, h) in faces:  
+        for track in tracks:  
+            (x, y, w, h), serial, conf = track.box, track.label, track.confidence
             cv2.rectangle(im, (x, y), (x + w, y + h), (225, 0, 0), 2)  
-            serial, conf = recognizer.predict(gray[y:y + h, x:x + w])  
             
             if conf < 50:  
                 try:
-                    aa = df.loc[df['ID'] == serial]['Name'].values
-                    ID = df.loc[df['ID'] == serial]['ID'].values 
-                    ID = str(ID[0])
-                    name = str(aa[0])
+                    name = students.get(serial)
+                    if name is None:
+                        raise KeyError(f"ID {serial} is not enrolled")
+                    ID = str(serial)
                     
                     status_row = [str(ID), name, date, time]  
                     
-                    if ID not in in_students:
+                    # mark_many() inserts nothing if the student was marked meanwhile (e.g. by the web app)
+                    if ID not in in_students and store.mark_many([dict(zip(col_names, status_row))]):
                         in_students.append(ID)
                         with open(status_file, 'a', newline='') as csvFile1:
                             writer = csv.writer(csvFile1)
@@ -130,10 +135,42 @@ def mark_status():
     cv2.destroyAllWindows()
     return False
 
+def mark_status_batch(source, workers=None, every=1):
+    """Mark Status for every student recognized in a video file or image folder"""
+    if not os.path.exists(source):
+        print(f"Source not found: {source}")
+        return False
+
+    try:
+        batch = BatchRecognizer(workers=workers)
+        print(f"Processing {source} with {batch.workers} workers...")
+        report = batch.run(source, every=every,
+                           progress=lambda frames: print(f"  {frames} frames processed", end='\r', flush=True))
+        marked, already = mark_found(report)
+    except Exception as e:
+        print(f"Error processing {source}: {str(e)}")
+        return False
+
+    print(f"\nProcessed {report['frames']} frames in {report['seconds']:.2f}s "
+          f"({report['fps']:.1f} frames/sec), {report['faces']} faces detected")
+    print(f"Students found: {len(report['students'])} ({len(marked)} newly marked, {len(already)} already marked)")
+    for serial, entry in sorted(report['students'].items()):
+        status = 'marked' if serial in marked else 'already marked'
+        print(f"  {serial}\t{entry['name']}\t{entry['sightings']} sightings\tbest conf {entry['confidence']:.1f}"
+              f"\tfirst seen in frame {entry['first_frame']}\t{status}")
+    return True
+
 def main():
     parser = argparse.ArgumentParser(description='Mark Student Status')
+    parser.add_argument('--source', help='Video file or image folder to process offline instead of the webcam')
+    parser.add_argument('--workers', type=int, default=None, help='Recognition threads for --source (default: one per CPU)')
+    parser.add_argument('--every', type=int, default=1, help='Process every Nth video frame with --source')
     args = parser.parse_args()
 
+    if args.source:
+        print("=== Starting batch Status marking ===")
+        sys.exit(0 if mark_status_batch(args.source, args.workers, max(1, args.every)) else 1)
+
     print("=== Starting Status Marking marking ===")
     success = mark_status()
     
@@ -0,0 +1,69 @@
+"""
+Cached, change-aware status payload for /api/status.
+
+The payload is built once and served from memory until invalidate() is called on an
+enrollment, training, camera or attendance event (and when the date changes). While
+the camera runs, it is also rebuilt at most once per live_interval so the pipeline's
+FPS stays current. Every response carries an ETag of the payload, so polling clients
+get a bodiless 304 while nothing changed. wait_for_change() backs long-polling and the
+server-sent events stream: waiters sleep on a condition until the next change instead
+of polling.
+"""
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+
+
+class StatusBoard:
+    def __init__(self, build, live=None, live_interval=1.0):
+        self.build = build
+        self.live = live or (lambda: False)
+        self.live_interval = live_interval
+        self.version = 0
+        self._key = None
+        self._payload = None  # (etag, body)
+        self._build_lock = threading.Lock()
+        self._changed = threading.Condition()
+
+    def invalidate(self):
+        """Marks the payload stale and wakes long-poll / SSE waiters."""
+        with self._changed:
+            self.version += 1
+            self._changed.notify_all()
+
+    def _cache_key(self):
+        key = (self.version, datetime.now().strftime("%Y-%m-%d"))
+        if self.live():
+            key += (int(time.monotonic() / self.live_interval),)
+        return key
+
+    def current(self):
+        """Returns (etag, JSON body), rebuilding only when the cache key changed."""
+        key = self._cache_key()
+        if key == self._key:
+            return self._payload
+        with self._build_lock:
+            if key != self._key:
+                payload = self.build()
+                # Hash without the timestamp, so a rebuild with the same content keeps its ETag
+                digest = hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+                payload['timestamp'] = datetime.now().isoformat()
+                self._payload = (f'"{digest[:16]}"', json.dumps(payload, default=str))
+                self._key = key
+        return self._payload
+
+    def wait_for_change(self, etag, timeout):
+        """Waits up to timeout seconds for a payload whose ETag differs from etag; returns (etag, body)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            payload = self.current()
+            remaining = deadline - time.monotonic()
+            if payload[0] != etag or remaining <= 0:
+                return payload
+            version = self.version
+            with self._changed:
+                # While the camera runs the payload also changes without an event
+                wait = min(remaining, self.live_interval) if self.live() else remaining
+                self._changed.wait_for(lambda: self.version != version, wait)
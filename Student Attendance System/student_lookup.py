@@ -0,0 +1,65 @@
+"""
+ID -> name lookup for face recognition.
+
+The student registry (AttendanceStore.student_names()) is compiled once into a lookup
+table: a list indexed by ID when the IDs are dense enough (the common case of
+sequential roll numbers), otherwise a dict. A recognized label is then resolved with
+one index operation instead of a query or a pandas filter per face per frame. The
+store's students version is checked at most every check_interval seconds, and the
+table is rebuilt when it changed (e.g. after an enrollment by another process);
+invalidate() makes the next lookup rebuild it right away.
+"""
+import time
+import threading
+
+from attendance_store import AttendanceStore
+
+
+class StudentLookup:
+    def __init__(self, store=None, check_interval=1.0):
+        self.store = store or AttendanceStore()
+        self.check_interval = check_interval
+        self._table = (False, {})  # (dense, table), swapped as one reference
+        self._count = 0
+        self._version = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def __len__(self):
+        return self._count
+
+    def invalidate(self):
+        """Rebuilds the table on the next lookup (call after enrolling a student)."""
+        with self._lock:
+            self._version = None
+            self._next_check = 0.0
+
+    def refresh(self):
+        """Rebuilds the table if the store's students changed since it was last read. Returns whether it did."""
+        with self._lock:
+            self._next_check = time.monotonic() + self.check_interval
+            version = self.store.students_version()
+            if version == self._version:
+                return False
+            names = self.store.student_names()
+            self._count = len(names)
+            # A list indexed by ID wastes at most a few slots per student for dense IDs
+            if names and min(names) >= 0 and max(names) < 2 * len(names) + 1024:
+                table = [None] * (max(names) + 1)
+                for student_id, name in names.items():
+                    table[student_id] = name
+                self._table = (True, table)
+            else:
+                self._table = (False, names)
+            self._version = version
+            return True
+
+    def get(self, student_id):
+        """Name of the student with this ID, or None if the ID isn't enrolled."""
+        if time.monotonic() >= self._next_check:
+            self.refresh()
+        dense, table = self._table
+        if dense:
+            return table[student_id] if 0 <= student_id < len(table) else None
+        return table.get(student_id)
@@ -1,10 +1,9 @@
 import os
-import cv2
-import numpy as np
 import argparse
-from PIL import Image
 import sys
 
+import face_training
+
 def assure_path_exists(path):
     """Ensure directory exists, create if it doesn't"""
     if not os.path.exists(path):
@@ -17,49 +16,23 @@ def check_haarcascadefile():
         return False
     return True
 
-def getImagesAndLabels(path):
-    """Get training images and labels"""
-    imagePaths = [os.path.join(path, f) for f in os.listdir(path) if f.endswith('.jpg')]
-    faces = []
-    Ids = []
-    
-    for imagePath in imagePaths:
-        try:
-            pilImage = Image.open(imagePath).convert('L')
-            imageNp = np.array(pilImage, 'uint8')
-            ID = int(os.path.split(imagePath)[-1].split(".")[1])
-            faces.append(imageNp)
-            Ids.append(ID)
-        except Exception as e:
-            print(f"Error processing {imagePath}: {str(e)}")
-            continue
-            
-    return faces, Ids
+def print_progress(loaded, total):
+    print(f"  loaded {loaded}/{total} images", end='\r' if loaded < total else '\n', flush=True)
 
-def train_model():
-    """Train the face recognition model"""
+def train_model(workers=None, full=False):
+    """Train (or incrementally update) the face recognition model"""
     if not check_haarcascadefile():
         return False
 
     assure_path_exists("TrainingImageLabel/")
     
     try:
-        recognizer = cv2.face.LBPHFaceRecognizer_create()
-        harcascadePath = "haarcascade_frontalface_default.xml"
-        detector = cv2.CascadeClassifier(harcascadePath)
-        
         print("Getting training data...")
-        faces, Ids = getImagesAndLabels("Training_Data")
-        
-        if len(faces) == 0:
-            print("No training data found!")
-            return False
-            
-        print("Training model...")
-        recognizer.train(faces, np.array(Ids))
-        recognizer.save("TrainingImageLabel/Trainner.yml")
-        
-        print(f"Trained {len(faces)} images for {len(set(Ids))} students")
+        report = face_training.train(workers=workers, full=full, progress=print_progress)
+        print(face_training.describe(report))
+        if report['images']:
+            print(f"  mode: {report['mode']}, load: {report['load_seconds']:.2f}s, "
+                  f"train: {report['train_seconds']:.2f}s, {report['ms_per_image']:.2f} ms per image")
         return True
         
     except Exception as e:
@@ -68,10 +41,12 @@ def train_model():
 
 def main():
     parser = argparse.ArgumentParser(description='Train Face Recognition Model')
+    parser.add_argument('--workers', type=int, default=None, help='Image decoding processes (default: one per CPU)')
+    parser.add_argument('--full', action='store_true', help='Retrain from scratch instead of updating the saved model')
     args = parser.parse_args()
 
     print("=== Starting model training ===")
-    success = train_model()
+    success = train_model(workers=args.workers, full=args.full)
     
     if success:
         print("Training completed successfully!")
@@ -81,4 +56,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
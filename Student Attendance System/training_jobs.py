@@ -0,0 +1,101 @@
+"""
+Background training jobs for the web app.
+
+A training run takes from seconds to minutes, so /train no longer runs it inside the
+request: TrainingJobs starts `python face_training.py` as a child process (one job at a
+time) and a watcher thread reads the JSON progress lines it prints. status() reports
+the job's state, images loaded out of the total and elapsed time; on_change is called
+on every update (e.g. to refresh /api/status) and on_finish once the job ended.
+"""
+import os
+import sys
+import json
+import time
+import itertools
+import threading
+import subprocess
+from datetime import datetime
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "face_training.py")
+
+
+class TrainingJobs:
+    def __init__(self, on_change=None, on_finish=None):
+        self.on_change = on_change or (lambda: None)
+        self.on_finish = on_finish or (lambda job: None)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._job = None  # the running job, or the last one
+
+    def running(self):
+        with self._lock:
+            return self._job is not None and self._job['state'] == 'running'
+
+    def start(self, full=False):
+        """Starts a training job unless one is running. Returns (job status, whether it was started)."""
+        with self._lock:
+            if self._job is not None and self._job['state'] == 'running':
+                return self._snapshot(), False
+            command = [sys.executable, '-u', WORKER] + (['--full'] if full else [])
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+            self._job = {
+                'id': next(self._ids),
+                'state': 'running',
+                'mode': 'full' if full else 'auto',
+                'images_loaded': 0,
+                'images_total': None,
+                'started_at': datetime.now().isoformat(timespec='seconds'),
+                'message': 'Training started',
+                'report': None,
+                '_started': time.monotonic(),
+                '_finished': None,
+            }
+            job = self._job
+        threading.Thread(target=self._watch, args=(job, process), name=f"training-job-{job['id']}", daemon=True).start()
+        self.on_change()
+        return self.status(), True
+
+    def _watch(self, job, process):
+        result = None
+        for line in process.stdout:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                print(line, end='')  # the trainer's own diagnostics
+                continue
+            with self._lock:
+                if event.get('event') == 'progress':
+                    job['images_loaded'], job['images_total'] = event['loaded'], event['total']
+                    job['message'] = (f"Loaded {event['loaded']}/{event['total']} images" if event['loaded'] < event['total']
+                                      else f"Training on {event['total']} images")
+                else:
+                    result = event
+            self.on_change()
+        code = process.wait()
+
+        with self._lock:
+            job['_finished'] = time.monotonic()
+            if result is not None and result.get('event') == 'done':
+                job['state'], job['report'] = 'done', result['report']
+                job['message'] = result['message']
+            else:
+                job['state'] = 'failed'
+                job['message'] = (result or {}).get('message') or f"Training process exited with code {code}"
+        print(f"Training job {job['id']} {job['state']}: {job['message']}")
+        try:
+            self.on_finish(self.status())
+        finally:
+            self.on_change()
+
+    def _snapshot(self):
+        job = self._job
+        if job is None:
+            return None
+        status = {key: value for key, value in job.items() if not key.startswith('_')}
+        status['elapsed_seconds'] = round((job['_finished'] or time.monotonic()) - job['_started'], 1)
+        return status
+
+    def status(self):
+        """The running (or last) job as a dict, or None before the first job."""
+        with self._lock:
+            return self._snapshot()